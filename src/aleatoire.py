@@ -0,0 +1,39 @@
+"""Flux aléatoires reproductibles : graines indépendantes par sous-système et tirages un par un générés par blocs"""
+
+# Modules externes
+import numpy as np
+
+# Nombre de valeurs générées à la fois par TiragesGroupes
+TAILLE_BLOC = 4096
+
+
+def graines_independantes(graine, nombre):
+    """Renvoie nombre graines indépendantes issues d'une graine (entier, None ou numpy.random.SeedSequence)"""
+    return (graine if isinstance(graine, np.random.SeedSequence) else np.random.SeedSequence(graine)).spawn(nombre)
+
+
+class TiragesGroupes:
+    """Tirages aléatoires un par un (moteur par individus), générés par blocs avec un générateur numpy
+
+    nombre compte les valeurs renvoyées (pas celles générées d'avance dans les blocs), comme les tirages comptés par le moteur vectorisé."""
+
+    def __init__(self, generateur, taille_bloc=TAILLE_BLOC):
+        self.generateur = generateur
+        self.taille_bloc = taille_bloc
+        self.uniformes = []
+        self.normales = []
+        self.nombre = 0
+
+    def uniforme(self):
+        """Renvoie un nombre tiré uniformément dans [0, 1["""
+        if not self.uniformes:
+            self.uniformes = self.generateur.random(self.taille_bloc).tolist()
+        self.nombre += 1
+        return self.uniformes.pop()
+
+    def normale(self, moyenne, ecart_type):
+        """Renvoie un nombre tiré selon une loi normale"""
+        if not self.normales:
+            self.normales = self.generateur.standard_normal(self.taille_bloc).tolist()
+        self.nombre += 1
+        return moyenne + ecart_type*self.normales.pop()
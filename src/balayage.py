@@ -0,0 +1,256 @@
+"""Balayage des paramètres de la simulation et calibration sur une courbe cible, avec un cache des résultats sur disque"""
+
+# Modules externes
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields, replace
+
+import numpy as np
+
+# Modules internes
+import ensemble
+from ensemble import completer_stats, initialiser_processus
+from propagation import Parametres, SituationInitiale, Simulation
+
+# Dossier par défaut du cache des résultats
+dossier_cache = "data/cache_balayage"
+
+# Champs qui peuvent être balayés
+CHAMPS_PARAMETRES = [champ.name for champ in fields(Parametres)]
+CHAMPS_SITUATION = [champ.name for champ in fields(SituationInitiale)]
+
+
+def grille(valeurs):
+    """Renvoie tous les points d'une grille (produit cartésien) à partir des valeurs possibles de chaque champ"""
+    return [dict(zip(valeurs, point)) for point in itertools.product(*valeurs.values())]
+
+
+def echantillons(bornes, nb_points, graine=None, methode="hypercube"):
+    """Renvoie nb_points points tirés entre les bornes (minimum, maximum) de chaque champ
+
+    Avec la méthode "hypercube" (hypercube latin), chaque champ prend une valeur dans chacun des nb_points intervalles
+    de même largeur entre ses bornes ; avec la méthode "aleatoire", les valeurs sont tirées uniformément."""
+    generateur = np.random.default_rng(graine)
+    if methode == "hypercube":
+        tirages = np.array([(generateur.permutation(nb_points) + generateur.random(nb_points))/nb_points for _ in bornes]).T
+    elif methode == "aleatoire":
+        tirages = generateur.random((nb_points, len(bornes)))
+    else:
+        raise ValueError(f"Méthode d'échantillonnage inconnue : {methode}")
+    minimums = np.array([minimum for (minimum, maximum) in bornes.values()], dtype=float)
+    maximums = np.array([maximum for (minimum, maximum) in bornes.values()], dtype=float)
+    return [dict(zip(bornes, valeurs)) for valeurs in (minimums + tirages*(maximums - minimums)).tolist()]
+
+
+def appliquer(point, situation_init, parametres):
+    """Renvoie la situation initiale et les paramètres modifiés selon les valeurs d'un point
+
+    Les champs entiers (nombre d'infectés par exemple) sont arrondis."""
+    modifications = ({}, {})
+    for (champ, valeur) in point.items():
+        if champ in CHAMPS_SITUATION:
+            objet, modification = situation_init, modifications[0]
+        elif champ in CHAMPS_PARAMETRES:
+            objet, modification = parametres, modifications[1]
+        else:
+            raise ValueError(f"Champ inconnu : {champ}")
+        modification[champ] = round(valeur) if isinstance(getattr(objet, champ), int) else valeur
+    return replace(situation_init, **modifications[0]), replace(parametres, **modifications[1])
+
+
+def empreinte_instantane(dossier):
+    """Renvoie l'empreinte (SHA-256) du contenu d'un instantané de la population"""
+    empreinte = hashlib.sha256()
+    for nom in sorted(os.listdir(dossier)):
+        empreinte.update(nom.encode())
+        with open(os.path.join(dossier, nom), "rb") as fichier:
+            for bloc in iter(lambda: fichier.read(1 << 24), b""):
+                empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+class CacheResultats:
+    """Représente les statistiques des simulations déjà calculées, enregistrées dans un dossier (un fichier JSON par simulation)
+
+    La clé d'une simulation est l'empreinte de la population, de la stratégie, de la situation initiale, des paramètres et
+    de la graine. Le modèle n'en fait pas partie : le dossier doit être vidé lorsque le code de la simulation change."""
+
+    def __init__(self, dossier, population):
+        self.dossier = dossier
+        os.makedirs(dossier, exist_ok=True)
+        self.population = empreinte_instantane(population.instantane)
+
+    def cle(self, strategie, situation_init, parametres, graine):
+        """Renvoie la clé d'une simulation"""
+        description = json.dumps({"population": self.population, "strategie": asdict(strategie), "situation_init": asdict(situation_init),
+                                  "parametres": asdict(parametres), "graine": graine}, sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def lire(self, cle):
+        """Renvoie les statistiques enregistrées d'une simulation (None si elle n'a pas été calculée)"""
+        chemin = os.path.join(self.dossier, f"{cle}.json")
+        if not os.path.exists(chemin):
+            return None
+        with open(chemin, encoding="utf-8") as fichier:
+            return json.load(fichier)
+
+    def ecrire(self, cle, stats):
+        """Enregistre les statistiques d'une simulation (écrites sous un nom temporaire puis renommées)"""
+        chemin = os.path.join(self.dossier, f"{cle}.json")
+        with open(chemin + ".tmp", "w", encoding="utf-8") as fichier:
+            json.dump(stats, fichier)
+        os.replace(chemin + ".tmp", chemin)
+
+
+class ArretCalibration(Exception):
+    """Interrompt une simulation dont l'écart à la courbe cible dépasse déjà le seuil"""
+
+
+class SortieEcart:
+    """Calcule au fur et à mesure de la simulation l'écart (somme des carrés) entre une statistique et la courbe cible,
+    et interrompt la simulation dès qu'il dépasse le seuil : l'écart ne peut plus que croître"""
+
+    def __init__(self, cible, statistique, seuil):
+        self.cible = cible
+        self.statistique = statistique
+        self.seuil = seuil
+        self.ecart = 0
+
+    def ecrire(self, jour, ligne):
+        """Ajoute l'écart d'un jour"""
+        if jour < len(self.cible):
+            self.ecart += (ligne[self.statistique] - self.cible[jour])**2
+            if self.ecart > self.seuil:
+                raise ArretCalibration()
+
+    def fermer(self, simulation):
+        """Rien à faire à la fin de la simulation"""
+
+
+def ecart(stats, cible, statistique):
+    """Renvoie l'écart (somme des carrés) entre une statistique et la courbe cible"""
+    return float(np.sum((np.array(stats[statistique][:len(cible)], dtype=float) - np.array(cible, dtype=float))**2))
+
+
+def simuler_point(strategie, situation_init, parametres, graine, cible=None, statistique=None, seuil=np.inf):
+    """Simule un point sans affichage avec le moteur vectorisé et renvoie ses statistiques sur toute la durée de la simulation
+    (None si la simulation a été interrompue car trop éloignée de la courbe cible)"""
+    sorties = [] if cible is None else [SortieEcart(cible, statistique, seuil)]
+    try:
+        simulation = Simulation(ensemble.donnees_processus, ensemble.population_processus, strategie, situation_init, parametres, "",
+                                moteur="vectorise", graine=graine, afficher=False, sorties=sorties)
+    except ArretCalibration:
+        return None
+    return completer_stats(simulation.stats, parametres.simulation_duree)
+
+
+@dataclass
+class ResultatBalayage:
+    """Représente les statistiques de chaque point d'un balayage"""
+
+    # Points balayés (valeur de chaque champ modifié)
+    points: list[dict]
+
+    # Statistiques de chaque point (None pour une simulation interrompue lors d'une calibration)
+    stats: list[dict]
+
+
+class Balayage:
+    """Exécute des simulations sur un ensemble de processus en réutilisant les résultats du cache
+
+    La population est partagée par les processus via son instantané projeté en mémoire (voir ensemble.py).
+    Tous les points sont simulés avec la même graine : leurs écarts ne dépendent que des valeurs des champs."""
+
+    def __init__(self, donnees, population, strategie, situation_init, parametres, graine=0, dossier=dossier_cache, nb_processus=None):
+        # Instantané temporaire si la population n'en a pas, supprimé à la fermeture
+        self.population = population
+        self.instantane_temporaire = population.sauvegarder_temporaire()
+        self.strategie = strategie
+        self.init = situation_init
+        self.param = parametres
+        self.graine = graine
+        self.cache = CacheResultats(dossier, population)
+        # Les processus sont démarrés à neuf ("spawn") et reçoivent une copie des données de référence
+        self.executeur = ProcessPoolExecutor(nb_processus, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=initialiser_processus, initargs=(donnees, population.instantane))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.fermer()
+
+    def fermer(self):
+        """Arrête les processus de calcul et supprime l'instantané temporaire de la population"""
+        self.executeur.shutdown()
+        self.population.supprimer_temporaire(self.instantane_temporaire)
+        self.instantane_temporaire = None
+
+    def executer(self, points, parametres=None, cible=None, statistique=None, seuil=np.inf):
+        """Simule chaque point (valeurs des champs de la situation initiale et des paramètres) qui n'est pas dans le cache
+
+        Avec une courbe cible, les simulations dont l'écart dépasse le seuil sont interrompues (et ne sont pas enregistrées)."""
+        parametres = self.param if parametres is None else parametres
+        scenarios = [appliquer(point, self.init, parametres) for point in points]
+        cles = [self.cache.cle(self.strategie, situation_init, parametres_point, self.graine) for (situation_init, parametres_point) in scenarios]
+        stats = [self.cache.lire(cle) for cle in cles]
+
+        a_simuler = [id for (id, stats_point) in enumerate(stats) if stats_point is None]
+        calculs = self.executeur.map(simuler_point, [self.strategie]*len(a_simuler), *zip(*[scenarios[id] for id in a_simuler]),
+                                     [self.graine]*len(a_simuler), [cible]*len(a_simuler), [statistique]*len(a_simuler), [seuil]*len(a_simuler))
+        for (id, stats_point) in zip(a_simuler, calculs):
+            if stats_point is not None:
+                self.cache.ecrire(cles[id], stats_point)
+            stats[id] = stats_point
+        return ResultatBalayage(list(points), stats)
+
+
+def executer_balayage(donnees, population, strategie, situation_init, parametres, points, graine=0, dossier=dossier_cache, nb_processus=None):
+    """Simule chaque point d'un balayage (voir grille et echantillons) sur un ensemble de processus, en réutilisant le cache"""
+    with Balayage(donnees, population, strategie, situation_init, parametres, graine, dossier, nb_processus) as balayage:
+        return balayage.executer(points)
+
+
+@dataclass
+class ResultatCalibration:
+    """Représente le résultat d'une calibration"""
+
+    # Meilleur point trouvé et son écart à la courbe cible
+    point: dict
+    ecart: float
+
+    # Points simulés à chaque tour et leur écart (None pour une simulation interrompue)
+    historique: list[tuple[dict, float]]
+
+
+def calibrer(donnees, population, strategie, situation_init, parametres, bornes, cible, statistique="total_infectes", nb_points=16, nb_tours=4,
+             reduction=0.5, marge=4.0, graine=0, dossier=dossier_cache, nb_processus=None):
+    """Recherche les valeurs des champs (entre leurs bornes) dont la statistique est la plus proche de la courbe cible (valeur de chaque jour)
+
+    Chaque tour simule nb_points points d'un hypercube latin, puis les bornes sont resserrées autour du meilleur point
+    (largeur multipliée par reduction). Une simulation est interrompue dès que son écart dépasse marge fois le meilleur écart."""
+    # La simulation s'arrête à la fin de la courbe cible
+    parametres = replace(parametres, simulation_duree=len(cible) - 1)
+    meilleur, meilleur_ecart = None, np.inf
+    historique = []
+    bornes_tour = dict(bornes)
+    with Balayage(donnees, population, strategie, situation_init, parametres, graine, dossier, nb_processus) as balayage:
+        for tour in range(nb_tours):
+            points = echantillons(bornes_tour, nb_points, graine=[graine, tour])
+            resultat = balayage.executer(points, cible=cible, statistique=statistique, seuil=marge*meilleur_ecart)
+            for (point, stats) in zip(points, resultat.stats):
+                ecart_point = None if stats is None else ecart(stats, cible, statistique)
+                historique.append((point, ecart_point))
+                if ecart_point is not None and ecart_point < meilleur_ecart:
+                    meilleur, meilleur_ecart = point, ecart_point
+
+            # Bornes du tour suivant, centrées sur le meilleur point et limitées aux bornes initiales
+            bornes_tour = {champ: (max(minimum, meilleur[champ] - reduction*(maximum_tour - minimum_tour)/2),
+                                   min(maximum, meilleur[champ] + reduction*(maximum_tour - minimum_tour)/2))
+                           for ((champ, (minimum, maximum)), (minimum_tour, maximum_tour)) in zip(bornes.items(), bornes_tour.values())}
+
+    return ResultatCalibration(meilleur, meilleur_ecart, historique)
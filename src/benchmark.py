@@ -0,0 +1,528 @@
+"""Mesures de performance des différentes étapes de la simulation"""
+
+# Utilisation : python src/benchmark.py <mesure> (depuis la racine du projet)
+
+# Modules externes
+import os
+import sqlite3
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+from scipy.spatial import distance
+from sklearn.datasets import make_blobs
+
+# Modules internes
+from compartiments import TOLERANCE_COMPARTIMENTS, MoteurCompartiments
+from constantes import INFECTE, INFECTION, NEUTRE
+from couches import CouchesContacts
+from donnees import DonneesReference
+from ensemble import comparer_moteurs, valider_compartiments
+from immunite import TableImmunite
+from moteur import CHAMPS_ETAT, MoteurVectorise
+from population import Individu, Population
+from aleatoire import TiragesGroupes
+from propagation import Parametres, SituationInitiale, Strategie, contaminer_voisins
+from reprise import charger_point, enregistrer_point
+from risques import TableRisques
+from tuiles import MoteurTuiles
+from vaccination import PlanVaccination, individus_eligibles
+from voisinage import construire_voisins, poids_voisins
+
+# Écart maximal admis entre les moyennes de deux moteurs équivalents, en erreurs types de leur différence
+SEUIL_EQUIVALENCE = 4
+# Écart relatif maximal entre une valeur float64 et son arrondi sur 32 bits (distances et poids du graphe des voisins)
+TOLERANCE_DISTANCES = np.finfo(np.float32).eps/2
+
+# Base de données des données réelles (efficacité des vaccins, répartition de la population...)
+database_loc_data = "res/simulation_data.db"
+
+
+def generer_positions(nb_individus, variance_pop, graine=0):
+    """Génère des positions comme Population, de manière reproductible"""
+    positions, y = make_blobs(n_samples=nb_individus, centers=1, center_box=(
+        0, 0), cluster_std=variance_pop, random_state=graine)
+    return positions.astype("float16")
+
+
+def voisins_cdist(positions, max_distance, id):
+    """Renvoie les voisins d'un individu selon le calcul historique (une ligne de cdist par individu)"""
+    individu_distance = distance.cdist([positions[id]], positions)
+    voisins = np.where(individu_distance < max_distance)[1]
+    voisins_valeur = np.extract(
+        individu_distance < max_distance, individu_distance)
+    return voisins, voisins_valeur
+
+
+def benchmark_voisins(tailles=(10000, 100000, 1000000), max_distance=1, densite=10000/10**2, echantillon=2000):
+    """Compare la construction des voisins par arbre k-d au calcul historique par cdist
+
+    La variance de la population est adaptée à chaque taille pour garder la même densité d'individus.
+    Le calcul historique n'est chronométré en entier que pour la plus petite taille : pour les autres, on vérifie
+    un échantillon d'individus et on extrapole le temps total."""
+    for nb_individus in tailles:
+        positions = generer_positions(nb_individus, (nb_individus/densite)**0.5)
+
+        debut = perf_counter()
+        index, voisins, voisins_distance = construire_voisins(positions, max_distance)
+        temps_arbre = perf_counter() - debut
+        voisins_poids = poids_voisins(voisins_distance)
+
+        # Vérification des résultats sur tous les individus ou sur un échantillon : mêmes voisins, distances égales
+        # aux distances cdist (float64) à un arrondi sur 32 bits près (TOLERANCE_DISTANCES), et poids de transmission
+        # égaux aux poids historiques 1/(1+distance cdist) à deux arrondis près (distance puis poids)
+        if nb_individus <= tailles[0]:
+            verifies = np.arange(nb_individus)
+        else:
+            verifies = np.random.default_rng(0).choice(nb_individus, echantillon, replace=False)
+        differents = []
+        debut = perf_counter()
+        for id in verifies:
+            cdist_voisins, cdist_distance = voisins_cdist(positions, max_distance, id)
+            if not (np.array_equal(voisins[index[id]:index[id+1]], cdist_voisins)
+                    and np.allclose(voisins_distance[index[id]:index[id+1]], cdist_distance, rtol=TOLERANCE_DISTANCES, atol=0)
+                    and np.allclose(voisins_poids[index[id]:index[id+1]], 1/(1 + cdist_distance), rtol=2*TOLERANCE_DISTANCES, atol=0)):
+                differents.append(int(id))
+        temps_cdist = (perf_counter() - debut) * nb_individus / len(verifies)
+
+        print(f"{nb_individus} individus, {len(voisins)} voisins : arbre k-d {temps_arbre:.2f}s, cdist {temps_cdist:.2f}s"
+              f"{'' if len(verifies) == nb_individus else ' (estimé)'}, accélération x{temps_cdist/temps_arbre:.0f} "
+              f"({len(verifies)} individus vérifiés)")
+        assert not differents, f"Voisins, distances ou poids différents du calcul historique pour {len(differents)} individus (premiers : {differents[:10]})"
+
+
+def benchmark_immunite(nb_requetes=20000, nb_individus=1000000):
+    """Compare le nombre de recherches d'efficacité vaccinale par seconde entre la base de données et la table en mémoire"""
+    data_cur = sqlite3.connect(database_loc_data).cursor()
+    table = TableImmunite(data_cur)
+
+    # Requêtes aléatoires sur des individus vaccinés ou immunisés
+    generateur = np.random.default_rng(0)
+    vaccins = generateur.integers(0, len(table.vaccins), nb_individus)
+    ages = generateur.integers(12, 101, nb_individus)
+    jours = generateur.integers(0, 500, nb_individus)
+    types = generateur.integers(1, 4, nb_individus)
+
+    # Requête SQL historique de Individu.get_immunite
+    debut = perf_counter()
+    resultats_sql = [data_cur.execute("SELECT efficacite from vaccins WHERE vaccin = ? AND age_min <= ? AND age_max >= ? AND mois_min <= ? AND mois_max >= ? AND etat = ?",
+                     (table.vaccins[vaccin], age, age, jour/30.5, jour/30.5, type)).fetchall()[0][0]
+                     for (vaccin, age, jour, type) in zip(vaccins[:nb_requetes].tolist(), ages[:nb_requetes].tolist(), jours[:nb_requetes].tolist(), types[:nb_requetes].tolist())]
+    debit_sql = nb_requetes / (perf_counter() - debut)
+
+    # Recherche individuelle dans la table
+    debut = perf_counter()
+    resultats_table = [table.efficacite_individu(vaccin, age, jour, type)
+                       for (vaccin, age, jour, type) in zip(vaccins[:nb_requetes].tolist(), ages[:nb_requetes].tolist(), jours[:nb_requetes].tolist(), types[:nb_requetes].tolist())]
+    debit_table = nb_requetes / (perf_counter() - debut)
+
+    # Recherche vectorisée sur toute la population (un type de risque à la fois, comme dans le moteur vectorisé)
+    debut = perf_counter()
+    for type in (1, 2, 3):
+        table.efficacite(vaccins, ages, jours, type)
+    debit_vectorise = 3*nb_individus / (perf_counter() - debut)
+
+    print(f"SQL : {debit_sql:.0f} requêtes/s, table (individuelle) : {debit_table:.0f} requêtes/s, table (vectorisée) : {debit_vectorise:.0f} requêtes/s")
+    print(f"Accélération : x{debit_table/debit_sql:.0f} (individuelle), x{debit_vectorise/debit_sql:.0f} (vectorisée)")
+    data_cur.close()
+
+    # Les deux recherches dans la table doivent redonner exactement les efficacités de la base
+    resultats_vectorises = np.empty(nb_requetes)
+    for type in (1, 2, 3):
+        requetes = np.flatnonzero(types[:nb_requetes] == type)
+        resultats_vectorises[requetes] = table.efficacite(vaccins[requetes], ages[requetes], jours[requetes], type)
+    for (nom, resultats) in (("individuelle", resultats_table), ("vectorisée", resultats_vectorises)):
+        differents = np.flatnonzero(np.array(resultats_sql) != np.array(resultats))
+        assert np.array_equal(resultats_sql, resultats), \
+            f"Efficacités différentes (table {nom}) pour {len(differents)} requêtes (premières : {differents[:10].tolist()})"
+
+
+def multiplicateur_sql(data_cur, data, maladies):
+    """Calcule les risques relatifs d'un individu selon le calcul historique (une requête par facteur)"""
+    multiplicateur = np.array(data_cur.execute(
+        "SELECT probar_hopital, probar_deces from age WHERE min <= ? AND max >= ?", (data["age"], data["age"])).fetchall()[0])
+    multiplicateur *= np.array(data_cur.execute(
+        "SELECT probar_hopital, probar_deces from repartition_sexe WHERE sexe = ?", (data["sexe"],)).fetchall()[0])
+    multiplicateur *= np.array(data_cur.execute(
+        "SELECT probar_hopital, probar_deces from social WHERE quintile = ?", (data["quintile"],)).fetchall()[0])
+    if data["tabac"]:
+        multiplicateur *= np.array(data_cur.execute(
+            "SELECT probar_hopital, probar_deces from habitudes WHERE carac = 'tabac'").fetchall()[0])
+    if data["alcool"]:
+        multiplicateur *= np.array(data_cur.execute(
+            "SELECT probar_hopital, probar_deces from habitudes WHERE carac = 'alcool'").fetchall()[0])
+    for maladie in maladies:
+        if data[maladie]:
+            multiplicateur *= np.array(data_cur.execute(
+                "SELECT probar_hopital, probar_deces from maladie WHERE nom = ?", (maladie, )).fetchall()[0])
+    return multiplicateur[0], multiplicateur[1]
+
+
+def generer_donnees(data_cur, nb_individus, graine=0):
+    """Génère des colonnes de caractéristiques aléatoires (âge, sexe, quintile, habitudes et maladies) couvrant toutes les valeurs possibles"""
+    generateur = np.random.default_rng(graine)
+    maladies = [maladie for (maladie,) in data_cur.execute("SELECT nom FROM maladie").fetchall()]
+    donnees = {
+        "age": generateur.integers(0, 101, nb_individus),
+        "sexe": generateur.choice(["femme", "homme"], nb_individus).astype(object),
+        "quintile": generateur.integers(1, 6, nb_individus),
+        "tabac": (generateur.random(nb_individus) < 0.2).astype(np.int64),
+        "alcool": (generateur.random(nb_individus) < 0.1).astype(np.int64),
+    }
+    for maladie in maladies:
+        donnees[maladie] = (generateur.random(nb_individus) < 0.1).astype(np.int64)
+    return donnees, maladies
+
+
+def benchmark_multiplicateurs(nb_individus=1000000, nb_verifies=20000):
+    """Compare le calcul vectorisé des risques relatifs au calcul individuel par requêtes SQL, et vérifie l'égalité individu par individu"""
+    data_cur = sqlite3.connect(database_loc_data).cursor()
+    donnees, maladies = generer_donnees(data_cur, nb_individus)
+
+    debut = perf_counter()
+    table = TableRisques(data_cur, maladies)
+    multiplicateur = table.multiplicateurs(donnees)
+    temps_vectorise = perf_counter() - debut
+
+    colonnes = {colonne: valeurs[:nb_verifies].tolist() for (colonne, valeurs) in donnees.items()}
+    debut = perf_counter()
+    multiplicateur_verifie = np.array([multiplicateur_sql(data_cur, {colonne: valeurs[id] for (colonne, valeurs) in colonnes.items()}, maladies)
+                                       for id in range(nb_verifies)])
+    temps_sql = (perf_counter() - debut) * nb_individus / nb_verifies
+    data_cur.close()
+
+    print(f"{nb_individus} individus : vectorisé {temps_vectorise:.2f}s, SQL {temps_sql:.2f}s (estimé), accélération x{temps_sql/temps_vectorise:.0f} "
+          f"({nb_verifies} individus vérifiés)")
+    differents = np.flatnonzero((multiplicateur_verifie != multiplicateur[:nb_verifies]).any(axis=1))
+    assert np.array_equal(multiplicateur_verifie, multiplicateur[:nb_verifies]), \
+        f"Risques relatifs différents pour {len(differents)} individus (premiers : {differents[:10].tolist()})"
+
+
+def benchmark_vaccination(nb_individus=1000000, nb_jours=100, part_doses=0.005):
+    """Compare la distribution quotidienne des doses par parcours de toute la population et par tirage parmi les candidats indexés
+
+    Les doses du jour représentent une part fixe de la population, et un individu sur dix est infecté (donc non vaccinable)."""
+    generateur = np.random.default_rng(0)
+    ages = generateur.integers(0, 101, nb_individus)
+    activites = generateur.choice(["santé", "autre"], nb_individus, p=[0.05, 0.95]).astype(object)
+    sains = generateur.random(nb_individus) >= 0.1
+    clauses = [(0, {"age": 85, "comp": "sup"}), (6, {"age": 50, "emploi": "santé", "comp": "sup"}), (22, {"age": 75, "comp": "sup"}),
+               (75, {"age": 65, "comp": "sup"}), (100, {"age": 50, "comp": "sup"}), (130, {"age": 18, "comp": "sup"})]
+    strategie = type("Strategie", (), {"dates_vaccination": clauses})
+    doses = int(nb_individus * part_doses)
+
+    # Parcours de toute la population chaque jour (masque des éligibles puis tirage parmi les candidats)
+    vaccines = np.zeros(nb_individus, dtype=bool)
+    debut = perf_counter()
+    for jour in range(1, nb_jours + 1):
+        eligibles = np.zeros(nb_individus, dtype=bool)
+        for (date, clause) in clauses:
+            if date <= jour:
+                eligibles[individus_eligibles(clause, ages, activites)] = True
+        candidats = np.flatnonzero(eligibles & ~vaccines & sains)
+        vaccines[generateur.choice(candidats, min(doses, len(candidats)), replace=False)] = True
+    temps_parcours = perf_counter() - debut
+    total_parcours = vaccines.sum()
+
+    # Candidats indexés
+    plan = PlanVaccination(strategie, ages, activites)
+    total_plan = 0
+    debut = perf_counter()
+    for jour in range(1, nb_jours + 1):
+        plan.activer(jour)
+        total_plan += len(plan.tirer(doses, lambda individus: sains[individus], generateur))
+    temps_plan = perf_counter() - debut
+
+    print(f"{nb_individus} individus, {doses} doses par jour sur {nb_jours} jours : parcours {temps_parcours:.2f}s ({total_parcours} vaccinés), "
+          f"candidats indexés {temps_plan:.2f}s ({total_plan} vaccinés), accélération x{temps_parcours/temps_plan:.0f}")
+
+
+def population_synthetique(nb_individus, max_distance=1.5, densite=100, graine=0):
+    """Renvoie une population aléatoire (sans base de données ni instantané)"""
+    generateur = np.random.default_rng(graine)
+    population = Population.__new__(Population)
+    population.nb_individus = nb_individus
+    population.variance_pop = (nb_individus/densite)**0.5
+    population.max_distance = max_distance
+    population.cache_individus = None
+    population.population_position = generer_positions(nb_individus, population.variance_pop, graine)
+    population.voisins_index, population.voisins_id, population.voisins_distance = construire_voisins(population.population_position, max_distance)
+    population.voisins_poids = poids_voisins(population.voisins_distance)
+    population.age = generateur.integers(0, 101, nb_individus)
+    population.sexe = generateur.choice(["femme", "homme"], nb_individus).astype(object)
+    population.activite = np.full(nb_individus, None, dtype=object)
+    population.multiplicateur = generateur.random((nb_individus, 2))
+    population.instantane = None
+    return population
+
+
+def benchmark_tuiles(nb_individus=1000000, nb_jours=15, processus=(1, 2, 4, 8, 16), nb_tuiles=16):
+    """Mesure le temps moyen d'un jour de simulation par tuiles selon le nombre de processus, et vérifie que les résultats n'en dépendent pas"""
+    donnees = DonneesReference()
+    population = population_synthetique(nb_individus)
+    print(f"{nb_individus} individus, {len(population.voisins_id)} voisins, {nb_tuiles} tuiles, {nb_jours} jours")
+    resultats = []
+    for nb_processus in processus:
+        moteur = MoteurTuiles(donnees, population, Strategie([(0, {"age": 50, "comp": "sup"})]), SituationInitiale(100, 10),
+                              Parametres(nb_jours, infection_proba=0.03), 0, nb_processus, nb_tuiles)
+        try:
+            moteur.initialiser()
+            debut = perf_counter()
+            for jour in range(1, nb_jours + 1):
+                moteur.jour(jour)
+            temps = (perf_counter() - debut) / nb_jours
+        finally:
+            moteur.fermer()
+        resultats.append(moteur.totaux())
+        print(f"{nb_processus} processus : {temps:.2f}s par jour, totaux {moteur.totaux()}")
+    assert all(totaux == resultats[0] for totaux in resultats), f"Totaux différents selon le nombre de processus : {dict(zip(processus, resultats))}"
+
+
+def benchmark_reprise(nb_individus=1000000, nb_jours=15):
+    """Compare le temps d'enregistrement et de chargement d'un point de reprise au temps d'un jour de simulation"""
+    donnees = DonneesReference()
+    population = population_synthetique(nb_individus)
+    moteur = MoteurVectorise(donnees, population, Strategie([(0, {"age": 50, "comp": "sup"})]), SituationInitiale(100, 10),
+                             Parametres(nb_jours, infection_proba=0.03), np.random.default_rng(0))
+    moteur.initialiser()
+    debut = perf_counter()
+    for jour in range(1, nb_jours + 1):
+        moteur.jour(jour)
+    temps_jour = (perf_counter() - debut) / nb_jours
+
+    with tempfile.TemporaryDirectory(prefix="reprise_") as dossier:
+        chemin = os.path.join(dossier, "jour.npz")
+        debut = perf_counter()
+        enregistrer_point(chemin, nb_jours, {}, *moteur.sauvegarde())
+        temps_enregistrement = perf_counter() - debut
+        debut = perf_counter()
+        jour, stats, tableaux, valeurs = charger_point(chemin)
+        moteur.restaurer(tableaux, valeurs)
+        temps_chargement = perf_counter() - debut
+        taille = os.path.getsize(chemin)
+
+    print(f"{nb_individus} individus, {moteur.nb_infectes} infectés : jour {temps_jour:.2f}s, point de reprise {taille/1e6:.0f} Mo, "
+          f"enregistrement {temps_enregistrement:.3f}s ({temps_enregistrement/temps_jour:.1%} d'un jour), chargement {temps_chargement:.3f}s")
+
+
+def contaminer_aretes(moteur, infectes, jour):
+    """Renvoie les voisins contaminés selon le calcul historique : un tirage aléatoire pour chaque arête vers un voisin sain"""
+    index = moteur.population.voisins_index
+    debut = index[infectes]
+    nb_voisins = index[infectes+1] - debut
+    aretes = np.repeat(debut - np.cumsum(nb_voisins) + nb_voisins, nb_voisins) + np.arange(nb_voisins.sum())
+    voisins = moteur.population.voisins_id[aretes]
+    sains = moteur.etat.sante[voisins] == NEUTRE
+    voisins = voisins[sains]
+    # Distances recalculées en float64 à partir des positions, comme cdist
+    ecart = (moteur.population.population_position[np.repeat(infectes, nb_voisins)[sains]].astype(np.float64)
+             - moteur.population.population_position[voisins].astype(np.float64))
+    distances = np.sqrt(ecart[:, 0]*ecart[:, 0] + ecart[:, 1]*ecart[:, 1])
+    infection = moteur.tirage(moteur.param.infection_proba, moteur.immunite(voisins, jour, INFECTION)/(1+distances))
+    return np.unique(voisins[infection])
+
+
+def contaminer_objets(moteur, infectes, jour, tirages):
+    """Renvoie les voisins contaminés par le moteur par individus (objets Individu dans le même état que le moteur vectorisé),
+    puis les rend de nouveau sains"""
+    individus = moteur.population.individus
+    contamines = []
+
+    def infecter(voisin):
+        voisin.sante = INFECTE
+        contamines.append(voisin)
+
+    for id in infectes.tolist():
+        contaminer_voisins(individus[id], individus, moteur.param.infection_proba, jour, moteur.table_immunite, tirages, infecter)
+    for voisin in contamines:
+        voisin.sante = NEUTRE
+    return contamines
+
+
+def benchmark_transmission(nb_individus=100000, distances=(1.5, 3, 5), part_infectes=0.01, nb_repetitions=20):
+    """Compare la contamination des voisins avec un tirage par arête (calcul historique), par arêtes candidates (loi binomiale
+    puis acceptation) et par sauts géométriques du moteur par individus, pour des populations de plus en plus denses (max_distance croissant)
+
+    Le nombre moyen de contaminés doit être le même aux fluctuations aléatoires près : échec si l'écart d'une méthode au calcul
+    historique dépasse SEUIL_EQUIVALENCE erreurs types."""
+    donnees = DonneesReference()
+    for max_distance in distances:
+        population = population_synthetique(nb_individus, max_distance)
+        moteur = MoteurVectorise(donnees, population, Strategie([]), SituationInitiale(0, 0), Parametres(1, infection_proba=0.004),
+                                 np.random.default_rng(0))
+        # Une partie des individus est vaccinée pour que l'immunité varie d'un voisin à l'autre (même état pour les objets Individu)
+        moteur.etat.vaccin_type[::3] = 0
+        moteur.etat.vaccin_date[::3] = 0
+        for individu in population.individus[::3]:
+            individu.vacciner(moteur.table_immunite.vaccins[0], 0)
+        infectes = np.sort(moteur.generateur.choice(nb_individus, int(nb_individus*part_infectes), replace=False))
+        nb_aretes = int((population.voisins_index[infectes+1] - population.voisins_index[infectes]).sum())
+        tirages = TiragesGroupes(np.random.default_rng(1))
+
+        resultats = {}
+        for (nom, contaminer) in (("par arête", contaminer_aretes), ("candidates", MoteurVectorise.contaminer),
+                                  ("objets", lambda moteur, infectes, jour: contaminer_objets(moteur, infectes, jour, tirages))):
+            debut = perf_counter()
+            nombres = [len(contaminer(moteur, infectes, 30)) for _ in range(nb_repetitions)]
+            resultats[nom] = ((perf_counter() - debut)/nb_repetitions, np.mean(nombres), np.std(nombres)/nb_repetitions**0.5)
+        (temps_aretes, moyenne_aretes, erreur_aretes) = resultats["par arête"]
+        ecarts = {nom: (moyenne - moyenne_aretes)/np.hypot(erreur, erreur_aretes) for (nom, (temps, moyenne, erreur)) in resultats.items()}
+        print(f"max_distance {max_distance} : {nb_aretes/len(infectes):.0f} voisins par infecté, " + ", ".join(
+            f"{nom} {temps*1000:.1f}ms ({moyenne:.1f} contaminés, écart {ecarts[nom]:+.1f} erreurs types)" for (nom, (temps, moyenne, erreur)) in resultats.items()))
+        assert all(abs(ecart) <= SEUIL_EQUIVALENCE for ecart in ecarts.values()), f"Contaminations différentes (max_distance {max_distance}) : {ecarts}"
+
+
+def benchmark_equivalence(nb_individus=3000, nb_repliques=40, nb_jours=150):
+    """Vérifie que les moteurs par individus et vectorisé donnent les mêmes indicateurs en moyenne sur un ensemble de répliques
+    (échec si un écart dépasse SEUIL_EQUIVALENCE erreurs types)"""
+    donnees = DonneesReference()
+    population = population_synthetique(nb_individus)
+    strategie = Strategie([(0, {"age": 75, "comp": "sup"}), (30, {"age": 50, "comp": "sup"}), (60, {"age": 18, "comp": "sup"})])
+    parametres = Parametres(nb_jours, infection_proba=0.004, hopital_proba=0.05, deces_proba=0.2)
+    debut = perf_counter()
+    _, comparaison = comparer_moteurs(donnees, population, strategie, SituationInitiale(20, 4), parametres, nb_repliques, graine=0)
+    print(f"{nb_individus} individus, {nb_repliques} répliques par moteur en {perf_counter() - debut:.0f}s : moyenne (écart type) individus / vectorisé")
+    for (nom, valeurs) in comparaison.items():
+        print(f"{nom} : {valeurs['reference']:.1f} ({valeurs['ecart_type_reference']:.1f}) / {valeurs['moyenne']:.1f} ({valeurs['ecart_type']:.1f}), "
+              f"écart {valeurs['score']:+.1f} erreurs types")
+    ecarts = {nom: valeurs["score"] for (nom, valeurs) in comparaison.items() if abs(valeurs["score"]) > SEUIL_EQUIVALENCE}
+    assert not ecarts, f"Moteurs par individus et vectorisé différents (écarts en erreurs types) : {ecarts}"
+
+
+class IndividuHistorique:
+    """Individu tel qu'il était stocké historiquement : attributs dans un dictionnaire et liste de voisins (identifiant, distance)"""
+
+    def __init__(self, id, age, sexe, activite, multiplicateur, voisins):
+        self.id = id
+        self.age = age
+        self.sexe = sexe
+        self.activite = activite
+        self.multiplicateur = multiplicateur
+        self.voisins = voisins
+        self.sante = 0
+        self.infection = 0
+        self.sante_fin = None
+        self.infection_fin = None
+        self.vaccin_type = None
+        self.vaccin_date = None
+        self.infection_immunite_date = None
+
+
+def memoire_allouee(creer):
+    """Renvoie le résultat de creer() et la mémoire qu'il occupe (octets alloués et non libérés, mesurés par tracemalloc)"""
+    tracemalloc.start()
+    avant = tracemalloc.get_traced_memory()[0]
+    resultat = creer()
+    apres = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return resultat, apres - avant
+
+
+def benchmark_memoire(nb_individus=10000, variance_pop=10, max_distance=5, echantillon=1000):
+    """Compare la mémoire occupée par individu et par voisin entre le stockage historique (objets avec dictionnaire et listes de
+    tuples (numpy.int64, numpy.float64)) et le stockage actuel (objets avec __slots__ et vues sur le graphe CSR compact)
+
+    Les objets historiques sont créés pour un échantillon d'individus, et la mémoire est extrapolée à toute la population."""
+    positions = generer_positions(nb_individus, variance_pop)
+    (index, voisins, voisins_distance), octets_graphe = memoire_allouee(lambda: construire_voisins(positions, max_distance))
+    voisins_poids, octets_poids = memoire_allouee(lambda: poids_voisins(voisins_distance))
+    octets_graphe += octets_poids
+    multiplicateur = np.ones((nb_individus, 2))
+    ids = np.random.default_rng(0).choice(nb_individus, echantillon, replace=False)
+    nb_aretes = int(sum(index[id+1] - index[id] for id in ids))
+
+    # Stockage historique : voisins calculés par cdist, liste de tuples par individu
+    listes = [voisins_cdist(positions, max_distance, id) for id in ids]
+    individus, octets_historique = memoire_allouee(lambda: [
+        IndividuHistorique(int(id) + 1, 40, "homme", None, multiplicateur[id], list(zip(*liste))) for (id, liste) in zip(ids, listes)])
+    del individus, listes
+
+    # Stockage actuel : vues sur le graphe partagé (le graphe est compté séparément)
+    individus, octets_objets = memoire_allouee(lambda: [
+        Individu(int(id) + 1, 40, "homme", None, multiplicateur[id], voisins[index[id]:index[id+1]], voisins_poids[index[id]:index[id+1]]) for id in ids])
+    del individus
+    octets_etat = sum(np.dtype(type).itemsize for (nom, type, valeur) in CHAMPS_ETAT)
+
+    print(f"{nb_individus} individus, {len(voisins)} voisins ({len(voisins)/nb_individus:.0f} par individu), échantillon de {echantillon} individus")
+    print(f"Historique : {octets_historique/echantillon:.0f} octets par individu, {octets_historique/nb_aretes:.0f} octets par voisin, "
+          f"{octets_historique/echantillon*nb_individus/1e6:.0f} Mo pour la population")
+    print(f"Objets Individu : {octets_objets/echantillon:.0f} octets par individu + graphe {octets_graphe/len(voisins):.1f} octets par voisin, "
+          f"{(octets_objets/echantillon*nb_individus + octets_graphe)/1e6:.0f} Mo pour la population")
+    print(f"Moteur vectorisé : {octets_etat} octets d'état par individu + graphe {octets_graphe/len(voisins):.1f} octets par voisin, "
+          f"{(octets_etat*nb_individus + octets_graphe)/1e6:.0f} Mo pour la population")
+
+
+def benchmark_couches(nb_individus=1000000, nb_jours=10, secteurs=("santé", "médico-social", "commerce", "industrie", "enseignement")):
+    """Mesure la construction des couches de contacts (ménages, écoles, travail, voisinage) et le temps moyen d'un jour de simulation
+    avec les couches (produits matrice creuse-vecteur), comparé au seul graphe des voisins"""
+    donnees = DonneesReference()
+    population = population_synthetique(nb_individus)
+    generateur = np.random.default_rng(0)
+    population.activite[(population.age >= 3) & (population.age < 15)] = "études"
+    actifs = np.flatnonzero((population.age >= 18) & (population.age < 65) & (generateur.random(nb_individus) < 0.7))
+    population.activite[actifs] = generateur.choice(secteurs, len(actifs))
+
+    debut = perf_counter()
+    couches = CouchesContacts.construire(population, graine=0)
+    print(f"{nb_individus} individus : couches construites en {perf_counter() - debut:.2f}s, contacts {couches.nb_contacts()}")
+
+    for (nom, couches_moteur) in (("voisins", None), ("couches", couches)):
+        moteur = MoteurVectorise(donnees, population, Strategie([(0, {"age": 50, "comp": "sup"})]), SituationInitiale(100, 10),
+                                 Parametres(nb_jours, infection_proba=0.03), np.random.default_rng(0), couches=couches_moteur)
+        moteur.initialiser()
+        debut = perf_counter()
+        for jour in range(1, nb_jours + 1):
+            moteur.jour(jour)
+        print(f"{nom} : {(perf_counter() - debut)/nb_jours:.3f}s par jour, totaux {moteur.totaux()}")
+
+
+def benchmark_compartiments(nb_individus=20000, nb_repliques=20, tailles=(10000, 1000000, 67000000), nb_jours=200, reference="individus"):
+    """Compare le moteur compartiments au moteur de référence (moyennes de nb_repliques répliques sur une même population),
+    puis mesure le temps d'un jour du moteur compartiments selon le nombre d'individus simulés à partir de cette population
+
+    Le scénario est proche du seuil épidémique, où le brassage homogène du moteur compartiments est valable : échec si le pic
+    ou le nombre d'infections s'écarte de plus de TOLERANCE_COMPARTIMENTS de la référence (voir MoteurCompartiments)."""
+    donnees = DonneesReference()
+    population = population_synthetique(nb_individus)
+    strategie = Strategie([(0, {"age": 75, "comp": "sup"}), (60, {"age": 50, "comp": "sup"}), (120, {"age": 18, "comp": "sup"})])
+    parametres = Parametres(nb_jours, infection_proba=0.004, hopital_proba=0.05, deces_proba=0.2)
+    _, _, comparaison = valider_compartiments(donnees, population, strategie, SituationInitiale(50, 5), parametres, nb_repliques, graine=0,
+                                              reference=reference)
+    print(f"{nb_individus} individus, {nb_repliques} répliques : moyenne (écart type) {reference} / compartiments")
+    for (nom, valeurs) in comparaison.items():
+        print(f"{nom} : {valeurs['reference']:.1f} ({valeurs['ecart_type_reference']:.1f}) / {valeurs['moyenne']:.1f} "
+              f"({valeurs['ecart_type']:.1f}), écart {100*valeurs['ecart_relatif']:+.1f}% ({valeurs['score']:+.1f} erreurs types)")
+    ecarts = {nom: comparaison[nom]["ecart_relatif"] for nom in ("infections", "pic_infectes")
+              if abs(comparaison[nom]["ecart_relatif"]) > TOLERANCE_COMPARTIMENTS}
+    assert not ecarts, f"Moteur compartiments trop éloigné du moteur {reference} (écarts relatifs, tolérance {TOLERANCE_COMPARTIMENTS}) : {ecarts}"
+
+    for taille in tailles:
+        moteur = MoteurCompartiments(donnees, population, strategie, SituationInitiale(taille//1000, taille//10000), parametres,
+                                     np.random.default_rng(0), taille)
+        moteur.initialiser()
+        debut = perf_counter()
+        for jour in range(1, nb_jours + 1):
+            moteur.jour(jour)
+        print(f"{taille} individus : {1000*(perf_counter() - debut)/nb_jours:.1f}ms par jour, totaux {moteur.totaux()}")
+
+
+BENCHMARKS = {
+    "voisins": benchmark_voisins,
+    "immunite": benchmark_immunite,
+    "multiplicateurs": benchmark_multiplicateurs,
+    "vaccination": benchmark_vaccination,
+    "tuiles": benchmark_tuiles,
+    "reprise": benchmark_reprise,
+    "memoire": benchmark_memoire,
+    "transmission": benchmark_transmission,
+    "equivalence": benchmark_equivalence,
+    "couches": benchmark_couches,
+    "compartiments": benchmark_compartiments,
+}
+
+if __name__ == "__main__":
+    for nom in sys.argv[1:] or BENCHMARKS:
+        print(f"=== Benchmark : {nom} ===")
+        BENCHMARKS[nom]()
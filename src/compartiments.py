@@ -0,0 +1,348 @@
+"""Moteur de simulation agrégé : la population est regroupée en strates (compartiments) dont les effectifs évoluent
+par tirages binomiaux d'un jour à l'autre (tau-leaping), en un temps qui ne dépend pas du nombre d'individus"""
+
+# Modules externes
+import numpy as np
+from scipy.special import ndtr
+
+# Modules internes
+from constantes import *
+from immunite import AGE_MAX
+from instrumentation import INACTIVE
+
+# Bornes des tranches d'âge des strates, complétées par les âges des clauses de la stratégie vaccinale
+TRANCHES_AGES = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90]
+
+# Nombre de classes de risque (quantiles du multiplicateur de risque d'hospitalisation) dans chaque tranche d'âge
+NB_CLASSES_RISQUE = 5
+
+# Durée d'une strate de temps écoulé depuis l'immunité (vaccin ou infection) : toutes les strates vieillissent ensemble chaque semaine
+JOURS_STRATE = 7
+
+# Écart relatif maximal du pic et du nombre d'infections (moyennes des répliques) au moteur par individus, près du seuil épidémique
+TOLERANCE_COMPARTIMENTS = 0.4
+
+
+def loi_duree(duree, minimum=0):
+    """Renvoie la probabilité de chaque durée d'un état (0 à la durée maximale) tirée comme dans les autres moteurs :
+    loi normale (moyenne, écart type) arrondie à l'entier le plus proche, les durées inférieures à minimum valant minimum"""
+    moyenne, ecart_type = duree
+    durees = np.arange(max(int(np.ceil(moyenne + 8*ecart_type)), minimum, 0) + 1)
+    # Probabilité que la durée arrondie soit inférieure ou égale à chaque durée (les durées négatives valent 0)
+    if ecart_type > 0:
+        cumul = ndtr((durees + 0.5 - moyenne)/ecart_type)
+    else:
+        cumul = (durees + 0.5 > moyenne).astype(np.float64)
+    probabilites = np.diff(cumul, prepend=0)
+    probabilites[minimum] += probabilites[:minimum].sum()
+    probabilites[:minimum] = 0
+    return probabilites/probabilites.sum()
+
+
+def repartir(effectifs, total):
+    """Renvoie des effectifs entiers proportionnels aux effectifs donnés et de somme total (méthode du plus fort reste)"""
+    parts = np.asarray(effectifs, dtype=np.float64)*total/np.sum(effectifs)
+    entiers = np.floor(parts).astype(np.int64)
+    restes = np.argsort(entiers - parts, kind="stable")[:total - entiers.sum()]
+    entiers[restes] += 1
+    return entiers
+
+
+def bornes_ages(strategie):
+    """Renvoie les bornes des tranches d'âge : TRANCHES_AGES et les âges à partir desquels une clause de la stratégie
+    change d'éligibilité, pour que chaque tranche soit entièrement éligible ou non à chaque clause"""
+    bornes = set(TRANCHES_AGES) | {13}
+    for (date, clause) in strategie.dates_vaccination:
+        if "age" in clause:
+            bornes.add(clause["age"] if clause["comp"] == "sup" else clause["age"] + 1)
+    return np.array(sorted(bornes))
+
+
+def contacts_effectifs(population):
+    """Renvoie le nombre effectif de contacts (somme des poids de transmission des voisins, l'individu lui-même exclu) du brassage homogène
+
+    Un individu est contaminé et contamine à son tour en proportion de ses contacts : la moyenne des contacts est donc pondérée
+    par les contacts (somme des carrés sur somme), ce qui rend compte des individus très entourés au centre de la population."""
+    index = np.asarray(population.voisins_index)
+    lignes = np.repeat(np.arange(population.nb_individus), np.diff(index))
+    autres = np.asarray(population.voisins_id) != lignes
+    contacts = np.bincount(lignes[autres], np.asarray(population.voisins_poids, dtype=np.float64)[autres], minlength=population.nb_individus)
+    return float((contacts**2).sum()/max(contacts.sum(), 1e-300))
+
+
+def vieillir(tableau):
+    """Fait passer les effectifs à la strate de temps écoulé suivante (dernier axe), la dernière strate regroupant les plus anciens"""
+    tableau[..., -1] += tableau[..., -2]
+    tableau[..., 1:-1] = tableau[..., :-2].copy()
+    tableau[..., 0] = 0
+
+
+class Strates:
+    """Représente le découpage de la population en profils (tranche d'âge, classe de risque, secteur d'activité visé par la stratégie),
+    et pour chaque profil l'effectif, les multiplicateurs de risque moyens et l'efficacité moyenne de chaque immunité
+
+    Les strates du moteur croisent les profils avec l'immunité (vaccin, infection ou aucune) et le temps écoulé depuis l'immunité
+    (par tranches de JOURS_STRATE jours, jusqu'à la dernière borne finie de la table d'efficacité)."""
+
+    def __init__(self, donnees, population, strategie, nb_individus=None, nb_classes_risque=NB_CLASSES_RISQUE):
+        ages = np.minimum(np.asarray(population.age, dtype=np.int64), AGE_MAX)
+        multiplicateur = np.asarray(population.multiplicateur, dtype=np.float64)
+        activites = np.asarray(population.activite, dtype=object)
+
+        # Tranche d'âge et secteur d'activité (secteurs des clauses de la stratégie, puis tous les autres)
+        self.bornes = bornes_ages(strategie)
+        tranche = np.searchsorted(self.bornes, ages, "right") - 1
+        self.secteurs = sorted({clause["emploi"] for (date, clause) in strategie.dates_vaccination if "emploi" in clause})
+        secteur = np.full(len(ages), len(self.secteurs), dtype=np.int64)
+        for (numero, nom) in enumerate(self.secteurs):
+            secteur[activites == nom] = numero
+
+        # Classe de risque : rang du multiplicateur d'hospitalisation parmi les individus de la même tranche d'âge
+        ordre = np.lexsort((multiplicateur[:, 0], tranche))
+        tailles = np.bincount(tranche, minlength=len(self.bornes))
+        debuts = np.cumsum(tailles) - tailles
+        classe = np.empty(len(ages), dtype=np.int64)
+        classe[ordre] = (np.arange(len(ages)) - debuts[tranche[ordre]])*nb_classes_risque//tailles[tranche[ordre]]
+
+        # Profils présents dans la population
+        cles, profil = np.unique((tranche*nb_classes_risque + classe)*(len(self.secteurs) + 1) + secteur, return_inverse=True)
+        effectifs = np.bincount(profil)
+        self.tranche = cles//(nb_classes_risque*(len(self.secteurs) + 1))
+        self.secteur = cles % (len(self.secteurs) + 1)
+        self.nb_profils = len(cles)
+        self.multiplicateur = np.stack([np.bincount(profil, multiplicateur[:, colonne])/effectifs for colonne in range(2)], axis=1)
+        self.nb_individus = population.nb_individus if nb_individus is None else nb_individus
+        self.effectifs = effectifs if nb_individus is None else repartir(effectifs, nb_individus)
+
+        # Efficacité de chaque immunité (vaccins, infection, puis aucune) par profil et strate de temps écoulé, moyenne sur les âges du profil
+        # et sur les jours de la strate : les individus immunisés un jour quelconque d'une tranche de JOURS_STRATE jours changent de strate
+        # ensemble, si bien que le temps écoulé d'une strate suit une loi triangulaire autour de JOURS_STRATE*strate
+        table = donnees.immunite
+        self.vaccins = table.vaccins
+        self.vaccin_infection = table.index_vaccin["Infection"]
+        self.nb_strates_temps = int(np.ceil(table.bornes[-2]*30.5/JOURS_STRATE)) + 2
+        ecarts = np.arange(1 - JOURS_STRATE, JOURS_STRATE)
+        jours = JOURS_STRATE*np.arange(self.nb_strates_temps)[:, None] + ecarts[None, :]
+        poids = np.where(jours >= 0, JOURS_STRATE - np.abs(ecarts), 0).astype(np.float64)
+        poids /= poids.sum(axis=1, keepdims=True)
+        efficacite_ages = np.einsum("tvajk,jk->tvaj", table.table[:, :, :, table.tranche(np.maximum(jours, 0))], poids)
+        repartition_ages = np.bincount(profil*(AGE_MAX + 1) + ages, minlength=self.nb_profils*(AGE_MAX + 1)).reshape(self.nb_profils, AGE_MAX + 1)
+        repartition_ages = repartition_ages/effectifs[:, None]
+        self.efficacite = np.zeros((efficacite_ages.shape[0], self.nb_profils, len(self.vaccins) + 1, self.nb_strates_temps))
+        self.efficacite[:, :, :-1] = np.einsum("pa,tvaj->tpvj", repartition_ages, efficacite_ages)
+
+    def eligibles(self, clauses):
+        """Renvoie le masque des profils éligibles à la vaccination selon au moins une des clauses (équivalent de individus_eligibles)"""
+        debut = self.bornes[self.tranche]
+        fin = np.append(self.bornes[1:] - 1, np.iinfo(np.int64).max)[self.tranche]
+        masque = np.zeros(self.nb_profils, dtype=bool)
+        for clause in clauses:
+            valide = debut > 12
+            if "age" in clause and clause["comp"] == "sup":
+                valide &= debut >= clause["age"]
+            elif "age" in clause and clause["comp"] == "inf":
+                valide &= fin <= clause["age"]
+            if "emploi" in clause:
+                valide &= self.secteur == self.secteurs.index(clause["emploi"])
+            masque |= valide
+        return masque
+
+
+class MoteurCompartiments:
+    """Moteur de la simulation qui fait évoluer les effectifs des strates plutôt que l'état de chaque individu
+
+    Les sains sont comptés par strate (profil, immunité, temps écoulé depuis l'immunité), les infectés et hospitalisés par strate
+    et par jour de fin de leur état (calendriers circulaires), comme les événements des calendriers du moteur vectorisé.
+    Chaque jour, les fins d'état, les contaminations et les vaccinations sont tirées par des lois binomiales, multinomiales
+    et hypergéométriques sur les effectifs, avec les mêmes probabilités que les autres moteurs.
+
+    Les contaminations supposent un brassage homogène : un individu sain rencontre chaque jour des contacts de poids total contacts
+    (par défaut le nombre effectif de contacts du graphe des voisins de la population), dont la part d'infectés est celle de toute la population.
+    Comme dans les autres moteurs, les individus contaminés au cours du jour contaminent à leur tour le jour même (par vagues).
+
+    Biais du champ moyen : dans le graphe des voisins, les contacts d'un infecté sont plus souvent déjà infectés ou immunisés
+    que la moyenne de la population (épuisement local), ce que le brassage homogène ignore. Près du seuil épidémique, les
+    deux approches sont proches : le pic et le nombre d'infections restent à moins de TOLERANCE_COMPARTIMENTS du moteur par
+    individus (voir benchmark.py compartiments). Au-delà, le moteur compartiments surestime nettement le pic et le nombre
+    d'infections : environ 1750 infectés au pic contre 900 pour 3000 individus avec infection_proba=0.01. Aucun nombre de contacts
+    constant ne corrige ce biais dans tous les régimes ; ce moteur sert au criblage des stratégies, pas aux prévisions."""
+
+    def __init__(self, donnees, population, strategie, situation_init, parametres, generateur, nb_individus=None, contacts=None):
+        self.donnees = donnees
+        self.strategie = strategie
+        self.init = situation_init
+        self.param = parametres
+        self.generateur = generateur
+        self.strates = Strates(donnees, population, strategie, nb_individus)
+        self.nb_individus = self.strates.nb_individus
+        self.contacts = contacts_effectifs(population) if contacts is None else contacts
+        self.etat = None  # Pas d'état individuel
+        self.doses_a_distribuer = 0
+
+        # Immunités : vaccins et infection (indices de la table d'efficacité), puis aucune
+        strates = self.strates
+        self.aucun = len(strates.vaccins)
+        self.vaccine = np.ones(self.aucun + 1, dtype=bool)
+        self.vaccine[[strates.vaccin_infection, self.aucun]] = False
+        forme = (strates.nb_profils, self.aucun + 1, strates.nb_strates_temps)
+
+        # Probabilités de chaque strate : infection (multiplicateur de l'immunité), hospitalisation et décès
+        self.immunite = 1 - strates.efficacite[INFECTION-1]
+        self.hopital_proba = np.minimum(parametres.hopital_proba*strates.multiplicateur[:, 0, None, None]*(1 - strates.efficacite[HOSPITALISATION-1]), 1)
+        self.deces_proba = np.minimum(parametres.deces_proba*strates.multiplicateur[:, 1, None, None]*(1 - strates.efficacite[DECES-1]), 1)
+
+        # Lois des jours de fin : infection d'au moins un jour (les infections de 0 jour sont rares et reportées au lendemain),
+        # infection initiale et hospitalisation à partir du lendemain
+        self.loi_infection = loi_duree(parametres.infection_duree, 1)
+        self.loi_infection_initiale = np.concatenate(([0], loi_duree(parametres.infection_duree)))
+        self.loi_hopital = np.concatenate(([0], loi_duree(parametres.hopital_duree)))
+
+        # Effectifs des sains par strate et calendriers circulaires des fins d'infection et d'hospitalisation (jour modulo longueur)
+        self.sains = np.zeros(forme, dtype=np.int64)
+        self.sains[:, self.aucun, 0] = strates.effectifs
+        self.infectes = np.zeros((max(len(self.loi_infection), len(self.loi_infection_initiale)), *forme), dtype=np.int64)
+        self.hospitalises = np.zeros((len(self.loi_hopital), *forme), dtype=np.int64)
+
+        # Totaux tenus à jour à chaque changement d'état
+        self.nb_infectes = 0
+        self.nb_hospitalises = 0
+        self.nb_decedes = 0
+        self.nb_vaccines = 0
+
+        # Mesure du temps des phases et comptage des opérations (voir instrumentation.py)
+        self.instrumentation = INACTIVE
+
+    def choisir(self, effectifs, nombre):
+        """Renvoie les effectifs (même forme) de nombre individus tirés sans remise parmi les effectifs donnés"""
+        choisis = np.zeros_like(effectifs)
+        strates = np.flatnonzero(effectifs)
+        if nombre > 0 and len(strates):
+            choisis.flat[strates] = self.generateur.multivariate_hypergeometric(effectifs.flat[strates], min(nombre, int(effectifs.sum())))
+        return choisis
+
+    def programmer(self, calendrier, effectifs, jour, loi):
+        """Répartit les effectifs des strates entre les jours de fin de leur état (jour + durée) selon la loi des durées"""
+        strates = np.flatnonzero(effectifs)
+        if len(strates) == 0:
+            return
+        self.instrumentation.compter("tirages", len(strates))
+        durees = np.flatnonzero(loi)
+        repartition = self.generateur.multinomial(effectifs.flat[strates], loi[durees])
+        calendrier.reshape(len(calendrier), -1)[((jour + durees) % len(calendrier))[:, None], strates[None, :]] += repartition.T
+
+    def extraire(self, calendrier, jour):
+        """Renvoie les effectifs des strates dont l'état se termine au jour donné, et les retire du calendrier"""
+        fin = calendrier[jour % len(calendrier)].copy()
+        calendrier[jour % len(calendrier)] = 0
+        return fin
+
+    def tirage(self, effectifs, probabilites):
+        """Renvoie le nombre d'individus de chaque strate retenus selon la probabilité de la strate"""
+        self.instrumentation.compter("tirages", effectifs.size)
+        return self.generateur.binomial(effectifs, probabilites)
+
+    def guerir(self, effectifs):
+        """Ajoute aux sains les individus guéris : les vaccinés gardent leur vaccin, les autres sont immunisés par l'infection du jour"""
+        self.sains[:, self.vaccine] += effectifs[:, self.vaccine]
+        self.sains[:, self.strates.vaccin_infection, 0] += effectifs[:, ~self.vaccine].sum(axis=(1, 2))
+
+    def initialiser(self):
+        """Met en place la situation initiale (jour 0)"""
+        infectes = self.choisir(self.sains, self.init.nombre_infectes)
+        self.sains -= infectes
+        hospitalises = self.choisir(self.sains, self.init.nombre_hospitalises)
+        self.sains -= hospitalises
+        self.programmer(self.infectes, infectes, 0, self.loi_infection_initiale)
+        self.programmer(self.hospitalises, hospitalises, 0, self.loi_hopital)
+        self.nb_infectes += int(infectes.sum() + hospitalises.sum())
+        self.nb_hospitalises += int(hospitalises.sum())
+
+    def fins_hospitalisation(self, jour):
+        """Traite les hospitalisations qui se terminent, renvoie les nouveaux décédés et guéris"""
+        fin = self.extraire(self.hospitalises, jour)
+        deces = self.tirage(fin, self.deces_proba)
+        self.guerir(fin - deces)
+        nb_fin, nb_deces = int(fin.sum()), int(deces.sum())
+        self.nb_infectes -= nb_fin
+        self.nb_hospitalises -= nb_fin
+        self.nb_decedes += nb_deces
+        return nb_deces, nb_fin - nb_deces
+
+    def fins_infection(self, jour):
+        """Traite les infections qui se terminent, renvoie les nouveaux hospitalisés et guéris"""
+        fin = self.extraire(self.infectes, jour)
+        hopital = self.tirage(fin, self.hopital_proba)
+        self.programmer(self.hospitalises, hopital, jour, self.loi_hopital)
+        self.guerir(fin - hopital)
+        nb_fin, nb_hopital = int(fin.sum()), int(hopital.sum())
+        self.nb_hospitalises += nb_hopital
+        self.nb_infectes -= nb_fin - nb_hopital
+        return nb_hopital, nb_fin - nb_hopital
+
+    def contaminer(self, contagieux):
+        """Renvoie les effectifs contaminés dans chaque strate par un nombre donné de contagieux"""
+        pression = self.param.infection_proba*self.contacts*contagieux/self.nb_individus
+        return self.tirage(self.sains, -np.expm1(-pression*self.immunite))
+
+    def vacciner(self, jour):
+        """Distribue les doses de vaccin du jour aux sains éligibles pas encore vaccinés, renvoie le nombre de vaccinés du jour"""
+        vaccination_jour = jour - self.strategie.jour_debut_vaccination + 1
+        eligibles = self.strates.eligibles([clause for (date, clause) in self.strategie.dates_vaccination if date <= vaccination_jour])
+        candidats = np.zeros_like(self.sains)
+        strates = np.ix_(eligibles, ~self.vaccine)
+        candidats[strates] = self.sains[strates]
+        vaccines = 0
+        for (vaccin, nombre_doses) in self.donnees.get_nombre_vaccination(vaccination_jour):
+            # Calcul du nombre de doses effective sur la taille de la population de la simulation
+            self.doses_a_distribuer += round(nombre_doses * self.nb_individus / self.strategie.taille_population_vaccination)
+            if self.doses_a_distribuer <= 0:
+                continue
+            choisis = self.choisir(candidats, self.doses_a_distribuer)
+            candidats -= choisis
+            self.sains -= choisis
+            self.sains[:, self.strates.vaccins.index(vaccin), 0] += choisis.sum(axis=(1, 2))
+            nombre = int(choisis.sum())
+            self.instrumentation.compter("vaccines", nombre)
+            self.doses_a_distribuer -= nombre
+            vaccines += nombre
+        self.nb_vaccines += vaccines
+        return vaccines
+
+    def jour(self, jour):
+        """Simule un jour et renvoie les nouveaux infectés, hospitalisés, décédés et guéris"""
+        nouveaux_infectes = 0
+        with self.instrumentation.phase("hopital"):
+            nouveaux_decedes, nouveaux_gueris = self.fins_hospitalisation(jour)
+        with self.instrumentation.phase("fins_infection"):
+            nouveaux_hospitalises, gueris = self.fins_infection(jour)
+        nouveaux_gueris += gueris
+
+        # Contaminations par vagues : tous les contagieux du jour, puis les contaminés de la vague précédente
+        contagieux = self.nb_infectes - self.nb_hospitalises
+        with self.instrumentation.phase("contamination"):
+            while contagieux > 0:
+                vague = self.contaminer(contagieux)
+                self.sains -= vague
+                self.programmer(self.infectes, vague, jour, self.loi_infection)
+                contagieux = int(vague.sum())
+                self.nb_infectes += contagieux
+                nouveaux_infectes += contagieux
+
+        # Vaccination
+        if jour >= self.strategie.jour_debut_vaccination:
+            with self.instrumentation.phase("vaccination"):
+                self.vacciner(jour)
+
+        # Passage à la strate de temps écoulé suivante, pour toutes les immunités sauf l'absence d'immunité
+        if jour % JOURS_STRATE == 0:
+            for tableau in (self.sains, self.infectes, self.hospitalises):
+                vieillir(tableau[..., :self.aucun, :])
+
+        return nouveaux_infectes, nouveaux_hospitalises, nouveaux_decedes, nouveaux_gueris
+
+    def fermer(self):
+        """Libère les ressources du moteur à la fin de la simulation (aucune pour le moteur par compartiments)"""
+
+    def totaux(self):
+        """Renvoie le nombre total d'infectés, d'hospitalisés, de décédés et de vaccinés"""
+        return self.nb_infectes, self.nb_hospitalises, self.nb_decedes, self.nb_vaccines
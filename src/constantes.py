@@ -23,6 +23,8 @@ DECEDE : "Décédé",
 NEUTRE : "Sain",
 INFECTE : "Infecté",
 HOSPITALISE : "Hospitalisé",
+"IMMUNISE" : "Immunisé",
+"VACCINE" : "Vacciné"
 }
 
 #Couleur des points représentatifs de chaque état sur le graphe final
@@ -34,3 +36,6 @@ HOSPITALISE : ['#960606', '#690404'],
 "IMMUNISE" : ['#fcba03', '#876300'],
 "VACCINE" : ['#fc03f4', '#750272']
 }
+
+#Catégories d'affichage des individus sur le graphe final (le code d'une catégorie est son indice), par ordre de priorité croissante
+CATEGORIES = [NEUTRE, "IMMUNISE", "VACCINE", INFECTE, DECEDE]
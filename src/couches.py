@@ -0,0 +1,207 @@
+"""Réseau de contacts en plusieurs couches (ménages, écoles, lieux de travail et voisinage géographique), stockées en matrices creuses"""
+
+# Modules externes
+import json
+import os
+
+import numpy as np
+import scipy.sparse as sparse
+
+# Modules internes
+from aleatoire import graines_independantes
+
+# Répartition des ménages selon leur nombre de personnes (ménages de 5 personnes ou plus comptés avec 5 personnes), source : Insee 2019
+TAILLES_MENAGES = [(1, 0.37), (2, 0.33), (3, 0.13), (4, 0.11), (5, 0.06)]
+
+# Nombre moyen d'enfants (moins de 18 ans) par famille, proportion de familles avec deux parents et âges des parents
+ENFANTS_FAMILLE = 1.9
+PROPORTION_DEUX_PARENTS = 0.75
+AGES_PARENTS = (22, 60)
+
+# Nombre d'élèves par classe (élèves du même âge) et de personnes par lieu de travail (même secteur d'activité)
+TAILLE_CLASSE = 25
+TAILLE_LIEU_TRAVAIL = 20
+
+# Poids de transmission de base de chaque couche (multiplie le poids de chaque contact de la couche)
+POIDS_COUCHES = {"menage": 2.0, "ecole": 0.5, "travail": 0.5, "spatial": 1.0}
+
+
+def matrice_contacts(lignes, colonnes, poids, nb_individus):
+    """Renvoie la matrice d'adjacence (CSR) des contacts donnés, avec des indices sur 32 bits"""
+    matrice = sparse.csr_array((poids, (lignes.astype(np.int32), colonnes.astype(np.int32))), shape=(nb_individus, nb_individus))
+    matrice.sum_duplicates()
+    return matrice
+
+
+def matrice_groupes(groupes, nb_individus):
+    """Renvoie la matrice d'adjacence (CSR, poids 1) qui relie deux à deux les individus d'un même groupe (groupe -1 : aucun)"""
+    membres = np.flatnonzero(groupes >= 0)
+    membres = membres[np.argsort(groupes[membres], kind="stable")]
+    _, debuts, tailles = np.unique(groupes[membres], return_index=True, return_counts=True)
+    # Chaque membre est relié à tous les membres de son groupe (lui-même exclu)
+    taille_membre = np.repeat(tailles, tailles)
+    debut_membre = np.repeat(debuts, tailles)
+    lignes = np.repeat(membres, taille_membre)
+    decalage = np.arange(len(lignes)) - np.repeat(np.cumsum(taille_membre) - taille_membre, taille_membre)
+    colonnes = membres[np.repeat(debut_membre, taille_membre) + decalage]
+    autres = lignes != colonnes
+    return matrice_contacts(lignes[autres], colonnes[autres], np.ones(int(autres.sum()), dtype=np.float32), nb_individus)
+
+
+def decouper(individus, taille):
+    """Renvoie le numéro de groupe de chaque individu en découpant la liste en groupes consécutifs d'une taille donnée"""
+    return np.arange(len(individus))//taille
+
+
+def menages(ages, generateur):
+    """Renvoie le numéro de ménage de chaque individu, selon la structure par âge
+
+    Les enfants sont répartis dans des familles (un ou deux parents en âge de l'être, les plus jeunes enfants avec les plus jeunes
+    parents), puis les autres individus forment des ménages de personnes d'âges proches dont les tailles suivent toute la répartition
+    des tailles des ménages (TAILLES_MENAGES, jusqu'à 5 personnes : colocations, adultes vivant avec leurs parents âgés...)."""
+    nb_individus = len(ages)
+    menage = np.full(nb_individus, -1, dtype=np.int64)
+    # Ordre aléatoire parmi les individus du même âge
+    ordre = np.lexsort((generateur.random(nb_individus), ages))
+
+    # Familles : un premier parent par famille, dans l'ordre des âges
+    enfants = ordre[ages[ordre] < 18]
+    parents = generateur.permutation(np.flatnonzero((ages >= AGES_PARENTS[0]) & (ages <= AGES_PARENTS[1])))
+    nb_familles = min(int(np.ceil(len(enfants)/ENFANTS_FAMILLE)), len(parents))
+    if nb_familles > 0:
+        premiers = np.sort(parents[:nb_familles], kind="stable")
+        premiers = premiers[np.argsort(ages[premiers], kind="stable")]
+        menage[premiers] = np.arange(nb_familles)
+        menage[enfants] = np.arange(len(enfants))*nb_familles//len(enfants)
+        # Second parent d'âge proche du premier
+        autres = parents[nb_familles:]
+        autres = autres[np.argsort(ages[autres], kind="stable")]
+        familles = np.flatnonzero(generateur.random(nb_familles) < PROPORTION_DEUX_PARENTS)
+        familles = familles[:len(autres)]
+        if len(familles) > 0:
+            menage[autres[np.arange(len(familles))*len(autres)//len(familles)]] = familles
+
+    # Autres ménages : individus restants d'âges proches, tailles tirées selon la même répartition que l'ensemble des ménages
+    restants = ordre[menage[ordre] < 0]
+    tailles = np.array([taille for (taille, proportion) in TAILLES_MENAGES])
+    proportions = np.array([proportion for (taille, proportion) in TAILLES_MENAGES])
+    tirages = generateur.choice(tailles, len(restants)//tailles.min() + 1, p=proportions/proportions.sum())
+    fins = np.cumsum(tirages)
+    tirages = tirages[:np.searchsorted(fins, len(restants)) + 1]
+    menage[restants] = nb_familles + np.repeat(np.arange(len(tirages)), tirages)[:len(restants)]
+    return menage
+
+
+def classes(ages, activites, generateur):
+    """Renvoie le numéro de classe de chaque élève (activité "études") : élèves du même âge, groupés par TAILLE_CLASSE (-1 : aucune)"""
+    classe = np.full(len(ages), -1, dtype=np.int64)
+    eleves = np.flatnonzero(activites == "études")
+    eleves = eleves[np.lexsort((generateur.random(len(eleves)), ages[eleves]))]
+    debut = 0
+    for age in np.unique(ages[eleves]):
+        groupe = eleves[ages[eleves] == age]
+        classe[groupe] = debut + decouper(groupe, TAILLE_CLASSE)
+        debut = classe[groupe].max() + 1
+    return classe
+
+
+def lieux_travail(activites, generateur):
+    """Renvoie le numéro de lieu de travail de chaque actif : personnes du même secteur, groupées par TAILLE_LIEU_TRAVAIL (-1 : aucun)"""
+    lieu = np.full(len(activites), -1, dtype=np.int64)
+    debut = 0
+    for secteur in sorted({activite for activite in activites if activite is not None and activite != "études"}):
+        groupe = generateur.permutation(np.flatnonzero(activites == secteur))
+        lieu[groupe] = debut + decouper(groupe, TAILLE_LIEU_TRAVAIL)
+        debut = lieu[groupe].max() + 1
+    return lieu
+
+
+def matrice_voisins(population):
+    """Renvoie la matrice d'adjacence (CSR) du graphe des voisins géographiques, pondérée par les poids de transmission (sans l'individu lui-même)"""
+    nb_individus = population.nb_individus
+    index = np.asarray(population.voisins_index)
+    lignes = np.repeat(np.arange(nb_individus), np.diff(index))
+    colonnes = np.asarray(population.voisins_id)
+    autres = lignes != colonnes
+    return matrice_contacts(lignes[autres], colonnes[autres], np.asarray(population.voisins_poids, dtype=np.float32)[autres], nb_individus)
+
+
+def multiplicateurs_couches(strategie, jour):
+    """Renvoie le multiplicateur du poids de chaque couche un jour donné selon les clauses (jour, {couche: multiplicateur})
+    de la stratégie : la clause la plus récente de chaque couche s'applique (1 sans clause)"""
+    multiplicateurs = {}
+    for (date, clause) in sorted(strategie.contacts, key=lambda date_clause: date_clause[0]):
+        if date <= jour:
+            multiplicateurs.update(clause)
+    return multiplicateurs
+
+
+class CouchesContacts:
+    """Représente les couches du réseau de contacts : une matrice d'adjacence symétrique (CSR, poids de chaque contact) par couche,
+    et le poids de base de chaque couche
+
+    La matrice des contacts d'un jour est la somme des couches pondérées par leur poids et les multiplicateurs de la stratégie.
+    Elle n'est recalculée que lorsque les multiplicateurs changent."""
+
+    def __init__(self, matrices, poids=None):
+        self.matrices = matrices
+        self.poids = {nom: POIDS_COUCHES.get(nom, 1.0) for nom in matrices} if poids is None else dict(poids)
+        self.cle = None
+        self.matrice = None
+
+    @staticmethod
+    def construire(population, graine=None, poids=None, spatial=True):
+        """Renvoie les couches de contacts d'une population : ménages (selon l'âge), écoles (activité "études"),
+        lieux de travail (par secteur d'activité) et, avec spatial, le voisinage géographique"""
+        graine_menages, graine_classes, graine_travail = graines_independantes(graine, 3)
+        nb_individus = population.nb_individus
+        ages = np.asarray(population.age)
+        activites = np.asarray(population.activite, dtype=object)
+        matrices = {
+            "menage": matrice_groupes(menages(ages, np.random.default_rng(graine_menages)), nb_individus),
+            "ecole": matrice_groupes(classes(ages, activites, np.random.default_rng(graine_classes)), nb_individus),
+            "travail": matrice_groupes(lieux_travail(activites, np.random.default_rng(graine_travail)), nb_individus),
+        }
+        if spatial:
+            matrices["spatial"] = matrice_voisins(population)
+        return CouchesContacts(matrices, poids)
+
+    def ponderee(self, multiplicateurs):
+        """Renvoie la matrice des contacts (CSR) pour des multiplicateurs donnés du poids de chaque couche"""
+        cle = tuple(sorted((nom, float(self.poids[nom]*multiplicateurs.get(nom, 1))) for nom in self.matrices))
+        if cle != self.cle:
+            matrice = sum(poids*self.matrices[nom] for (nom, poids) in cle if poids != 0)
+            self.matrice = matrice.tocsr() if sparse.issparse(matrice) else sparse.csr_array(next(iter(self.matrices.values())).shape,
+                                                                                              dtype=np.float32)
+            self.cle = cle
+        return self.matrice
+
+    def pression(self, infectes, multiplicateurs):
+        """Renvoie les individus en contact avec les infectés et la pression d'infection qu'ils subissent (somme des poids
+        des contacts avec les infectés), par un produit d'un vecteur creux (infectés) et de la matrice des contacts"""
+        matrice = self.ponderee(multiplicateurs)
+        # Vecteur ligne creux des infectés, avec des indices du même type que la matrice (sinon elle serait convertie à chaque produit)
+        type_indices = matrice.indices.dtype
+        vecteur = sparse.csr_array((np.ones(len(infectes), dtype=np.float32), np.asarray(infectes, dtype=type_indices),
+                                    np.array([0, len(infectes)], dtype=type_indices)), shape=(1, matrice.shape[0]))
+        resultat = (vecteur @ matrice).tocsr()
+        return resultat.indices.astype(np.int64), resultat.data
+
+    def nb_contacts(self):
+        """Renvoie le nombre de contacts (arêtes dans les deux sens) de chaque couche"""
+        return {nom: matrice.nnz for (nom, matrice) in self.matrices.items()}
+
+    def sauvegarder(self, dossier):
+        """Enregistre les couches dans un dossier (une matrice creuse compressée par couche)"""
+        os.makedirs(dossier, exist_ok=True)
+        for (nom, matrice) in self.matrices.items():
+            sparse.save_npz(os.path.join(dossier, f"couche_{nom}.npz"), matrice)
+        with open(os.path.join(dossier, "couches.json"), "w", encoding="utf-8") as fichier:
+            json.dump(self.poids, fichier)
+
+    @staticmethod
+    def charger(dossier):
+        """Renvoie les couches enregistrées dans un dossier"""
+        with open(os.path.join(dossier, "couches.json"), encoding="utf-8") as fichier:
+            poids = json.load(fichier)
+        return CouchesContacts({nom: sparse.csr_array(sparse.load_npz(os.path.join(dossier, f"couche_{nom}.npz"))) for nom in poids}, poids)
@@ -0,0 +1,63 @@
+"""Données de référence (répartition de la population, risques, efficacité et doses des vaccins) chargées en mémoire"""
+
+# Modules externes
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+
+# Modules internes
+from immunite import AGE_MAX, TableImmunite
+from risques import TableRisques
+
+# Chemin de la base de donnée qui contient les données réelle sur la répartition de la population, les probabilités d'hospitalisation et de décés, ainsi que l'efficacité des vaccins
+database_loc_data = "res/simulation_data.db"
+
+# Liste des maladies prises en compte
+MALADIE_LISTE = ["obésité", "diabète", "dyslipidémies", "métabolique", "hypertension", "coronariennes", "artériopathie", "trouble cardiaque", "insuffisance cardiaque",
+                 "valvulopathies", "avc", "respiratoire", "mucoviscidose", "embolie", "cancer", "inflammatoire", "antidépresseur", "neuroleptique", "parkinson", "démence"]
+
+
+class DonneesReference:
+    """Représente toutes les tables de la base de données de référence, lues une seule fois
+
+    Aucune connexion n'est conservée : l'objet peut être copié dans d'autres processus (pickle) et utilisé par plusieurs fils d'exécution."""
+
+    def __init__(self, chemin=database_loc_data):
+        with closing(sqlite3.connect(chemin)) as data_db:
+            data_cur = data_db.cursor()
+
+            # Proportion de chaque âge dans la population, par âge croissant
+            self.age_detail = data_cur.execute("SELECT age, proportion FROM age_detail ORDER BY age").fetchall()
+            # Proportion de chaque sexe, de chaque quintile social et de chaque habitude de vie
+            self.proportion_sexe = dict(data_cur.execute("SELECT sexe, proportion FROM repartition_sexe").fetchall())
+            self.social = data_cur.execute("SELECT quintile, proportion FROM social").fetchall()
+            self.habitudes = data_cur.execute("SELECT carac, proportion FROM habitudes").fetchall()
+
+            # Proportion de chaque maladie, et proportion de personnes atteintes d'une maladie chronique pour chaque âge
+            # (la première tranche d'âge qui correspond est retenue)
+            self.maladie = data_cur.execute("SELECT nom, proportion FROM maladie").fetchall()
+            self.proportion_maladie_age = np.full(AGE_MAX + 1, np.nan)
+            for (age_min, age_max, proportion) in reversed(data_cur.execute("SELECT min, max, proportion FROM repartition_maladie").fetchall()):
+                self.proportion_maladie_age[age_min:min(age_max, AGE_MAX)+1] = proportion
+            self.moyenne_proportion_maladie = data_cur.execute("SELECT AVG(proportion) FROM repartition_maladie").fetchall()[0][0]
+
+            # Groupes (âge minimal, âge maximal, sexe, proportion d'actifs) de la répartition des secteurs d'activité, avec
+            # la liste des secteurs (secteur, proportion selon le sexe, proportion selon l'âge) de chaque groupe
+            self.repartition_emploi = [(age_min, age_max, sexe, proportion, data_cur.execute(
+                "SELECT emploi_sexe.secteur, emploi_sexe.proportion, emploi_age.proportion FROM emploi_age JOIN emploi_sexe ON emploi_sexe.secteur = emploi_age.secteur WHERE sexe = ? AND min <= ? AND max >= ?",
+                (sexe, age_min, age_max)).fetchall())
+                for (age_min, age_max, sexe, proportion) in data_cur.execute("SELECT * FROM repartition_emploi").fetchall()]
+
+            # Doses de vaccin distribuées chaque jour de vaccination (liste de (vaccin, doses) pour chaque jour)
+            self.doses_vaccination = {}
+            for (vaccin, jour, doses) in data_cur.execute("SELECT vaccin, jour, doses FROM doses_vaccination").fetchall():
+                self.doses_vaccination.setdefault(jour, []).append((vaccin, doses))
+
+            # Efficacité des vaccins et risques relatifs
+            self.immunite = TableImmunite(data_cur)
+            self.risques = TableRisques(data_cur, MALADIE_LISTE)
+
+    def get_nombre_vaccination(self, jour_vaccination):
+        """Renvoie le nombre de personnes à vacciner selon chaque vaccin en fonction du jour de vaccination"""
+        return self.doses_vaccination.get(jour_vaccination, [])
@@ -0,0 +1,127 @@
+"""Exécution d'un ensemble de simulations (méthode de Monte-Carlo) sur plusieurs processus"""
+
+# Modules externes
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+# Modules internes
+from aleatoire import graines_independantes
+from population import Population
+from propagation import Simulation
+
+# Statistiques dont la valeur est conservée après l'arrêt d'une simulation (les autres valent 0)
+STATS_CUMULEES = ["total_infectes", "total_hospitalises", "total_decedes", "vaccines"]
+
+# Données de référence et population du processus de calcul, chargées une seule fois (tableaux de la population partagés entre processus)
+donnees_processus = None
+population_processus = None
+
+
+def initialiser_processus(donnees, dossier):
+    """Charge les données de référence et la population dans un processus de calcul"""
+    global donnees_processus, population_processus
+    donnees_processus = donnees
+    population_processus = Population.depuis_instantane(donnees, dossier)
+
+
+def completer_stats(stats, simulation_duree):
+    """Renvoie les statistiques d'une simulation prolongées jusqu'à la fin de la durée prévue
+
+    Si la simulation s'est arrêtée faute d'infectés, l'état n'évolue plus jusqu'à la fin de la durée prévue."""
+    jours_restants = simulation_duree + 1 - len(stats["total_infectes"])
+    return {cle: valeurs + [valeurs[-1] if cle in STATS_CUMULEES else 0]*jours_restants for (cle, valeurs) in stats.items()}
+
+
+def simuler_replique(strategie, situation_init, parametres, graine, moteur="vectorise"):
+    """Simule une réplique sans affichage (moteur vectorisé par défaut) et renvoie ses statistiques sur toute la durée de la simulation"""
+    simulation = Simulation(donnees_processus, population_processus, strategie, situation_init, parametres, "", moteur=moteur, graine=graine, afficher=False)
+    return completer_stats(simulation.stats, parametres.simulation_duree)
+
+
+@dataclass
+class ResultatEnsemble:
+    """Représente les statistiques de toutes les répliques d'un ensemble de simulations"""
+
+    # Statistiques de chaque réplique (tableau de forme (répliques, jours) pour chaque clé de Simulation.stats)
+    stats: dict
+
+    def bandes(self, quantiles=(0.05, 0.5, 0.95)):
+        """Renvoie pour chaque statistique la moyenne et les quantiles demandés de chaque jour"""
+        return {cle: {"moyenne": valeurs.mean(axis=0), **{quantile: np.quantile(valeurs, quantile, axis=0) for quantile in quantiles}}
+                for (cle, valeurs) in self.stats.items()}
+
+
+def executer_ensemble(donnees, population, strategie, situation_init, parametres, nb_repliques, graine=None, nb_processus=None, moteur="vectorise"):
+    """Simule nb_repliques fois le même scénario sur un ensemble de processus, avec des générateurs aléatoires indépendants
+
+    La population est partagée par les processus via son instantané projeté en mémoire : le graphe des voisins n'est pas copié."""
+    if nb_repliques < 1:
+        raise ValueError(f"Un ensemble doit compter au moins une réplique ({nb_repliques} demandées)")
+
+    # Instantané temporaire si la population n'en a pas, supprimé une fois les processus arrêtés
+    temporaire = population.sauvegarder_temporaire()
+
+    # Graines indépendantes pour chaque réplique
+    graines = graines_independantes(graine, nb_repliques)
+    try:
+        # Les processus sont démarrés à neuf ("spawn") et reçoivent une copie des données de référence
+        with ProcessPoolExecutor(nb_processus, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=initialiser_processus, initargs=(donnees, population.instantane)) as executeur:
+            repliques = list(executeur.map(simuler_replique, [strategie]*nb_repliques, [situation_init]*nb_repliques,
+                                           [parametres]*nb_repliques, graines, [moteur]*nb_repliques))
+    finally:
+        population.supprimer_temporaire(temporaire)
+
+    return ResultatEnsemble({cle: np.array([replique[cle] for replique in repliques]) for cle in repliques[0]})
+
+
+def indicateurs(resultat):
+    """Renvoie les indicateurs de chaque réplique d'un ensemble : infections, hospitalisations, décès et vaccinations sur toute
+    la simulation, pic des infectés et jour du pic"""
+    stats = resultat.stats
+    return {
+        "infections": stats["nouveaux_infectes"].sum(axis=1),
+        "hospitalisations": stats["nouveaux_hospitalises"].sum(axis=1),
+        "deces": stats["total_decedes"][:, -1],
+        "vaccines": stats["vaccines"][:, -1],
+        "pic_infectes": stats["total_infectes"].max(axis=1),
+        "jour_pic": stats["total_infectes"].argmax(axis=1),
+    }
+
+
+def comparer_ensembles(reference, ensemble):
+    """Renvoie, pour chaque indicateur, sa moyenne et son écart type dans deux ensembles de répliques, l'écart relatif
+    des moyennes et l'écart des moyennes rapporté à l'erreur type de leur différence (score)"""
+    comparaison = {}
+    for (nom, valeurs_reference), valeurs in zip(indicateurs(reference).items(), indicateurs(ensemble).values()):
+        moyenne_reference, moyenne = float(valeurs_reference.mean()), float(valeurs.mean())
+        erreur_type = float(np.sqrt(valeurs_reference.var(ddof=1)/len(valeurs_reference) + valeurs.var(ddof=1)/len(valeurs))) \
+            if min(len(valeurs_reference), len(valeurs)) > 1 else 0
+        comparaison[nom] = {"reference": moyenne_reference, "ecart_type_reference": float(valeurs_reference.std()),
+                            "moyenne": moyenne, "ecart_type": float(valeurs.std()),
+                            "ecart_relatif": (moyenne - moyenne_reference)/moyenne_reference if moyenne_reference else 0.0,
+                            "score": (moyenne - moyenne_reference)/erreur_type if erreur_type > 0 else 0.0}
+    return comparaison
+
+
+def comparer_moteurs(donnees, population, strategie, situation_init, parametres, nb_repliques, moteurs=("individus", "vectorise"),
+                     graine=None, nb_processus=None):
+    """Simule le même scénario avec deux moteurs (nb_repliques répliques chacun, flux aléatoires indépendants) et renvoie
+    les deux ensembles et la comparaison de leurs indicateurs (voir comparer_ensembles)"""
+    ensembles = [executer_ensemble(donnees, population, strategie, situation_init, parametres, nb_repliques, graine_moteur, nb_processus, moteur)
+                 for (moteur, graine_moteur) in zip(moteurs, graines_independantes(graine, len(moteurs)))]
+    return ensembles, comparer_ensembles(*ensembles)
+
+
+def valider_compartiments(donnees, population, strategie, situation_init, parametres, nb_repliques, graine=None, nb_processus=None,
+                          reference="individus"):
+    """Compare le moteur compartiments à un moteur de référence (moteur par individus par défaut, ou "vectorise") sur un même scénario
+
+    Renvoie l'ensemble de répliques de chaque moteur et la comparaison de leurs indicateurs (voir comparer_ensembles).
+    Le moteur compartiments suppose un brassage homogène : les écarts attendus sont décrits dans MoteurCompartiments."""
+    (ensemble_reference, compartiments), comparaison = comparer_moteurs(donnees, population, strategie, situation_init, parametres, nb_repliques,
+                                                                        (reference, "compartiments"), graine, nb_processus)
+    return ensemble_reference, compartiments, comparaison
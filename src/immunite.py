@@ -0,0 +1,60 @@
+"""Table d'efficacité des vaccins chargée en mémoire"""
+
+# Modules externes
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+# Âge maximal pris en compte dans la table
+AGE_MAX = 110
+
+
+class TableImmunite:
+    """Représente l'efficacité de chaque vaccin (et de l'immunité suite à une infection) indexée par (type de risque, vaccin, âge, tranche de mois)
+
+    Valeur par défaut : toute combinaison (vaccin, âge, mois écoulés, type de risque) qui n'est couverte par aucune ligne de la
+    table vaccins a une efficacité de 0 (aucune immunité). C'est le cas par exemple des vaccins avant 12 ans, ou des mois
+    écoulés au-delà de la dernière borne. La requête SQL historique (Individu.get_immunite) échouait sur ces combinaisons
+    faute de ligne : la table ne signale pas leur absence, elle renvoie 0."""
+
+    def __init__(self, curseur):
+        # Lignes de la table dans l'ordre renvoyé par les requêtes de la simulation : en cas de recouvrement, la première ligne est retenue
+        lignes = curseur.execute(
+            "SELECT vaccin, age_min, age_max, mois_min, mois_max, etat, efficacite FROM vaccins ORDER BY etat, mois_min, mois_max, age_min, vaccin").fetchall()
+
+        # Liste des vaccins ("Infection" représente l'immunité suite à une infection)
+        self.vaccins = sorted({ligne[0] for ligne in lignes})
+        self.index_vaccin = {vaccin: id for (id, vaccin) in enumerate(self.vaccins)}
+
+        # Bornes des intervalles de mois : chaque borne et chaque intervalle entre deux bornes forme une tranche
+        self.bornes = np.unique([ligne[3] for ligne in lignes] + [ligne[4] for ligne in lignes])
+        self.liste_bornes = self.bornes.tolist()
+        representants = np.empty(2*len(self.bornes) + 1)
+        representants[1::2] = self.bornes
+        representants[2:-1:2] = (self.bornes[:-1] + self.bornes[1:])/2
+        representants[0], representants[-1] = self.bornes[0] - 1, self.bornes[-1] + 1
+
+        # Remplissage de la table en partant de la dernière ligne pour que la première ligne qui correspond soit prioritaire
+        # Les combinaisons absentes de la base de données gardent l'efficacité 0 (voir la docstring de la classe)
+        nb_etats = max(ligne[5] for ligne in lignes)
+        self.table = np.zeros((nb_etats, len(self.vaccins), AGE_MAX + 1, len(representants)))
+        for (vaccin, age_min, age_max, mois_min, mois_max, etat, efficacite) in reversed(lignes):
+            tranches = (mois_min <= representants) & (representants <= mois_max)
+            self.table[etat-1, self.index_vaccin[vaccin], age_min:age_max+1, tranches] = efficacite
+
+    def tranche(self, jours_ecoules):
+        """Renvoie la tranche de mois correspondant au nombre de jours écoulés depuis la vaccination"""
+        mois = np.asarray(jours_ecoules)/30.5
+        return np.searchsorted(self.bornes, mois, "left") + np.searchsorted(self.bornes, mois, "right")
+
+    def efficacite(self, vaccins, ages, jours_ecoules, type):
+        """Renvoie l'efficacité des vaccins (indices dans self.vaccins) pour le type de risque, en fonction de l'âge et du nombre de jours depuis la vaccination
+
+        Les paramètres sont des tableaux (un élément par individu). Les combinaisons absentes de la base valent 0."""
+        return self.table[type-1, vaccins, np.minimum(ages, AGE_MAX), self.tranche(jours_ecoules)]
+
+    def efficacite_individu(self, vaccin, age, jours_ecoules, type):
+        """Renvoie l'efficacité d'un vaccin pour un seul individu (sans passer par les opérations vectorisées), 0 si la combinaison est absente de la base"""
+        mois = jours_ecoules/30.5
+        tranche = bisect_left(self.liste_bornes, mois) + bisect_right(self.liste_bornes, mois)
+        return self.table.item(type-1, vaccin, min(age, AGE_MAX), tranche)
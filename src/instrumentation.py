@@ -0,0 +1,130 @@
+"""Mesure du temps de chaque phase d'un jour de simulation et comptage des opérations, transmis à des observateurs"""
+
+# Modules externes
+import json
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+
+class Instrumentation:
+    """Mesure le temps de chaque jour et de chaque phase d'un jour, compte les opérations du jour, et transmet les mesures aux observateurs
+
+    Un observateur reçoit phase(jour, nom, debut, duree) à la fin de chaque phase, jour(jour, debut, duree, compteurs)
+    à la fin de chaque jour (temps en secondes, comptés depuis perf_counter) et fermer() à la fin de la simulation."""
+
+    def __init__(self, observateurs):
+        self.observateurs = list(observateurs)
+        self.jour_courant = 0
+        self.compteurs = {}
+
+    @contextmanager
+    def jour(self, jour):
+        """Mesure un jour de simulation et transmet les compteurs du jour"""
+        self.jour_courant = jour
+        self.compteurs = {}
+        debut = perf_counter()
+        yield
+        duree = perf_counter() - debut
+        for observateur in self.observateurs:
+            observateur.jour(jour, debut, duree, self.compteurs)
+
+    @contextmanager
+    def phase(self, nom):
+        """Mesure une phase du jour en cours"""
+        debut = perf_counter()
+        yield
+        duree = perf_counter() - debut
+        for observateur in self.observateurs:
+            observateur.phase(self.jour_courant, nom, debut, duree)
+
+    def compter(self, nom, nombre=1):
+        """Ajoute nombre au compteur nom du jour en cours"""
+        self.compteurs[nom] = self.compteurs.get(nom, 0) + nombre
+
+    def fermer(self):
+        """Termine la mesure à la fin de la simulation"""
+        for observateur in self.observateurs:
+            observateur.fermer()
+
+
+class InstrumentationInactive:
+    """Instrumentation sans observateur : aucune mesure n'est effectuée (coût d'un appel de méthode vide)"""
+
+    contexte = nullcontext()
+
+    def jour(self, jour):
+        """Ne mesure rien"""
+        return self.contexte
+
+    def phase(self, nom):
+        """Ne mesure rien"""
+        return self.contexte
+
+    def compter(self, nom, nombre=1):
+        """Ne compte rien"""
+
+    def fermer(self):
+        """Rien à faire à la fin de la simulation"""
+
+
+# Instrumentation utilisée par défaut
+INACTIVE = InstrumentationInactive()
+
+
+class TraceChrome:
+    """Enregistre les jours, les phases et les compteurs au format de trace de Chrome (chrome://tracing, Perfetto) à la fin de la simulation"""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.origine = perf_counter()
+        self.evenements = []
+
+    def evenement(self, nom, debut, duree, **arguments):
+        """Ajoute un événement d'une durée donnée (les temps de la trace sont en microsecondes)"""
+        self.evenements.append({"name": nom, "ph": "X", "ts": (debut - self.origine)*1e6, "dur": duree*1e6, "pid": 0, "tid": 0, "args": arguments})
+
+    def phase(self, jour, nom, debut, duree):
+        """Ajoute une phase"""
+        self.evenement(nom, debut, duree, jour=jour)
+
+    def jour(self, jour, debut, duree, compteurs):
+        """Ajoute un jour et ses compteurs"""
+        self.evenement(f"jour {jour}", debut, duree, jour=jour, **compteurs)
+        if compteurs:
+            self.evenements.append({"name": "compteurs", "ph": "C", "ts": (debut + duree - self.origine)*1e6, "pid": 0, "args": compteurs})
+
+    def fermer(self):
+        """Écrit la trace"""
+        with open(self.chemin, "w", encoding="utf-8") as fichier:
+            json.dump({"traceEvents": self.evenements, "displayTimeUnit": "ms"}, fichier)
+
+
+class ResumePhases:
+    """Cumule le temps de chaque phase et les compteurs sur toute la simulation, et les affiche à la fin de la simulation"""
+
+    def __init__(self, afficher=True):
+        self.afficher = afficher
+        self.temps = {}
+        self.compteurs = {}
+        self.temps_total = 0
+
+    def phase(self, jour, nom, debut, duree):
+        """Ajoute le temps d'une phase"""
+        self.temps[nom] = self.temps.get(nom, 0) + duree
+
+    def jour(self, jour, debut, duree, compteurs):
+        """Ajoute le temps et les compteurs d'un jour"""
+        self.temps_total += duree
+        for (nom, nombre) in compteurs.items():
+            self.compteurs[nom] = self.compteurs.get(nom, 0) + nombre
+
+    def rapport(self):
+        """Renvoie le temps de chaque phase (par ordre décroissant) et les compteurs"""
+        lignes = [f"{nom} : {temps:.3f}s ({temps/max(self.temps_total, 1e-9):.0%})" for (nom, temps) in sorted(self.temps.items(), key=lambda phase: -phase[1])]
+        lignes += [f"{nom} : {nombre}" for (nom, nombre) in self.compteurs.items()]
+        return "\n".join([f"Temps des jours : {self.temps_total:.3f}s", *lignes])
+
+    def fermer(self):
+        """Affiche le résumé"""
+        if self.afficher:
+            print(self.rapport())
@@ -0,0 +1,220 @@
+"""Journal des changements d'état jour par jour et relecture de la répartition géographique de n'importe quel jour
+
+Utilisation (depuis la racine du projet) :
+    python src/journal.py dossier_journal --images dossier_images [--pas 7]
+    python src/journal.py dossier_journal --animation animation.html [--pas 7]
+
+Le journal contient le code d'état (voir EtatPopulation.codes) des individus dont l'état a changé chaque jour, tels que
+notés par le moteur, et une image complète des codes tous les intervalle_images jours : l'état d'un jour est reconstruit
+à partir de l'image précédente en appliquant uniquement les changements des jours suivants. Les catégories d'affichage
+en sont déduites à la relecture (categories_codes)."""
+
+# Modules externes
+import argparse
+import json
+import os
+
+import numpy as np
+import plotly.graph_objects as graph
+
+# Modules internes
+from constantes import CATEGORIES, COULEUR
+from moteur import categories_codes
+from resultats import RESOLUTION, SEUIL_POINTS, enregistrer_png, figure_densite, figure_repartition, image_categories, raster_categories
+
+# Nombre de jours entre deux images complètes de l'état
+INTERVALLE_IMAGES = 30
+
+
+class JournalEtats:
+    """Enregistre jour après jour dans un dossier les changements d'état des individus
+
+    Fichiers du dossier : ids.bin (int32) et codes.bin (int8), identifiants des individus dont l'état a changé et leur
+    nouveau code d'état, ajoutés jour après jour ; debuts.bin (int64), position dans ids.bin et codes.bin du premier changement
+    de chaque jour puis de la fin de chaque jour ; images.bin (int8), codes d'état de tous les individus les jours des images ;
+    positions.npy, positions des individus ; index.json, nombre d'individus, premier jour et intervalle entre les images.
+
+    Chaque jour est vidé sur disque dès son écriture (sa position de fin en dernier) : un journal interrompu sans fermer()
+    se relit jusqu'au dernier jour complet."""
+
+    def __init__(self, dossier, positions, intervalle_images=INTERVALLE_IMAGES):
+        os.makedirs(dossier, exist_ok=True)
+        self.dossier = dossier
+        self.nb_individus = len(positions)
+        self.intervalle_images = intervalle_images
+        np.save(os.path.join(dossier, "positions.npy"), positions)
+        self.fichiers = {nom: open(os.path.join(dossier, f"{nom}.bin"), "wb") for nom in ("ids", "codes", "images", "debuts")}
+        self.premier_jour = None
+        # Nombre de jours écrits et position de fin du dernier jour dans ids.bin et codes.bin
+        self.nb_jours = 0
+        self.fin = 0
+        self.ecrire_index()
+        self.ecrire_debut(0)
+
+    def ecrire_index(self):
+        """Écrit les métadonnées du journal (index.json)"""
+        with open(os.path.join(self.dossier, "index.json"), "w", encoding="utf-8") as fichier:
+            json.dump({"nb_individus": self.nb_individus, "premier_jour": self.premier_jour, "intervalle_images": self.intervalle_images}, fichier)
+
+    def ecrire_debut(self, position):
+        """Ajoute une position de début de jour à debuts.bin et vide tous les fichiers sur disque"""
+        for nom in ("ids", "codes", "images"):
+            self.fichiers[nom].flush()
+        self.fichiers["debuts"].write(np.int64(position).tobytes())
+        self.fichiers["debuts"].flush()
+
+    def ecrire(self, jour, individus, codes, image):
+        """Ajoute les changements d'état d'un jour (les jours doivent se suivre) : individus dont l'état a changé (notés par le moteur)
+        et leur nouveau code d'état
+
+        image() renvoie le code d'état de tous les individus ; elle n'est appelée que les jours des images complètes,
+        si bien que l'écriture d'un jour ne prend un temps proportionnel à la population qu'une fois tous les intervalle_images jours."""
+        if self.premier_jour is None:
+            self.premier_jour = jour
+            self.ecrire_index()
+        elif jour != self.premier_jour + self.nb_jours:
+            raise ValueError(f"Jour {jour} ajouté au journal après le jour {self.premier_jour + self.nb_jours - 1}")
+
+        self.fichiers["ids"].write(np.asarray(individus, dtype=np.int32).tobytes())
+        self.fichiers["codes"].write(np.asarray(codes, dtype=np.int8).tobytes())
+        if (jour - self.premier_jour) % self.intervalle_images == 0:
+            self.fichiers["images"].write(np.asarray(image(), dtype=np.int8).tobytes())
+
+        # La fin du jour n'est écrite qu'une fois ses changements et son image sur disque
+        self.fin += len(individus)
+        self.nb_jours += 1
+        self.ecrire_debut(self.fin)
+
+    def fermer(self):
+        """Termine l'écriture du journal"""
+        for fichier in self.fichiers.values():
+            fichier.close()
+
+
+def projeter(chemin, type):
+    """Renvoie le contenu d'un fichier binaire projeté en mémoire (lecture seule)
+
+    Les octets d'un élément incomplet en fin de fichier (écriture interrompue) sont ignorés."""
+    taille = os.path.getsize(chemin) // np.dtype(type).itemsize
+    if taille == 0:
+        return np.empty(0, dtype=type)
+    return np.memmap(chemin, dtype=type, mode="r", shape=(taille,))
+
+
+class LectureJournal:
+    """Reconstruit l'état (code d'état de chaque individu) de n'importe quel jour enregistré dans un journal
+
+    Les fichiers sont projetés en mémoire : seules l'image précédant le jour demandé et les changements qui la suivent sont lus."""
+
+    def __init__(self, dossier):
+        with open(os.path.join(dossier, "index.json"), encoding="utf-8") as fichier:
+            index = json.load(fichier)
+        self.nb_individus = index["nb_individus"]
+        self.premier_jour = 0 if index["premier_jour"] is None else index["premier_jour"]
+        self.debuts = projeter(os.path.join(dossier, "debuts.bin"), np.int64)
+        # Jours des images (tous les intervalle_images jours parmi les jours enregistrés)
+        self.jours_images = np.arange(self.jours.start, self.jours.stop, index["intervalle_images"])
+        self.positions = np.load(os.path.join(dossier, "positions.npy"))
+        self.ids = projeter(os.path.join(dossier, "ids.bin"), np.int32)
+        self.codes = projeter(os.path.join(dossier, "codes.bin"), np.int8)
+        images = projeter(os.path.join(dossier, "images.bin"), np.int8)
+        self.images = images[:len(self.jours_images)*self.nb_individus].reshape(len(self.jours_images), self.nb_individus)
+
+    @property
+    def jours(self):
+        """Jours enregistrés"""
+        return range(self.premier_jour, self.premier_jour + max(len(self.debuts) - 1, 0))
+
+    def changements(self, jour):
+        """Renvoie les identifiants des individus dont l'état a changé un jour donné et leur nouveau code d'état"""
+        position = jour - self.premier_jour
+        debut, fin = self.debuts[position], self.debuts[position + 1]
+        return self.ids[debut:fin], self.codes[debut:fin]
+
+    def appliquer(self, codes, jour):
+        """Applique à l'état de la veille les changements d'un jour"""
+        ids, nouveaux = self.changements(jour)
+        codes[ids] = nouveaux
+
+    def etat(self, jour):
+        """Renvoie le code d'état de chaque individu à la fin d'un jour"""
+        if jour not in self.jours:
+            raise ValueError(f"Jour {jour} absent du journal (jours {self.jours.start} à {self.jours.stop - 1})")
+        numero = np.searchsorted(self.jours_images, jour, side="right") - 1
+        codes = np.array(self.images[numero])
+        for jour_suivant in range(self.jours_images[numero] + 1, jour + 1):
+            self.appliquer(codes, jour_suivant)
+        return codes
+
+    def categories(self, jour):
+        """Renvoie la catégorie d'affichage de chaque individu (indice dans CATEGORIES) à la fin d'un jour"""
+        return categories_codes(self.etat(jour))
+
+    def parcourir(self, debut=None, fin=None, pas=1):
+        """Renvoie les (jour, codes d'état) d'un jour sur pas entre les jours debut et fin (inclus), en appliquant les changements jour après jour"""
+        debut = self.jours.start if debut is None else debut
+        fin = self.jours.stop - 1 if fin is None else fin
+        codes = self.etat(debut)
+        yield debut, codes.copy()
+        for jour in range(debut + 1, fin + 1):
+            self.appliquer(codes, jour)
+            if (jour - debut) % pas == 0:
+                yield jour, codes.copy()
+
+
+def chemin_image(dossier, jour):
+    """Renvoie le chemin de l'image d'un jour dans un dossier"""
+    return os.path.join(dossier, f"jour_{jour:04d}.png")
+
+
+def enregistrer_images(journal, dossier, pas=1, resolution=RESOLUTION):
+    """Enregistre l'image de densité (PNG) de la répartition géographique d'un jour sur pas, avec la même étendue pour tous les jours"""
+    os.makedirs(dossier, exist_ok=True)
+    etendue = raster_categories(journal.positions, np.zeros(journal.nb_individus, dtype=np.int8), resolution)[1]
+    for (jour, codes) in journal.parcourir(pas=pas):
+        enregistrer_png(chemin_image(dossier, jour), image_categories(raster_categories(journal.positions, categories_codes(codes), resolution, etendue)[0]))
+
+
+def figure_animation(journal, nom, pas=1, resolution=RESOLUTION):
+    """Renvoie la figure animée (une image par jour, avec un curseur) de la répartition géographique d'un jour sur pas
+
+    Au-delà de SEUIL_POINTS individus, chaque image est une image de densité sans échantillon de points."""
+    grande = journal.nb_individus > SEUIL_POINTS
+    couleurs = np.array([COULEUR[categorie] for categorie in CATEGORIES], dtype=object)
+    images = []
+    for (jour, codes) in journal.parcourir(pas=pas):
+        codes = categories_codes(codes)
+        if grande:
+            donnees = figure_densite(journal.positions, codes, nom, resolution, nb_points=0).data
+        else:
+            donnees = [graph.Scattergl(marker=dict(color=couleurs[codes, 0], line=dict(color=couleurs[codes, 1])))]
+        images.append(graph.Frame(data=donnees, name=str(jour)))
+
+    if grande:
+        figure = figure_densite(journal.positions, journal.categories(journal.jours.start), nom, resolution, nb_points=0)
+    else:
+        figure = figure_repartition(journal.positions, journal.categories(journal.jours.start), nom)
+    figure.frames = images
+    figure.update_layout(
+        updatemenus=[dict(type="buttons", buttons=[dict(label="Lecture", method="animate", args=[None, dict(frame=dict(duration=200))])])],
+        sliders=[dict(currentvalue=dict(prefix="Jour "), steps=[dict(label=image.name, method="animate",
+                                                                    args=[[image.name], dict(mode="immediate", frame=dict(duration=0))])
+                                                               for image in images])])
+    return figure
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arguments.add_argument("journal", help="dossier du journal")
+    arguments.add_argument("--images", help="dossier des images PNG de chaque jour")
+    arguments.add_argument("--animation", help="fichier HTML de l'animation")
+    arguments.add_argument("--pas", type=int, default=1, help="nombre de jours entre deux images")
+    arguments.add_argument("--resolution", type=int, nargs=2, default=RESOLUTION, help="largeur et hauteur des images de densité")
+    arguments = arguments.parse_args()
+
+    journal = LectureJournal(arguments.journal)
+    if arguments.images is not None:
+        enregistrer_images(journal, arguments.images, arguments.pas, tuple(arguments.resolution))
+    if arguments.animation is not None:
+        figure_animation(journal, os.path.basename(os.path.normpath(arguments.journal)), arguments.pas,
+                         tuple(arguments.resolution)).write_html(arguments.animation, include_plotlyjs=True)
@@ -2,14 +2,16 @@
 
 #Modules internes
 
-from population import Population, ferme_bdd
+from donnees import DonneesReference
+from population import Population
 from propagation import *
 
 #Programme principal
 
 if __name__ == "__main__":
     # Définition des objets d'entrée
-    population = Population(10000, 10, 5, True) #Génère la population et ajoute toutes les données dans la BDD
+    donnees = DonneesReference() #Charge les données de référence en mémoire
+    population = Population(donnees, 10000, 10, 5, True, "data/instantane") #Génère la population, ajoute toutes les données dans la BDD et enregistre un instantané
     
     # Définition des stratégies
     strategie_reelle = Strategie(dates_vaccination=[
@@ -28,7 +30,6 @@ if __name__ == "__main__":
     param = Parametres(simulation_duree=500,infection_proba=0.004, hopital_proba=0.0442, deces_proba=0.001)
 
     # Démarrage la simulation avec les paramètres définis et affichage des résultats
-    Simulation(population, strategie_reelle, init, param, "Stratégie réelle")
-    population = Population(10000, 10, 5, False)
-    Simulation(population, strategie_comparee, init, param, "Stratégie comparée")
-    ferme_bdd() #Fermeture la connexion à la base de donnée
+    Simulation(donnees, population, strategie_reelle, init, param, "Stratégie réelle")
+    population = Population(donnees, 10000, 10, 5, False, "data/instantane") #Recharge la même population depuis l'instantané
+    Simulation(donnees, population, strategie_comparee, init, param, "Stratégie comparée")
@@ -0,0 +1,206 @@
+"""Suite de mesures de performance : temps des principales étapes pour plusieurs tailles de population, avec des graines fixes
+
+Utilisation (depuis la racine du projet) :
+    python src/mesures.py [--tailles 10000 100000] [--mesures voisins jour_pic] [--sortie mesures.json] [--reference ancien.json]
+
+Les résultats sont enregistrés en JSON. Avec --reference, chaque mesure est comparée à la même mesure d'un fichier précédent :
+les mesures plus lentes que la référence au-delà du seuil sont signalées et le code de sortie vaut 1."""
+
+# Modules externes
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+from contextlib import closing, redirect_stdout
+from datetime import datetime
+from io import StringIO
+from time import perf_counter
+
+import numpy as np
+
+# Modules internes
+from benchmark import generer_donnees, generer_positions, population_synthetique
+from constantes import INFECTE
+from donnees import DonneesReference, database_loc_data
+from moteur import EtatPopulation, MoteurVectorise
+from population import Population
+from propagation import Parametres, SituationInitiale, Strategie
+from resultats import figure_densite, figure_repartition
+from vaccination import PlanVaccination
+from voisinage import construire_voisins
+
+# Tailles de population mesurées par défaut
+TAILLES = [10000, 100000]
+
+# Rayon des voisins et densité de la population synthétique (individus par unité de surface)
+MAX_DISTANCE = 1.5
+DENSITE = 100
+
+# Stratégie et paramètres des jours simulés
+STRATEGIE = Strategie([(0, {"age": 50, "comp": "sup"})])
+PARAMETRES = Parametres(10, infection_proba=0.004)
+
+# Mesures disponibles : nom -> fonction(donnees, taille) qui renvoie (preparer, executer), seul executer(*preparer()) est chronométré
+MESURES = {}
+
+
+def mesure(fonction):
+    """Ajoute une mesure à la suite (le nom de la mesure est celui de la fonction sans le préfixe mesure_)"""
+    MESURES[fonction.__name__.removeprefix("mesure_")] = fonction
+    return fonction
+
+
+# Populations synthétiques déjà construites, par taille
+populations = {}
+
+
+def population(taille):
+    """Renvoie la population synthétique d'une taille donnée (construite une seule fois)"""
+    if taille not in populations:
+        populations[taille] = population_synthetique(taille, MAX_DISTANCE, DENSITE)
+    return populations[taille]
+
+
+@mesure
+def mesure_generer_population(donnees, taille):
+    """Génération des caractéristiques de la population et écriture dans une base de données temporaire"""
+    generation = Population.__new__(Population)
+    generation.donnees = donnees
+
+    def generer():
+        # La base de données est supprimée après chaque répétition
+        with tempfile.TemporaryDirectory(prefix="mesures_") as dossier:
+            generation.generer_population(taille, graine=0, chemin=os.path.join(dossier, "population.db"))
+
+    return (lambda: ()), generer
+
+
+@mesure
+def mesure_voisins(donnees, taille):
+    """Construction du graphe des voisins"""
+    positions = generer_positions(taille, (taille/DENSITE)**0.5)
+    return (lambda: ()), (lambda: construire_voisins(positions, MAX_DISTANCE))
+
+
+@mesure
+def mesure_multiplicateurs(donnees, taille):
+    """Calcul des risques relatifs de chaque individu"""
+    with closing(sqlite3.connect(database_loc_data)) as data_db:
+        colonnes, maladies = generer_donnees(data_db.cursor(), taille)
+    return (lambda: ()), (lambda: donnees.risques.multiplicateurs(colonnes))
+
+
+def mesure_jour(donnees, taille, situation_init):
+    """Premier jour de simulation à partir d'une situation initiale"""
+    def preparer():
+        moteur = MoteurVectorise(donnees, population(taille), STRATEGIE, situation_init, PARAMETRES, np.random.default_rng(0))
+        moteur.initialiser()
+        return (moteur,)
+    return preparer, (lambda moteur: moteur.jour(1))
+
+
+@mesure
+def mesure_jour_faible(donnees, taille):
+    """Jour de simulation à faible prévalence (10 infectés)"""
+    return mesure_jour(donnees, taille, SituationInitiale(10, 1))
+
+
+@mesure
+def mesure_jour_pic(donnees, taille):
+    """Jour de simulation au pic de l'épidémie (10 % d'infectés)"""
+    return mesure_jour(donnees, taille, SituationInitiale(taille//10, taille//100))
+
+
+@mesure
+def mesure_vaccination(donnees, taille):
+    """Distribution d'une journée de doses (0,5 % de la population) parmi les candidats"""
+    individus = population(taille)
+
+    def preparer():
+        plan = PlanVaccination(STRATEGIE, individus.age, individus.activite)
+        plan.activer(1)
+        return (plan, np.random.default_rng(0))
+    return preparer, (lambda plan, generateur: plan.tirer(taille//200, lambda ids: np.ones(len(ids), dtype=bool), generateur))
+
+
+def etat_rendu(taille):
+    """Renvoie un état de la population avec 10 % d'infectés tirés au hasard"""
+    etat = EtatPopulation(taille)
+    etat.sante[np.random.default_rng(0).random(taille) < 0.1] = INFECTE
+    return etat
+
+
+@mesure
+def mesure_rendu(donnees, taille):
+    """Construction et sérialisation de la figure de répartition géographique (un point par individu)"""
+    individus = population(taille)
+    etat = etat_rendu(taille)
+    return (lambda: ()), (lambda: figure_repartition(individus.population_position, etat.categories(), "").to_json())
+
+
+@mesure
+def mesure_rendu_densite(donnees, taille):
+    """Construction et sérialisation de la figure de répartition géographique (image de densité et échantillon de points)"""
+    individus = population(taille)
+    etat = etat_rendu(taille)
+    return (lambda: ()), (lambda: figure_densite(individus.population_position, etat.categories(), "").to_json())
+
+
+def executer_mesures(noms, tailles, repetitions):
+    """Renvoie le temps (secondes) de chaque répétition de chaque mesure pour chaque taille"""
+    donnees = DonneesReference()
+    resultats = []
+    for taille in tailles:
+        for nom in noms:
+            # Les messages de progression des fonctions mesurées ne sont pas affichés
+            with redirect_stdout(StringIO()):
+                preparer, executer = MESURES[nom](donnees, taille)
+            temps = []
+            for _ in range(repetitions):
+                with redirect_stdout(StringIO()):
+                    arguments = preparer()
+                    debut = perf_counter()
+                    executer(*arguments)
+                    temps.append(perf_counter() - debut)
+            resultats.append({"mesure": nom, "taille": taille, "secondes": temps, "minimum": min(temps)})
+            print(f"{nom} ({taille} individus) : {min(temps):.4f}s")
+    return resultats
+
+
+def comparer(resultats, reference, seuil):
+    """Affiche le rapport de chaque mesure à la référence et renvoie la liste des régressions (rapport supérieur au seuil)"""
+    temps_reference = {(resultat["mesure"], resultat["taille"]): resultat["minimum"] for resultat in reference["resultats"]}
+    regressions = []
+    for resultat in resultats:
+        cle = (resultat["mesure"], resultat["taille"])
+        if cle not in temps_reference:
+            continue
+        rapport = resultat["minimum"]/temps_reference[cle]
+        print(f"{cle[0]} ({cle[1]} individus) : x{rapport:.2f} par rapport à la référence{' (régression)' if rapport > seuil else ''}")
+        if rapport > seuil:
+            regressions.append({**resultat, "reference": temps_reference[cle], "rapport": rapport})
+    return regressions
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arguments.add_argument("--tailles", type=int, nargs="+", default=TAILLES, help="tailles de population")
+    arguments.add_argument("--mesures", nargs="+", choices=list(MESURES), default=list(MESURES), help="mesures à effectuer")
+    arguments.add_argument("--repetitions", type=int, default=3, help="nombre de répétitions (le minimum est retenu)")
+    arguments.add_argument("--sortie", help="fichier JSON des résultats")
+    arguments.add_argument("--reference", help="fichier JSON de résultats précédents")
+    arguments.add_argument("--seuil", type=float, default=1.25, help="rapport à la référence au-delà duquel une mesure est une régression")
+    arguments = arguments.parse_args()
+
+    resultats = executer_mesures(arguments.mesures, arguments.tailles, arguments.repetitions)
+    if arguments.sortie is not None:
+        with open(arguments.sortie, "w", encoding="utf-8") as fichier:
+            json.dump({"date": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(), "numpy": np.__version__,
+                       "processeurs": os.cpu_count(), "resultats": resultats}, fichier, indent=1)
+    if arguments.reference is not None:
+        with open(arguments.reference, encoding="utf-8") as fichier:
+            regressions = comparer(resultats, json.load(fichier), arguments.seuil)
+        sys.exit(1 if regressions else 0)
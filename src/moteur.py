@@ -0,0 +1,490 @@
+"""Moteur de simulation vectorisé : l'état de la population est stocké dans des tableaux numpy"""
+
+# Modules externes
+import json
+
+import numpy as np
+
+# Modules internes
+from constantes import *
+from couches import multiplicateurs_couches
+from instrumentation import INACTIVE
+from vaccination import PlanVaccination
+
+# Valeur des dates lorsqu'elles ne sont pas définies (équivalent de None)
+AUCUN = -1
+
+
+def categories(sante, immunise, vaccine):
+    """Renvoie la catégorie d'affichage (indice dans CATEGORIES, la dernière catégorie applicable l'emporte) de chaque individu
+    à partir de son état de santé et des masques des individus immunisés et vaccinés"""
+    codes = np.zeros(len(sante), dtype=np.int8)
+    codes[immunise] = CATEGORIES.index("IMMUNISE")
+    codes[vaccine] = CATEGORIES.index("VACCINE")
+    codes[sante == INFECTE] = CATEGORIES.index(INFECTE)
+    codes[sante == DECEDE] = CATEGORIES.index(DECEDE)
+    return codes
+
+
+# États de santé des codes d'état (voir EtatPopulation.codes) : code = 4*indice dans ETATS + 2*immunisé + vacciné
+ETATS = [NEUTRE, INFECTE, HOSPITALISE, DECEDE]
+
+
+def categories_codes(codes):
+    """Renvoie la catégorie d'affichage (indice dans CATEGORIES) de chaque individu à partir de son code d'état"""
+    codes = np.asarray(codes)
+    # Les hospitalisés sont affichés comme les infectés
+    sante = np.array([NEUTRE, INFECTE, INFECTE, DECEDE], dtype=np.int8)[codes//4]
+    return categories(sante, codes & 2 != 0, codes & 1 != 0)
+
+
+class Calendrier:
+    """File d'événements indexée par jour : chaque jour, seuls les événements prévus ce jour-là sont traités
+
+    Un événement devenu caduc (l'état de l'individu a changé entre temps) doit être ignoré lors de son extraction."""
+
+    def __init__(self):
+        self.evenements = {}
+
+    def programmer(self, jour, evenement):
+        """Ajoute un événement au jour donné"""
+        self.evenements.setdefault(jour, []).append(evenement)
+
+    def extraire(self, jour):
+        """Retire et renvoie les événements prévus au jour donné"""
+        return self.evenements.pop(jour, [])
+
+
+# Tableaux de l'état de la population : (nom, type, valeur initiale)
+CHAMPS_ETAT = [
+    # Etat de santé et d'infection
+    ("sante", np.int8, NEUTRE),
+    ("infection", np.int8, NEUTRE),
+    # Jours de fin de l'infection et de l'hospitalisation en cours
+    ("sante_fin", np.int32, AUCUN),
+    ("infection_fin", np.int32, AUCUN),
+    # Etat de vaccination (indice du vaccin dans la liste des vaccins)
+    ("vaccin_type", np.int8, AUCUN),
+    ("vaccin_date", np.int32, AUCUN),
+    # Etat d'immunité suite à une infection
+    ("infection_immunite_date", np.int32, AUCUN),
+]
+
+
+class EtatPopulation:
+    """Représente l'état de santé, d'infection et de vaccination de chaque individu de la population"""
+
+    def __init__(self, nb_individus, tableaux=None):
+        # Les tableaux peuvent être fournis déjà alloués (par exemple en mémoire partagée entre processus)
+        for (nom, type, valeur) in CHAMPS_ETAT:
+            setattr(self, nom, np.full(nb_individus, valeur, dtype=type) if tableaux is None else tableaux[nom])
+        # Individus dont l'état a changé depuis le dernier appel à extraire_modifies (liste de tableaux), None s'ils ne sont pas suivis
+        self.modifies = None
+
+    def suivre(self):
+        """Commence à noter les individus dont l'état change"""
+        self.modifies = []
+
+    def extraire_modifies(self):
+        """Renvoie les individus dont l'état a changé depuis le dernier appel (sans doublon, triés) et recommence le suivi"""
+        modifies = np.unique(np.concatenate(self.modifies)) if self.modifies else np.empty(0, dtype=np.int64)
+        self.modifies = []
+        return modifies
+
+    def noter(self, individus):
+        """Note les individus dont l'état change, s'ils sont suivis"""
+        if self.modifies is not None:
+            self.modifies.append(np.asarray(individus, dtype=np.int64))
+
+    def codes(self, individus=slice(None)):
+        """Renvoie le code d'état des individus : état de santé (indice dans ETATS), immunité suite à une infection et vaccination"""
+        sante = self.sante[individus]
+        codes = np.full(len(sante), 4*ETATS.index(NEUTRE), dtype=np.int8)
+        codes[sante == INFECTE] = 4*ETATS.index(INFECTE)
+        codes[(sante == INFECTE) & (self.infection[individus] == HOSPITALISE)] = 4*ETATS.index(HOSPITALISE)
+        codes[sante == DECEDE] = 4*ETATS.index(DECEDE)
+        codes += 2*(self.infection_immunite_date[individus] != AUCUN) + (self.vaccin_date[individus] != AUCUN)
+        return codes
+
+    def infecter(self, individus, fins):
+        """Infecte les individus jusqu'aux jours de fin donnés"""
+        self.noter(individus)
+        self.sante[individus] = INFECTE
+        self.sante_fin[individus] = fins
+
+    def hospitaliser(self, individus, fins):
+        """Hospitalise les individus jusqu'aux jours de fin donnés"""
+        self.noter(individus)
+        self.sante[individus] = INFECTE
+        self.infection[individus] = HOSPITALISE
+        self.sante_fin[individus] = AUCUN
+        self.infection_fin[individus] = fins
+
+    def guerir(self, individus, jour):
+        """Guérit les individus suite à une infection"""
+        self.noter(individus)
+        self.sante[individus] = NEUTRE
+        self.sante_fin[individus] = AUCUN
+        self.infection[individus] = NEUTRE
+        self.infection_fin[individus] = AUCUN
+        self.infection_immunite_date[individus] = jour
+
+    def deces(self, individus):
+        """Rend les individus décédés suite à une hospitalisation"""
+        self.noter(individus)
+        self.sante[individus] = DECEDE
+        self.sante_fin[individus] = AUCUN
+        self.infection_fin[individus] = AUCUN
+
+    def vacciner(self, individus, vaccin_type, jour):
+        """Vaccine les individus avec un vaccin spécifié"""
+        self.noter(individus)
+        self.vaccin_type[individus] = vaccin_type
+        self.vaccin_date[individus] = jour
+
+    def categories(self):
+        """Renvoie la catégorie d'affichage de chaque individu (indice dans CATEGORIES)"""
+        return categories(self.sante, self.infection_immunite_date != AUCUN, self.vaccin_date != AUCUN)
+
+
+class MoteurVectorise:
+    """Moteur de la simulation qui traite chaque jour l'ensemble des individus par opérations sur des tableaux"""
+
+    def __init__(self, donnees, population, strategie, situation_init, parametres, generateur, etat=None, couches=None):
+        self.donnees = donnees
+        self.population = population
+        self.strategie = strategie
+        self.init = situation_init
+        self.param = parametres
+        self.generateur = generateur
+        # Couches du réseau de contacts (CouchesContacts), None pour le seul graphe des voisins de la population
+        self.couches = couches
+
+        self.nb_individus = population.nb_individus
+        # Probabilité d'infection de chaque individu sain par des contacts extérieurs à la population (autres régions), fixée chaque jour
+        self.pression_exterieure = 0
+        self.etat = EtatPopulation(self.nb_individus) if etat is None else etat
+        self.doses_a_distribuer = 0
+        self.plan_vaccination = None  # Candidats à la vaccination, compilés à la première vaccination
+
+        # Calendriers des fins d'infection et d'hospitalisation (tableaux d'individus par jour)
+        self.calendrier_infection = Calendrier()
+        self.calendrier_hopital = Calendrier()
+        # Infectés non hospitalisés (peut contenir des individus dont l'infection s'est terminée, filtrés chaque jour)
+        self.contagieux = np.empty(0, dtype=np.int64)
+
+        # Totaux tenus à jour à chaque changement d'état
+        self.nb_infectes = 0
+        self.nb_hospitalises = 0
+        self.nb_decedes = 0
+        self.nb_vaccines = 0
+
+        # Efficacité des vaccins (l'immunité suite à une infection est traitée comme un vaccin)
+        self.table_immunite = donnees.immunite
+        self.vaccin_infection = self.table_immunite.index_vaccin["Infection"]
+
+        # Mesure du temps des phases et comptage des opérations (voir instrumentation.py)
+        self.instrumentation = INACTIVE
+
+    def durees(self, duree, nombre):
+        """Tire les durées d'un état selon une loi normale (moyenne, écart type)"""
+        self.instrumentation.compter("tirages", nombre)
+        return np.maximum(np.rint(self.generateur.normal(*duree, nombre)), 0).astype(np.int32)
+
+    def initialiser(self):
+        """Met en place la situation initiale (jour 0)"""
+        infectes = self.generateur.choice(self.nb_individus, self.init.nombre_infectes, replace=False)
+        hospitalises = self.generateur.choice(self.nb_individus, self.init.nombre_hospitalises, replace=False)
+        self.demarrer(infectes, hospitalises)
+
+    def demarrer(self, infectes, hospitalises):
+        """Infecte et hospitalise les individus de la situation initiale"""
+        etat = self.etat
+        # Infectés (contagieux à partir du jour 1)
+        etat.infecter(infectes, 1 + self.durees(self.param.infection_duree, len(infectes)))
+        self.programmer(self.calendrier_infection, infectes, etat.sante_fin[infectes])
+        # Hospitalisés
+        etat.hospitaliser(hospitalises, 1 + self.durees(self.param.hopital_duree, len(hospitalises)))
+        self.programmer(self.calendrier_hopital, hospitalises, etat.infection_fin[hospitalises])
+
+        self.contagieux = infectes[etat.sante_fin[infectes] != AUCUN]
+        self.nb_infectes += len(np.union1d(infectes, hospitalises))
+        self.nb_hospitalises += len(hospitalises)
+
+    @staticmethod
+    def programmer(calendrier, individus, fins):
+        """Programme la fin de l'état de chaque individu dans le calendrier, en un seul événement par jour de fin"""
+        ordre = np.argsort(fins, kind="stable")
+        jours, debuts = np.unique(fins[ordre], return_index=True)
+        for (jour, groupe) in zip(jours.tolist(), np.split(individus[ordre], debuts[1:])):
+            calendrier.programmer(jour, groupe)
+
+    @staticmethod
+    def evenements(calendrier, jour):
+        """Renvoie les individus dont l'état se termine au jour donné (y compris les événements caducs)"""
+        groupes = calendrier.extraire(jour)
+        return np.concatenate(groupes) if groupes else np.empty(0, dtype=np.int64)
+
+    def immunite(self, individus, jour, type):
+        """Renvoie le multiplicateur de risque des individus en fonction du type de risque (équivalent de Individu.get_immunite)"""
+        self.instrumentation.compter("immunite", len(individus))
+        if type == INFECTION:
+            immunite = np.ones(len(individus))
+        # Dans le cas d'une hospitalisation ou d'un décès, on se base sur le risque établi en fonction des caractéristiques de l'individu
+        else:
+            immunite = self.population.multiplicateur[individus, type-2].astype(np.float64)
+
+        # Immunité due au vaccin, sinon due à une infection
+        vaccins = self.etat.vaccin_type[individus].astype(np.int64)
+        dates = self.etat.vaccin_date[individus]
+        infection = (vaccins == AUCUN) & (self.etat.infection_immunite_date[individus] != AUCUN)
+        vaccins[infection] = self.vaccin_infection
+        dates = np.where(infection, self.etat.infection_immunite_date[individus], dates)
+        immunises = vaccins != AUCUN
+        if immunises.any():
+            immunite[immunises] *= 1 - self.table_immunite.efficacite(vaccins[immunises], self.population.age[individus[immunises]],
+                                                                      jour - dates[immunises], type)
+        return immunite
+
+    def tirage(self, base, multiplicateurs):
+        """Renvoie vrai ou faux pour chaque individu selon une probabilité de base et un multiplicateur"""
+        self.instrumentation.compter("tirages", len(multiplicateurs))
+        return base*multiplicateurs >= self.generateur.random(len(multiplicateurs))
+
+    def contaminer(self, infectes, jour):
+        """Renvoie les voisins sains nouvellement contaminés par les individus infectés
+
+        Chaque arête transmet l'infection avec la probabilité infection_proba*poids*immunité du voisin. Les arêtes candidates sont
+        d'abord tirées avec la probabilité majorante infection_proba (nombre de candidates selon une loi binomiale, puis choix sans
+        remise), puis retenues avec la probabilité poids*immunité : le nombre de tirages suit le nombre d'infections, pas de contacts."""
+        majorant = min(self.param.infection_proba, 1)
+        index = self.population.voisins_index
+        debut = index[infectes]
+        nb_voisins = index[infectes+1] - debut
+        nb_aretes = int(nb_voisins.sum())
+        if nb_aretes == 0 or majorant <= 0:
+            return np.empty(0, dtype=np.int64)
+
+        # Position des arêtes candidates parmi toutes les arêtes partant des individus infectés, puis indices dans le graphe CSR
+        candidates = np.sort(self.generateur.choice(nb_aretes, self.generateur.binomial(nb_aretes, majorant), replace=False, shuffle=False))
+        self.instrumentation.compter("contacts", nb_aretes)
+        self.instrumentation.compter("candidats", len(candidates))
+        self.instrumentation.compter("tirages", 1 + len(candidates))
+        fins = np.cumsum(nb_voisins)
+        infecteurs = np.searchsorted(fins, candidates, side="right")
+        aretes = debut[infecteurs] + candidates - (fins - nb_voisins)[infecteurs]
+        voisins = self.population.voisins_id[aretes].astype(np.int64)
+        sains = self.etat.sante[voisins] == NEUTRE
+        voisins, aretes = voisins[sains], aretes[sains]
+
+        infection = self.tirage(self.param.infection_proba/majorant, self.population.voisins_poids[aretes]*self.immunite(voisins, jour, INFECTION))
+        return np.unique(voisins[infection])
+
+    def contaminer_couches(self, infectes, jour):
+        """Renvoie les contacts sains nouvellement contaminés par les individus infectés, sur les couches du réseau de contacts
+
+        La pression d'infection de chaque contact (somme des poids de ses contacts infectés, couches pondérées selon la stratégie)
+        est calculée par un produit matrice creuse-vecteur ; un contact est contaminé avec la probabilité
+        (1 - exp(-infection_proba*pression))*immunité, soit une transmission indépendante par contact pour de faibles probabilités."""
+        contacts, pression = self.couches.pression(infectes, multiplicateurs_couches(self.strategie, jour))
+        self.instrumentation.compter("contacts", len(contacts))
+        sains = self.etat.sante[contacts] == NEUTRE
+        contacts, pression = contacts[sains], pression[sains]
+        infection = self.tirage(1, -np.expm1(-self.param.infection_proba*pression.astype(np.float64))*self.immunite(contacts, jour, INFECTION))
+        return contacts[infection]
+
+    def importer(self, jour):
+        """Renvoie les individus sains contaminés par des contacts extérieurs à la population, avec la probabilité pression_exterieure*immunité
+
+        Les candidats sont tirés parmi toute la population (nombre selon une loi binomiale, puis choix sans remise), puis retenus
+        selon leur état et leur immunité : le nombre de tirages suit le nombre de contaminations, pas la taille de la population."""
+        probabilite = min(self.pression_exterieure, 1)
+        if probabilite <= 0:
+            return np.empty(0, dtype=np.int64)
+        candidats = np.sort(self.generateur.choice(self.nb_individus, self.generateur.binomial(self.nb_individus, probabilite), replace=False, shuffle=False))
+        candidats = candidats[self.etat.sante[candidats] == NEUTRE]
+        return candidats[self.tirage(1, self.immunite(candidats, jour, INFECTION))]
+
+    def vacciner(self, jour):
+        """Distribue les doses de vaccin du jour aux individus éligibles, renvoie le nombre de vaccinés du jour"""
+        vaccination_jour = jour - self.strategie.jour_debut_vaccination + 1
+        if self.plan_vaccination is None:
+            self.plan_vaccination = PlanVaccination(self.strategie, self.population.age, self.population.activite)
+        self.plan_vaccination.activer(vaccination_jour)
+        vaccines = 0
+        for (vaccin, nombre_doses) in self.donnees.get_nombre_vaccination(vaccination_jour):
+            # Calcul du nombre de doses effective sur la taille de la population de la simulation
+            self.doses_a_distribuer += round(nombre_doses * self.nb_individus / self.strategie.taille_population_vaccination)
+            if self.doses_a_distribuer <= 0:
+                continue
+            # Seuls les individus sains peuvent être vaccinés
+            individus = self.plan_vaccination.tirer(self.doses_a_distribuer, lambda individus: self.etat.sante[individus] == NEUTRE, self.generateur)
+            self.etat.vacciner(individus, self.table_immunite.index_vaccin[vaccin], jour)
+            self.instrumentation.compter("vaccines", len(individus))
+            self.doses_a_distribuer -= len(individus)
+            vaccines += len(individus)
+        self.nb_vaccines += vaccines
+        return vaccines
+
+    def fins_hospitalisation(self, jour):
+        """Traite les individus dont l'hospitalisation se termine, renvoie les nouveaux décédés et guéris"""
+        etat = self.etat
+        fin = self.evenements(self.calendrier_hopital, jour)
+        fin = fin[etat.infection_fin[fin] == jour]
+        # On décide si l'individu redevient sain, ou décède
+        deces = self.tirage(self.param.deces_proba, self.immunite(fin, jour, DECES))
+        etat.deces(fin[deces])
+        etat.guerir(fin[~deces], jour)
+        self.nb_infectes -= len(fin)
+        self.nb_hospitalises -= len(fin)
+        self.nb_decedes += int(deces.sum())
+        return int(deces.sum()), int((~deces).sum())
+
+    def fins_infection(self, jour):
+        """Traite les individus dont l'infection se termine, renvoie les nouveaux hospitalisés et guéris"""
+        etat = self.etat
+        fin = self.evenements(self.calendrier_infection, jour)
+        fin = fin[etat.sante_fin[fin] == jour]
+        # On décide si l'individu redevient sain, ou est hospitalisé
+        hopital = self.tirage(self.param.hopital_proba, self.immunite(fin, jour, HOSPITALISATION))
+        hospitalises = fin[hopital]
+        etat.hospitaliser(hospitalises, jour + 1 + self.durees(self.param.hopital_duree, len(hospitalises)))
+        self.programmer(self.calendrier_hopital, hospitalises, etat.infection_fin[hospitalises])
+        etat.guerir(fin[~hopital], jour)
+        self.nb_hospitalises += len(hospitalises)
+        self.nb_infectes -= int((~hopital).sum())
+        return len(hospitalises), int((~hopital).sum())
+
+    def vague(self, precedente):
+        """Renvoie les individus qui contaminent leurs voisins : tous les contagieux du jour pour la première vague,
+        puis les individus contaminés par la vague précédente dont l'infection est toujours en cours"""
+        if precedente is None:
+            self.contagieux = np.unique(self.contagieux[self.etat.sante_fin[self.contagieux] != AUCUN])
+            return self.contagieux
+        return precedente[self.etat.sante_fin[precedente] != AUCUN]
+
+    def infecter(self, individus, jour):
+        """Infecte les individus contaminés au cours du jour"""
+        self.etat.infecter(individus, jour + self.durees(self.param.infection_duree, len(individus)))
+        self.programmer(self.calendrier_infection, individus, self.etat.sante_fin[individus])
+        self.contagieux = np.concatenate((self.contagieux, individus))
+        self.nb_infectes += len(individus)
+
+    def jour(self, jour):
+        """Simule un jour et renvoie les nouveaux infectés, hospitalisés, décédés et guéris
+
+        Seuls les individus dont l'état se termine ce jour (d'après les calendriers) et les contagieux sont traités."""
+        nouveaux_infectes = 0
+        nouveaux_hospitalises = 0
+        with self.instrumentation.phase("hopital"):
+            nouveaux_decedes, nouveaux_gueris = self.fins_hospitalisation(jour)
+
+        # Contaminations par des contacts extérieurs (autres régions) : les individus contaminés contaminent leurs voisins le jour même
+        if self.pression_exterieure > 0:
+            with self.instrumentation.phase("importation"):
+                importes = self.importer(jour)
+                self.infecter(importes, jour)
+            nouveaux_infectes += len(importes)
+
+        # Individus infectés, traités par vagues : comme dans le moteur par individus, les individus contaminés
+        # au cours du jour contaminent à leur tour leurs voisins le jour même, et ceux dont l'infection dure 0 jour
+        # sont traités immédiatement
+        vague = None
+        while True:
+            with self.instrumentation.phase("fins_infection"):
+                hospitalises, gueris = self.fins_infection(jour)
+            nouveaux_hospitalises += hospitalises
+            nouveaux_gueris += gueris
+
+            vague = self.vague(vague)
+            if len(vague) == 0:
+                break
+            # Infection potentielle des voisins
+            with self.instrumentation.phase("contamination"):
+                vague = self.contaminer(vague, jour) if self.couches is None else self.contaminer_couches(vague, jour)
+                self.infecter(vague, jour)
+            nouveaux_infectes += len(vague)
+
+        # Vaccination
+        if jour >= self.strategie.jour_debut_vaccination:
+            with self.instrumentation.phase("vaccination"):
+                self.vacciner(jour)
+
+        return nouveaux_infectes, nouveaux_hospitalises, nouveaux_decedes, nouveaux_gueris
+
+    def sauvegarde(self):
+        """Renvoie l'état complet du moteur (population, calendriers, vaccination, générateur aléatoire) :
+        un dictionnaire de tableaux numpy et un dictionnaire de valeurs simples"""
+        tableaux, valeurs = self.sauvegarde_evolution()
+        tableaux.update({nom: getattr(self.etat, nom) for (nom, type, valeur) in CHAMPS_ETAT})
+        valeurs["doses_a_distribuer"] = self.doses_a_distribuer
+        valeurs["nb_vaccines"] = self.nb_vaccines
+        if self.plan_vaccination is not None:
+            plan_tableaux, valeurs["plan"] = self.plan_vaccination.sauvegarde()
+            valeurs["plan"]["dates_vaccination"] = self.strategie.dates_vaccination
+            tableaux.update({f"plan_{nom}": tableau for (nom, tableau) in plan_tableaux.items()})
+        return tableaux, valeurs
+
+    def sauvegarde_evolution(self):
+        """Renvoie les calendriers (sans les événements caducs), les contagieux, les totaux et l'état du générateur aléatoire"""
+        tableaux = {"contagieux": self.contagieux}
+        for (nom, calendrier, fins) in (("infection", self.calendrier_infection, self.etat.sante_fin),
+                                        ("hopital", self.calendrier_hopital, self.etat.infection_fin)):
+            jours = sorted(calendrier.evenements)
+            individus = [np.concatenate(calendrier.evenements[jour]) for jour in jours]
+            individus = [groupe[fins[groupe] == jour] for (jour, groupe) in zip(jours, individus)]
+            tableaux[f"calendrier_{nom}_jours"] = np.repeat(np.array(jours, dtype=np.int32), [len(groupe) for groupe in individus])
+            tableaux[f"calendrier_{nom}_individus"] = np.concatenate(individus) if individus else np.empty(0, dtype=np.int64)
+        valeurs = {"nb_infectes": self.nb_infectes, "nb_hospitalises": self.nb_hospitalises, "nb_decedes": self.nb_decedes,
+                   "generateur": self.generateur.bit_generator.state}
+        return tableaux, valeurs
+
+    def restaurer(self, tableaux, valeurs):
+        """Rétablit l'état complet du moteur enregistré par sauvegarde"""
+        for (nom, type, valeur) in CHAMPS_ETAT:
+            getattr(self.etat, nom)[:] = tableaux[nom]
+        self.restaurer_evolution(tableaux, valeurs)
+        self.doses_a_distribuer = valeurs["doses_a_distribuer"]
+        self.nb_vaccines = valeurs["nb_vaccines"]
+        if "plan" in valeurs:
+            self.plan_vaccination = PlanVaccination(self.strategie, self.population.age, self.population.activite)
+            if valeurs["plan"]["dates_vaccination"] == json.loads(json.dumps(self.strategie.dates_vaccination)):
+                self.plan_vaccination.restaurer({nom[5:]: tableau for (nom, tableau) in tableaux.items() if nom.startswith("plan_")}, valeurs["plan"])
+            else:
+                # Stratégie différente (branche d'une bifurcation) : les candidats sont recalculés à la prochaine vaccination
+                self.plan_vaccination.vaccine[:] = self.etat.vaccin_type != AUCUN
+
+    def restaurer_evolution(self, tableaux, valeurs):
+        """Rétablit les calendriers, les contagieux, les totaux et l'état du générateur aléatoire enregistrés par sauvegarde_evolution"""
+        self.contagieux = np.array(tableaux["contagieux"])
+        for (nom, calendrier) in (("infection", self.calendrier_infection), ("hopital", self.calendrier_hopital)):
+            calendrier.evenements = {}
+            jours = tableaux[f"calendrier_{nom}_jours"]
+            individus = np.array(tableaux[f"calendrier_{nom}_individus"])
+            debuts = np.flatnonzero(np.diff(jours, prepend=jours[:1] - 1)) if len(jours) else []
+            for (debut, fin) in zip(debuts, [*debuts[1:], len(jours)]):
+                calendrier.programmer(int(jours[debut]), individus[debut:fin])
+        self.nb_infectes = valeurs["nb_infectes"]
+        self.nb_hospitalises = valeurs["nb_hospitalises"]
+        self.nb_decedes = valeurs["nb_decedes"]
+        self.generateur.bit_generator.state = valeurs["generateur"]
+
+    def ensemencer(self, graine):
+        """Remplace le générateur aléatoire par un nouveau flux (branche d'une bifurcation)"""
+        self.generateur = np.random.default_rng(graine)
+
+    def suivre_modifications(self):
+        """Commence à noter les individus dont l'état change (journal des changements d'état)"""
+        self.etat.suivre()
+
+    def modifications(self):
+        """Renvoie les individus dont l'état a changé depuis le dernier appel et leur code d'état"""
+        individus = self.etat.extraire_modifies()
+        return individus, self.etat.codes(individus)
+
+    def fermer(self):
+        """Libère les ressources du moteur à la fin de la simulation (aucune pour le moteur vectorisé)"""
+
+    def totaux(self):
+        """Renvoie le nombre total d'infectés, d'hospitalisés, de décédés et de vaccinés"""
+        return self.nb_infectes, self.nb_hospitalises, self.nb_decedes, self.nb_vaccines
@@ -3,233 +3,281 @@
 # Objectif : recréer une population représentative de la population française par rapport à différents critères.
 
 # Modules externes
+import json
+import os
 import sqlite3
-from random import random
+import tempfile
+from contextlib import closing
 
 import numpy as np
-from scipy.spatial import distance
 from sklearn.datasets import make_blobs
 
-# Module interne
+# Modules internes
+from aleatoire import graines_independantes
 from constantes import *
+from voisinage import construire_voisins, poids_voisins
 
-# Chemin de la base de donnée qui contient les données réelle sur la répartition de la population, les probabilités d'hospitalisation et de décés, ainsi que l'efficacité des vaccins
-database_loc_data = "res/simulation_data.db"
 # Chemin de la base de donnée qui contient la liste des individus de la population générée, et les états infectieux
 database_loc_pop = "data/population.db"
 
-# Initialisation des bases de données et des curseurs
-data_db = sqlite3.connect(database_loc_data)
-pop_db = sqlite3.connect(database_loc_pop)
-data_cur = data_db.cursor()
-pop_cur = pop_db.cursor()
-
-# Liste des maladies prises en compte
-MALADIE_LISTE = ["obésité", "diabète", "dyslipidémies", "métabolique", "hypertension", "coronariennes", "artériopathie", "trouble cardiaque", "insuffisance cardiaque",
-                 "valvulopathies", "avc", "respiratoire", "mucoviscidose", "embolie", "cancer", "inflammatoire", "antidépresseur", "neuroleptique", "parkinson", "démence"]
+# Tableaux numériques de la population enregistrés tels quels dans un instantané
+TABLEAUX_INSTANTANE = ["age", "multiplicateur", "population_position", "voisins_index", "voisins_id", "voisins_distance", "voisins_poids"]
 
 
 class Population:
     """Représente une population d'individus"""
 
-    def __init__(self, nb_individus, variance_pop, max_distance, regenere):
+    def __init__(self, donnees, nb_individus, variance_pop, max_distance, regenere, instantane=None, graine=None, chemin=database_loc_pop):
+        self.donnees = donnees  # Données de référence (DonneesReference)
+        self.nb_individus = nb_individus
+        self.variance_pop = variance_pop
+        self.max_distance = max_distance
+        self.cache_individus = None  # Liste des objets Individu, créée à la première utilisation
+        self.instantane = None  # Dossier de l'instantané de la population, s'il a été enregistré ou chargé
+
+        # Si un instantané de la même population existe, on le recharge sans rien recalculer
+        if instantane is not None and not regenere and self.instantane_valide(instantane):
+            print("Chargement de l'instantané de la population...")
+            self.charger(instantane)
+            return
+
+        # Flux aléatoires indépendants des caractéristiques et des positions des individus
+        graine_caracteristiques, graine_positions = graines_independantes(graine, 2)
+
         if regenere: # Regénérer ou non une nouvelle population
             # Génère la population dans la base de donnée.
-            self.generer_population(nb_individus)
+            self.generer_population(nb_individus, graine_caracteristiques, chemin)
 
-        # Curseur de la base de données
-        pop_db.row_factory = sqlite3.Row
-        pop_cur = pop_db.cursor()
-
-        self.individus = []  # Liste qui contient les individus
-        alldata = pop_cur.execute("SELECT * from population").fetchall()
+        # Lecture de la population dans la base de données (chemin)
+        with closing(sqlite3.connect(chemin)) as pop_db:
+            pop_db.row_factory = sqlite3.Row
+            alldata = pop_db.execute("SELECT * from population").fetchall()
 
         # Génération de la répartition spatiale de la population
         self.population_position, y = make_blobs(n_samples=nb_individus, centers=1, center_box=(
-            0, 0), cluster_std=variance_pop)  # Génération des coordonées
+            0, 0), cluster_std=variance_pop, random_state=int(graine_positions.generate_state(1)[0]))  # Génération des coordonées
         self.population_position = self.population_position.astype("float16")
 
         print("Attribution des voisins de chaque individu...")
-        for id in range(nb_individus):
-            if id % 1000 == 0:
-                print(
-                    f"\tCalcul... {id}/{nb_individus} ({(id/nb_individus*100):.2f}%)", end="\r")
-
-            # On récupère les données concernant l'individu
-            data = dict(alldata[id])
-            # Calcul des distance entre l'individu et les autres
-            individu_distance = distance.cdist(
-                [self.population_position[id]], self.population_position)
-            # On ne sauvegarde que la liste des individus proches, ainsi que la distance associée.
-            voisins = np.where(individu_distance < max_distance)[1]
-            voisins_valeur = np.extract(
-                individu_distance < max_distance, individu_distance)
-            # On ajoute l'individu généré à partir des données
-            self.individus.append(Individu(data["id_individu"], data["age"], data["sexe"], data["activité"],
-                                  self.calcul_risque_multiplicateur(data), list(zip(voisins, voisins_valeur))))
-
-    def calcul_risque_multiplicateur(self, data):
-        """"Calcule et renvoie les risques relatifs d'hospitalisation et de décès en fonction des données d'un individu"""
-        # Risque relatif du à l'âge
-        multiplicateur = np.array(data_cur.execute(
-            "SELECT probar_hopital, probar_deces from age WHERE min <= ? AND max >= ?", (data["age"], data["age"])).fetchall()[0])
-        # Risque relatif du au sexe
-        multiplicateur *= np.array(data_cur.execute(
-            "SELECT probar_hopital, probar_deces from repartition_sexe WHERE sexe = ?", (data["sexe"],)).fetchall()[0])
-        # Risque relatif du aux quintiles sociales
-        multiplicateur *= np.array(data_cur.execute(
-            "SELECT probar_hopital, probar_deces from social WHERE quintile = ?", (data["quintile"],)).fetchall()[0])
-        # Risque relatif du aux habitudes de vie (tabac et alcool)
-        if data["tabac"]:
-            multiplicateur *= np.array(data_cur.execute(
-                "SELECT probar_hopital, probar_deces from habitudes WHERE carac = 'tabac'").fetchall()[0])
-        if data["alcool"]:
-            multiplicateur *= np.array(data_cur.execute(
-                "SELECT probar_hopital, probar_deces from habitudes WHERE carac = 'alcool'").fetchall()[0])
-        # Risque relatif du à chaque maladie
-        for maladie in MALADIE_LISTE:
-            if data[maladie]:
-                multiplicateur *= np.array(data_cur.execute(
-                    "SELECT probar_hopital, probar_deces from maladie WHERE nom = ?", (maladie, )).fetchall()[0])
-        # On renvoie le tuple multiplicateur (hospitalisation, décès)
-        return multiplicateur[0], multiplicateur[1]
-
-    def generer_population(self, nb_population):
-        """Génère la population dans la base de donnée"""
+        # Graphe des voisins au format CSR : les voisins de l'individu i sont voisins_id[voisins_index[i]:voisins_index[i+1]]
+        self.voisins_index, self.voisins_id, self.voisins_distance = construire_voisins(
+            self.population_position, max_distance)
+        # Poids de transmission de chaque arête, calculés une seule fois
+        self.voisins_poids = poids_voisins(self.voisins_distance)
+
+        # Caractéristiques de la population sous forme de colonnes
+        donnees = {colonne: np.array(valeurs) for (colonne, valeurs) in zip(alldata[0].keys(), zip(*alldata))}
+        self.age = donnees["age"]
+        self.sexe = donnees["sexe"].astype(object)
+        self.activite = donnees["activité"].astype(object)
+        # Risques relatifs d'hospitalisation et de décès de chaque individu, calculés en une fois
+        self.multiplicateur = self.donnees.risques.multiplicateurs(donnees)
+
+        if instantane is not None:
+            self.sauvegarder(instantane)
+
+    @staticmethod
+    def depuis_instantane(donnees, dossier):
+        """Renvoie la population enregistrée dans un instantané, avec ses paramètres d'origine"""
+        with open(os.path.join(dossier, "parametres.json"), encoding="utf-8") as fichier:
+            parametres = json.load(fichier)
+        return Population(donnees, parametres["nb_individus"], parametres["variance_pop"], parametres["max_distance"], False, dossier)
+
+    @property
+    def individus(self):
+        """Renvoie la liste des individus (objets Individu utilisés par le moteur par individus), créée à la première utilisation"""
+        if self.cache_individus is None:
+            self.cache_individus = []
+            for id in range(self.nb_individus):
+                # On ajoute l'individu généré à partir des données, avec une vue sur ses voisins et les poids de transmission associés
+                # (les identifiants de la base de données commencent à 1)
+                debut, fin = self.voisins_index[id], self.voisins_index[id+1]
+                self.cache_individus.append(Individu(id + 1, int(self.age[id]), self.sexe[id], self.activite[id],
+                                            self.multiplicateur[id], self.voisins_id[debut:fin], self.voisins_poids[debut:fin]))
+        return self.cache_individus
+
+    def reinitialiser_individus(self):
+        """Oublie les objets Individu (et leur état de santé) : ils seront recréés sains à la prochaine utilisation"""
+        self.cache_individus = None
+
+    def instantane_valide(self, dossier):
+        """Renvoie si le dossier contient un instantané de population généré avec les mêmes paramètres"""
+        try:
+            with open(os.path.join(dossier, "parametres.json"), encoding="utf-8") as fichier:
+                parametres = json.load(fichier)
+        except FileNotFoundError:
+            return False
+        return parametres == {"nb_individus": self.nb_individus, "variance_pop": self.variance_pop, "max_distance": self.max_distance}
+
+    def sauvegarder(self, dossier):
+        """Enregistre la population (caractéristiques, positions, risques relatifs et voisins) dans un dossier de tableaux numpy"""
+        os.makedirs(dossier, exist_ok=True)
+        # Les caractéristiques textuelles sont enregistrées sous forme de codes, avec la liste des libellés
+        for (nom, valeurs) in (("sexe", self.sexe), ("activite", self.activite)):
+            libelles, codes = np.unique(valeurs.astype(str), return_inverse=True)
+            np.save(os.path.join(dossier, f"{nom}_libelles.npy"), libelles)
+            np.save(os.path.join(dossier, f"{nom}.npy"), codes.astype(np.int8))
+        for nom in TABLEAUX_INSTANTANE:
+            np.save(os.path.join(dossier, f"{nom}.npy"), getattr(self, nom))
+        # Les paramètres sont écrits en dernier : un instantané incomplet n'est pas considéré comme valide
+        with open(os.path.join(dossier, "parametres.json"), "w", encoding="utf-8") as fichier:
+            json.dump({"nb_individus": self.nb_individus, "variance_pop": self.variance_pop, "max_distance": self.max_distance}, fichier)
+        self.instantane = dossier
+
+    def charger(self, dossier):
+        """Charge la population depuis un instantané, en projetant les tableaux en mémoire (partagés entre processus)"""
+        for nom in TABLEAUX_INSTANTANE:
+            if nom == "voisins_poids" and not os.path.exists(os.path.join(dossier, f"{nom}.npy")):
+                # Instantané antérieur aux poids de transmission : ils sont recalculés
+                self.voisins_poids = poids_voisins(self.voisins_distance)
+                continue
+            setattr(self, nom, np.load(os.path.join(dossier, f"{nom}.npy"), mmap_mode="r"))
+        for nom in ("sexe", "activite"):
+            libelles = np.array([None if libelle == "None" else str(libelle) for libelle in np.load(os.path.join(dossier, f"{nom}_libelles.npy"))], dtype=object)
+            setattr(self, nom, libelles[np.load(os.path.join(dossier, f"{nom}.npy"), mmap_mode="r")])
+        self.instantane = dossier
+
+    def sauvegarder_temporaire(self):
+        """Enregistre la population dans un instantané temporaire si elle n'en a pas déjà un (pour les processus de calcul)
+
+        Renvoie le dossier temporaire (tempfile.TemporaryDirectory), à passer à supprimer_temporaire une fois les processus
+        arrêtés, ou None si l'instantané existant est utilisé."""
+        if self.instantane is not None:
+            return None
+        temporaire = tempfile.TemporaryDirectory(prefix="instantane_")
+        self.sauvegarder(temporaire.name)
+        return temporaire
+
+    def supprimer_temporaire(self, temporaire):
+        """Supprime un instantané créé par sauvegarder_temporaire (sans effet si temporaire vaut None)"""
+        if temporaire is None:
+            return
+        if self.instantane == temporaire.name:
+            self.instantane = None
+        temporaire.cleanup()
+
+    def generer_population(self, nb_population, graine=None, chemin=database_loc_pop):
+        """Génère la population dans la base de donnée (chemin), avec un générateur aléatoire initialisé par graine
+
+        Toutes les caractéristiques sont tirées en une fois avec numpy, puis écrites dans une seule transaction."""
         print("Génération de la population...")
-
-        # Création de la table de données
-        pop_cur.execute("DROP TABLE population")
-        pop_cur.execute('CREATE TABLE IF NOT EXISTS "population" ("id_individu" INTEGER NOT NULL,"age" INTEGER,\
-        "sexe" TEXT NOT NULL DEFAULT "femme", "activité" TEXT, "quintile" INTEGER,"tabac" INTEGER NOT NULL DEFAULT 0,"alcool" INTEGER NOT NULL DEFAULT 0,\
-        "obésité" INTEGER NOT NULL DEFAULT 0,"diabète" INTEGER NOT NULL DEFAULT 0,"dyslipidémies" INTEGER NOT NULL DEFAULT 0,\
-        "métabolique" INTEGER NOT NULL DEFAULT 0,"hypertension" INTEGER NOT NULL DEFAULT 0,"coronariennes" INTEGER NOT NULL DEFAULT 0,\
-        "artériopathie" INTEGER NOT NULL DEFAULT 0,"trouble cardiaque" INTEGER NOT NULL DEFAULT 0,"insuffisance cardiaque" INTEGER NOT NULL DEFAULT 0,\
-        "valvulopathies" INTEGER NOT NULL DEFAULT 0,"avc" INTEGER NOT NULL DEFAULT 0,"respiratoire" INTEGER NOT NULL DEFAULT 0,\
-        "mucoviscidose" INTEGER NOT NULL DEFAULT 0,"embolie" INTEGER NOT NULL DEFAULT 0,"cancer" INTEGER NOT NULL DEFAULT 0,\
-        "inflammatoire" INTEGER NOT NULL DEFAULT 0,"antidépresseur" INTEGER NOT NULL DEFAULT 0,"neuroleptique" INTEGER NOT NULL DEFAULT 0,\
-        "parkinson" INTEGER NOT NULL DEFAULT 0,"démence" INTEGER NOT NULL DEFAULT 0,PRIMARY KEY("id_individu" AUTOINCREMENT))')
-        pop_db.commit()
+        generateur = np.random.default_rng(graine)
+        donnees = self.donnees
 
         print("Attribution de l'âge...")
-
-        # On récupère la répartition des âges dans la base de donnée
-        nb_age = data_cur.execute(
-            "SELECT COUNT(age) FROM age_detail").fetchall()[0][0]
-        for age in range(nb_age):  # On boucle sur tous les âges à attribuer
-            # On calcule le nombre d'individu à attribuer cet âge en fonction de la proportion de cet âge dans la population
-            if age == 100:
-                nb_individu_age = nb_population - \
-                    pop_cur.execute(
-                        "SELECT COUNT(id_individu) FROM population").fetchall()[0][0]
-            else:
-                nb_individu_age = round(data_cur.execute(
-                    "SELECT proportion FROM age_detail WHERE age = ?", (age,)).fetchall()[0][0] * nb_population)
-            # On ajoute les individus dans la BDD avec l'âge voulu
-            for individu in range(nb_individu_age):
-                pop_cur.execute(
-                    "INSERT INTO population (age) VALUES (?)", (age,))
-        pop_db.commit()
-
-        print("\033[KAttribution du sexe...")
+        # On calcule le nombre d'individus de chaque âge en fonction de la proportion de cet âge dans la population
+        ages_proportion = donnees.age_detail
+        nb_individu_age = [round(proportion * nb_population) for (age, proportion) in ages_proportion[:-1]]
+        # Le dernier âge complète la population
+        nb_individu_age.append(max(nb_population - sum(nb_individu_age), 0))
+        age = np.repeat([age for (age, proportion) in ages_proportion], nb_individu_age)[:nb_population]
+        nb_population = len(age)
+
+        print("Attribution du sexe...")
         # Récupération et attribution du sexe des individus
-        proportion_homme = data_cur.execute(
-            "SELECT proportion FROM repartition_sexe WHERE sexe = 'homme'").fetchall()[0][0]
-        pop_cur.execute("UPDATE population SET sexe = 'homme' WHERE id_individu IN (SELECT id_individu FROM population ORDER BY RANDOM() LIMIT ROUND ((SELECT COUNT(id_individu) FROM population) * ?))", (proportion_homme, ))
-        pop_db.commit()
+        proportion_homme = donnees.proportion_sexe["homme"]
+        sexe = np.full(nb_population, "femme", dtype=object)
+        sexe[generateur.permutation(nb_population)[:arrondi(nb_population * proportion_homme)]] = "homme"
 
         print("Attribution des quintiles sociales...")
-        # Récupération et attribution des quintiles sociales des individus
-        quintiles_prop = data_cur.execute(
-            "SELECT quintile, proportion FROM social").fetchall()
-        for quintile in quintiles_prop:
-            pop_cur.execute(
-                "UPDATE population SET quintile = ? WHERE id_individu IN (SELECT id_individu FROM population WHERE quintile IS NULL ORDER BY RANDOM() LIMIT ROUND ((SELECT COUNT(id_individu) FROM population) * ?))", (quintile[0], quintile[1]))
-        pop_db.commit()
+        # Récupération et attribution des quintiles sociales des individus : chaque quintile prend sa part des individus restants
+        quintile = np.full(nb_population, None, dtype=object)
+        ordre = generateur.permutation(nb_population)
+        debut = 0
+        for (numero, proportion) in donnees.social:
+            fin = debut + arrondi(nb_population * proportion)
+            quintile[ordre[debut:fin]] = numero
+            debut = fin
 
         print("Attribution des habitudes de vie...")
         # Récupération et attribution des habitudes de vie des individus
-        habitudes_prop = data_cur.execute(
-            "SELECT carac, proportion FROM habitudes").fetchall()
-        prop_15_ans = data_cur.execute(
-            "SELECT SUM(proportion) FROM age_detail WHERE age >= 15").fetchall()[0][0]
-        for habitude in habitudes_prop:
+        prop_15_ans = sum(proportion for (age_detail, proportion) in ages_proportion if age_detail >= 15)
+        plus_15_ans = np.flatnonzero(age >= 15)
+        habitudes = {}
+        for (habitude, proportion) in donnees.habitudes:
             # On pondère la proportion pour n'appliquer les habitudes de vie seulement aux plus de 15 ans
-            prop_ponderee = habitude[1]/prop_15_ans
-            pop_cur.execute(
-                "UPDATE population SET {} = 1 WHERE id_individu IN (SELECT id_individu FROM population WHERE age >= 15 ORDER BY RANDOM() LIMIT ROUND ((SELECT COUNT(id_individu) FROM population WHERE age >= 15) * ?))".format(habitude[0]), (prop_ponderee, ))
-        pop_db.commit()
+            habitudes[habitude] = np.zeros(nb_population, dtype=np.int64)
+            habitudes[habitude][generateur.permutation(plus_15_ans)[:arrondi(len(plus_15_ans) * proportion / prop_15_ans)]] = 1
 
         print("Attribution de la présence de maladies...")
-        # On récupère chaque tranche d'âge avec la proportion de personnes qui ont une maladie chronique
-        moyenne_proportion_age = data_cur.execute(
-            "SELECT AVG(proportion) FROM repartition_maladie").fetchall()[0][0]
-        nb_maladie = len(MALADIE_LISTE)
-
-        # On boucle sur toutes les maladie, avec leur proportion dans la population
-        for (avancement, (maladie, proportion_maladie)) in enumerate(data_cur.execute("SELECT nom, proportion FROM maladie").fetchall()):
-            print(f"\tAttribution de la maladie {avancement+1}/{nb_maladie} ({(avancement+1/nb_maladie*100):.2f}%) ('{maladie}')", end="\r")
-            # On boucle sur les individus
-            for (avancement_pop, (id_individu, age)) in enumerate(pop_cur.execute("SELECT id_individu,age FROM population").fetchall()):
-                if avancement_pop % 5000 == 0:
-                    print(
-                        f"\t\tAttribution de la maladie {avancement_pop+1}/{nb_population} ({(avancement_pop+1/nb_population*100):.2f}%)", end="\r")
-
-                proportion_age = data_cur.execute(
-                    "SELECT proportion FROM repartition_maladie WHERE min <= ? AND max >= ?", (age, age)).fetchall()[0][0]
-                # On attribue aléatoirement la maladie à l'individu en fonction de la probabilité pondérée par la répartition selon l'âge
-                if random() < proportion_maladie*proportion_age/moyenne_proportion_age:
-                    pop_cur.execute("UPDATE population SET '{}' = 1 WHERE id_individu = ?".format(
-                        maladie), (id_individu, ))
-        pop_db.commit()
-
-        print("\033[KAttribution de l'emploi...")
+        # On récupère pour chaque âge la proportion de personnes qui ont une maladie chronique
+        moyenne_proportion_age = donnees.moyenne_proportion_maladie
+        proportion_age = donnees.proportion_maladie_age[age]
+        # On attribue aléatoirement chaque maladie en fonction de la probabilité pondérée par la répartition selon l'âge
+        maladies = {}
+        for (maladie, proportion_maladie) in donnees.maladie:
+            maladies[maladie] = (generateur.random(nb_population) < proportion_maladie*proportion_age/moyenne_proportion_age).astype(np.int64)
+
+        print("Attribution de l'emploi...")
         # On récupère et attribue une catégorie d'activité professionnelle aux individus en fonction de l'âge et du sexe
-        pop_cur.execute(
-            "UPDATE population SET activité = 'études' WHERE age >= 3 AND age < 15")
+        activite = np.full(nb_population, None, dtype=object)
+        activite[(age >= 3) & (age < 15)] = "études"
         # On boucle sur chaque groupe d'âge de la répartition des secteurs d'activité
-        for (age_min, age_max, sexe, proportion_emploi) in data_cur.execute("SELECT * FROM repartition_emploi").fetchall():
-            # On boucle sur chaque secteur d'activité pour attribuer l'activité en fonction de sa proportion
-            for (secteur, proportion_sexe, proportion_age) in data_cur.execute("SELECT emploi_sexe.secteur, emploi_sexe.proportion, emploi_age.proportion FROM emploi_age JOIN emploi_sexe ON emploi_sexe.secteur = emploi_age.secteur WHERE sexe = ? AND min <= ? AND max >= ?", (sexe, age_min, age_max)).fetchall():
-                pop_cur.execute("UPDATE population SET activité = ? WHERE id_individu IN (SELECT id_individu FROM population WHERE sexe = ? AND age <= ? AND age >= ? AND activité IS NULL ORDER BY RANDOM() LIMIT ROUND ((SELECT COUNT(id_individu) FROM population WHERE sexe = ? AND age <= ? AND age >= ?) * ?))",
-                (secteur, sexe, age_max, age_min, sexe, age_max, age_min, proportion_emploi*proportion_age*proportion_sexe))
-        pop_db.commit()
+        for (age_min, age_max, sexe_groupe, proportion_emploi, secteurs) in donnees.repartition_emploi:
+            groupe = np.flatnonzero((sexe == sexe_groupe) & (age >= age_min) & (age <= age_max))
+            # Les individus sans activité du groupe sont répartis dans chaque secteur d'activité en fonction de sa proportion
+            sans_activite = generateur.permutation(groupe[activite[groupe] == None])
+            debut = 0
+            for (secteur, proportion_sexe, proportion_age) in secteurs:
+                fin = debut + arrondi(len(groupe) * proportion_emploi*proportion_age*proportion_sexe)
+                activite[sans_activite[debut:fin]] = secteur
+                debut = fin
+
+        print("Enregistrement de la population...")
+        # Le dossier des données générées (non suivi par git) est créé au besoin
+        os.makedirs(os.path.dirname(chemin) or ".", exist_ok=True)
+        with closing(sqlite3.connect(chemin)) as pop_db:
+            pop_cur = pop_db.cursor()
+            # Création de la table de données
+            pop_cur.execute("DROP TABLE IF EXISTS population")
+            pop_cur.execute('CREATE TABLE IF NOT EXISTS "population" ("id_individu" INTEGER NOT NULL,"age" INTEGER,\
+        "sexe" TEXT NOT NULL DEFAULT "femme", "activité" TEXT, "quintile" INTEGER,"tabac" INTEGER NOT NULL DEFAULT 0,"alcool" INTEGER NOT NULL DEFAULT 0,\
+        "obésité" INTEGER NOT NULL DEFAULT 0,"diabète" INTEGER NOT NULL DEFAULT 0,"dyslipidémies" INTEGER NOT NULL DEFAULT 0,\
+        "métabolique" INTEGER NOT NULL DEFAULT 0,"hypertension" INTEGER NOT NULL DEFAULT 0,"coronariennes" INTEGER NOT NULL DEFAULT 0,\
+        "artériopathie" INTEGER NOT NULL DEFAULT 0,"trouble cardiaque" INTEGER NOT NULL DEFAULT 0,"insuffisance cardiaque" INTEGER NOT NULL DEFAULT 0,\
+        "valvulopathies" INTEGER NOT NULL DEFAULT 0,"avc" INTEGER NOT NULL DEFAULT 0,"respiratoire" INTEGER NOT NULL DEFAULT 0,\
+        "mucoviscidose" INTEGER NOT NULL DEFAULT 0,"embolie" INTEGER NOT NULL DEFAULT 0,"cancer" INTEGER NOT NULL DEFAULT 0,\
+        "inflammatoire" INTEGER NOT NULL DEFAULT 0,"antidépresseur" INTEGER NOT NULL DEFAULT 0,"neuroleptique" INTEGER NOT NULL DEFAULT 0,\
+        "parkinson" INTEGER NOT NULL DEFAULT 0,"démence" INTEGER NOT NULL DEFAULT 0,PRIMARY KEY("id_individu" AUTOINCREMENT))')
+            colonnes = ["id_individu", "age", "sexe", "activité", "quintile", *habitudes, *maladies]
+            pop_cur.executemany("INSERT INTO population ({}) VALUES ({})".format(", ".join(f'"{colonne}"' for colonne in colonnes), ", ".join("?"*len(colonnes))),
+                                zip(range(1, nb_population + 1), age.tolist(), sexe, activite, quintile,
+                                    *(valeurs.tolist() for valeurs in habitudes.values()), *(valeurs.tolist() for valeurs in maladies.values())))
+            pop_db.commit()
 
         print("\033[92mPopulation générée !\033[0m")
 
-    def get_individu(self, id):
-        """Renvoie un individu à partir de son identifiant"""
-        return self.individus[id-1]
 
-    def get_nombre_vaccination(self, jour_vaccination):
-        """Renvoie le nombre de personnes à vacciner selon chaque vaccin en fonction du jour de vaccination"""
-        return data_cur.execute("SELECT vaccin, doses from doses_vaccination WHERE jour = ?", (jour_vaccination, )).fetchall()
-
-def ferme_bdd():
-    """Ferme les curseurs et les connexions aux bases de données"""
-    pop_cur.close()
-    pop_db.close()
-    data_cur.close()
-    data_db.close()
+def arrondi(valeur):
+    """Arrondit un nombre positif à l'entier le plus proche comme la fonction ROUND de SQLite"""
+    return int(valeur + 0.5)
 
 
 class Individu:
-    """Représente un individu et ses caractéristiques"""
+    """Représente un individu et ses caractéristiques
+
+    Les attributs sont déclarés dans __slots__ (pas de dictionnaire par objet), et les voisins sont des vues sur les tableaux
+    de la population."""
 
-    def __init__(self, id, age, sexe, activite, multiplicateur, liste_voisins):
+    __slots__ = ("id", "age", "sexe", "activite", "multiplicateur", "voisins_id", "voisins_poids",
+                 "sante", "infection", "sante_fin", "infection_fin", "vaccin_type", "vaccin_date", "infection_immunite_date")
+
+    def __init__(self, id, age, sexe, activite, multiplicateur, voisins_id, voisins_poids):
         # Caractéristiques de l'individu
         self.id = id
         self.age = age
         self.sexe = sexe
         self.activite = activite
         self.multiplicateur = multiplicateur
-        self.voisins = liste_voisins
+        self.voisins_id = voisins_id
+        self.voisins_poids = voisins_poids  # Poids de transmission 1/(1+distance)
 
         # Etat de santé et d'infection
         self.sante = NEUTRE
         self.infection = NEUTRE
-        self.sante_duree = None
-        self.infection_duree = None
+        # Jours de fin de l'infection et de l'hospitalisation en cours
+        self.sante_fin = None
+        self.infection_fin = None
 
         # Etat de vaccination
         self.vaccin_type = None
@@ -238,91 +286,51 @@ class Individu:
         # Etat d'immunité suite à une infection
         self.infection_immunite_date = None
 
-        self.cache_immunite = None
-        self.cache_immunite_date = 0
-
-    def infecter(self, duree):
-        """Infecte l'individu"""
+    def infecter(self, fin):
+        """Infecte l'individu jusqu'au jour fin"""
         self.sante = INFECTE
-        self.sante_duree = duree
+        self.sante_fin = fin
 
-    def hospitaliser(self, duree):
-        """Hospitalise d'individu"""
+    def hospitaliser(self, fin):
+        """Hospitalise d'individu jusqu'au jour fin"""
         self.sante = INFECTE
         self.infection = HOSPITALISE
-        self.sante_duree = None
-        self.infection_duree = duree
+        self.sante_fin = None
+        self.infection_fin = fin
 
     def guerir(self, jour):
         """Guérit l'individu suite à une infection"""
         self.sante = NEUTRE
-        self.sante_duree = None
+        self.sante_fin = None
         self.infection = NEUTRE
-        self.infection_duree = None
+        self.infection_fin = None
         self.infection_immunite_date = jour
-        self.cache_immunite = None
 
     def deces(self):
         """Rend l'individu décédé suite à une hospitalisation"""
         self.sante = DECEDE
-        self.sante_duree = None
-        self.infection_duree = None
+        self.sante_fin = None
+        self.infection_fin = None
 
     def vacciner(self, vaccin_type, jour):
         """Vaccine l'individu avec un vaccin spécifié"""
         self.vaccin_type = vaccin_type
         self.vaccin_date = jour
-        self.cache_immunite = None
-
-    def get_immunite(self, jour, type):
-        """Renvoie l'immunité de l'individu en fonction du type de risque"""
-
-        if self.cache_immunite is not None and jour - self.cache_immunite_date < 30:
-            return self.cache_immunite[type-1]
-
-        else:
-            self.cache_immunite = [1,1,1]
-            for type in [1,2,3]:
-                if type == INFECTION:
-                    self.cache_immunite[type-1] = 1
-                # Dans le cas d'une hospitalisation ou d'un décès, on se base sur le risque établi en fonction des caractéristiques de l'individu
-                elif type == HOSPITALISATION:
-                    self.cache_immunite[type-1] = self.multiplicateur[0]
-                elif type == DECES:
-                    self.cache_immunite[type-1] = self.multiplicateur[1]
-
-                # Immunité due au vaccin
-                if self.vaccin_type is not None:
-                    mois_vaccin = (jour - self.vaccin_date)/30.5
-                    # On récupère l'efficacité de la vaccination en fonction du vaccin et de la durée depuis la vaccination
-                    self.cache_immunite[type-1] *= (1-data_cur.execute("SELECT efficacite from vaccins WHERE vaccin = ? AND age_min <= ? AND age_max >= ? AND mois_min <= ? AND mois_max >= ? AND etat = ?",
-                    (self.vaccin_type, self.age, self.age, mois_vaccin, mois_vaccin, type)).fetchall()[0][0])
-                # Immunité due à une infection
-                elif self.infection_immunite_date is not None:
-                    mois_vaccin = (jour - self.infection_immunite_date)/30.5
-                    self.cache_immunite[type-1] *= (1-data_cur.execute("SELECT efficacite from vaccins WHERE vaccin = ? AND age_min <= ? AND age_max >= ? AND mois_min <= ? AND mois_max >= ? AND etat = ?",
-                    ("Infection", self.age, self.age, mois_vaccin, mois_vaccin, type)).fetchall()[0][0])
-            self.cache_immunite_date = jour
-            return self.cache_immunite[type-1]
-
-    def eligible_vaccin(self, vaccination_jour, strategie):
-        """Renvoie si l'individu est eligible à une dose de vaccination à la date donnée."""
-        # On boucle sur chaque élibibilité de la stratégie active (date qui dépasse la date d'application)
-        for clause in [strategie.dates_vaccination[x][1] for x in range(len(strategie.dates_vaccination)) if strategie.dates_vaccination[x][0] <= vaccination_jour]:
-            valide = True
-            if self.age <= 12:
-                valide = False
-            # Condition d'âge minimal
-            if "age" in clause and clause["comp"] == "sup" and self.age < clause["age"]:
-                valide = False
-            # Condition d'âge maximal
-            elif "age" in clause and clause["comp"] == "inf" and self.age > clause["age"]:
-                valide = False
-            # Condition d'activité dans un secteur professionnel précis
-            elif "emploi" in clause and self.activite != clause["emploi"]:
-                valide = False
-
-            # Si toutes les conditions sont remplies
-            if valide:
-                return True
-        return False
+
+    def get_immunite(self, jour, type, table_immunite):
+        """Renvoie l'immunité de l'individu en fonction du type de risque (table_immunite : efficacité des vaccins, TableImmunite)"""
+        if type == INFECTION:
+            immunite = 1
+        # Dans le cas d'une hospitalisation ou d'un décès, on se base sur le risque établi en fonction des caractéristiques de l'individu
+        elif type == HOSPITALISATION:
+            immunite = self.multiplicateur[0]
+        elif type == DECES:
+            immunite = self.multiplicateur[1]
+
+        # Immunité due au vaccin, en fonction du vaccin et de la durée depuis la vaccination
+        if self.vaccin_type is not None:
+            immunite *= 1 - table_immunite.efficacite_individu(table_immunite.index_vaccin[self.vaccin_type], self.age, jour - self.vaccin_date, type)
+        # Immunité due à une infection
+        elif self.infection_immunite_date is not None:
+            immunite *= 1 - table_immunite.efficacite_individu(table_immunite.index_vaccin["Infection"], self.age, jour - self.infection_immunite_date, type)
+        return immunite
@@ -2,21 +2,85 @@
 
 # Modules externes
 
-import random
-from dataclasses import dataclass
-from math import ceil
+import tempfile
+from dataclasses import dataclass, field, replace
+from math import ceil, log1p
 from time import time
 
 import numpy as np
-import plotly.graph_objects as graph
 
-# Module interne
+# Modules internes
+from aleatoire import TiragesGroupes, graines_independantes
+from compartiments import MoteurCompartiments
 from constantes import *
-
-
-def probabilite(base, multiplicateur):
-    """Renvoie vrai ou faux selon une probabilité de base et un multiplicateur"""
-    return base*multiplicateur >= random.random()
+from instrumentation import INACTIVE, Instrumentation
+from journal import INTERVALLE_IMAGES, JournalEtats
+from moteur import Calendrier, MoteurVectorise, categories
+from reprise import charger_point, chemin_point, dernier_point, enregistrer_point
+from resultats import afficher_courbes, afficher_repartition
+from tuiles import NB_TUILES, MoteurTuiles
+from vaccination import PlanVaccination
+
+
+def probabilite(base, multiplicateur, tirages):
+    """Renvoie vrai ou faux selon une probabilité de base et un multiplicateur (tirages : TiragesGroupes)"""
+    return base*multiplicateur >= tirages.uniforme()
+
+
+def saut(probabilite, tirages):
+    """Renvoie le nombre d'essais jusqu'au premier succès (loi géométrique) pour une probabilité de succès donnée"""
+    if probabilite >= 1:
+        return 1
+    return 1 + int(log1p(-tirages.uniforme())/log1p(-probabilite))
+
+
+def contaminer_voisins(individu, individus, infection_proba, jour, table_immunite, tirages, infecter):
+    """Contamine les voisins sains d'un individu (moteur par individus) : infecter(voisin) est appelée pour chaque voisin contaminé,
+    qui doit cesser d'être sain ; renvoie le nombre de voisins candidats et le nombre de candidats sains (immunité évaluée)
+
+    Les voisins candidats sont atteints par sauts géométriques selon la probabilité majorante infection_proba, puis infectés
+    avec la probabilité poids*immunité (un tirage par candidat, pas par voisin)."""
+    majorant = min(infection_proba, 1)
+    if majorant <= 0:
+        return 0, 0
+    candidats = sains = 0
+    position = saut(majorant, tirages) - 1
+    while position < len(individu.voisins_id):
+        candidats += 1
+        # voisins_id contient des indices dans la population (à partir de 0), pas des identifiants
+        voisin = individus[individu.voisins_id[position]]
+        if voisin.sante == NEUTRE:
+            sains += 1
+            if probabilite(infection_proba/majorant, individu.voisins_poids[position]*voisin.get_immunite(jour, INFECTION, table_immunite), tirages):
+                infecter(voisin)
+        position += saut(majorant, tirages)
+    return candidats, sains
+
+
+def stats_initiales(situation_init):
+    """Renvoie le dictionnaire des statistiques de la courbe finale au jour 0"""
+    return {
+        "total_infectes": [situation_init.nombre_infectes],
+        "total_hospitalises": [situation_init.nombre_hospitalises],
+        "total_decedes": [0],
+        "nouveaux_infectes": [0],
+        "nouveaux_hospitalises": [0],
+        "nouveaux_decedes": [0],
+        "nouveaux_gueris": [0],
+        "vaccines": [0]
+    }
+
+
+def ajouter_jour(stats, totaux, nouveaux):
+    """Ajoute aux statistiques celles d'un jour : totaux (infectés, hospitalisés, décédés, vaccinés) et nouveaux (infectés, hospitalisés, décédés, guéris)"""
+    stats["total_infectes"].append(totaux[0])
+    stats["total_hospitalises"].append(totaux[1])
+    stats["total_decedes"].append(totaux[2])
+    stats["vaccines"].append(totaux[3])
+    stats["nouveaux_infectes"].append(nouveaux[0])
+    stats["nouveaux_hospitalises"].append(nouveaux[1])
+    stats["nouveaux_decedes"].append(nouveaux[2])
+    stats["nouveaux_gueris"].append(nouveaux[3])
 
 
 @dataclass
@@ -32,6 +96,10 @@ class Strategie:
     # Population de référence pour les données de vaccination
     taille_population_vaccination: int = 67813396  # Source : Insee 2022
 
+    # Clauses de restriction des contacts (moteur vectorisé avec couches de contacts) qui incluent un jour de simulation et
+    # le multiplicateur du poids de chaque couche à partir de ce jour, par exemple (30, {"ecole": 0, "travail": 0.5})
+    contacts: list[tuple[int, dict]] = field(default_factory=list)
+
 
 @dataclass
 class SituationInitiale:
@@ -57,227 +125,399 @@ class Parametres:
     deces_proba: float = 0.2
 
 
-class Simulation:
+class SuiviSimulation:
+    """Boucle des jours et messages de suivi communs aux simulations (Simulation et SimulationRegions)
+
+    Les sous-classes définissent afficher (mode sans affichage), stats (voir stats_initiales) et param (Parametres)."""
+
+    def rapport(self, message):
+        """Affiche un message de suivi de la simulation (sauf en mode sans affichage)"""
+        if self.afficher:
+            print(message)
+
+    def rapport_jour(self, jour, totaux, temps_depart):
+        """Affiche le rapport d'un jour : totaux (infectés, hospitalisés, décédés, vaccinés) et temps écoulé depuis temps_depart"""
+        self.rapport(f"\033[KRapport du jour {jour} : Infectés : {totaux[0]}, Hospitalisés : {totaux[1]}, Décédés : {totaux[2]}, "
+                     f"Vaccinés : {totaux[3]}, Temps d'exécution : {round(time() - temps_depart)}s")
+
+    def rapport_fin(self, temps_depart):
+        """Affiche la fin de la simulation et sa durée"""
+        self.rapport(f"=== Fin de la simulation (en {round(time() - temps_depart)} secondes) ===")
+
+    def jours(self, jour_depart=0):
+        """Renvoie les jours à simuler après jour_depart jusqu'à la durée de la simulation, en s'arrêtant dès qu'il n'y a plus d'infectés"""
+        for jour in range(jour_depart + 1, self.param.simulation_duree + 1):
+            if self.stats["total_infectes"][-1] == 0:  # Condition d'arrêt de la simulation
+                return
+            yield jour
+
+
+class Simulation(SuiviSimulation):
     """Moteur de la simulation"""
 
-    def __init__(self, population, strategie, situation_init, parametres, nom):
+    def __init__(self, donnees, population, strategie, situation_init, parametres, nom, moteur="individus", graine=None, afficher=True, sorties=(),
+                 nb_processus=1, nb_tuiles=NB_TUILES, dossier_reprise=None, intervalle_reprise=50, point_reprise=None, nouvelle_graine=False,
+                 observateurs=(), dossier_journal=None, intervalle_images=INTERVALLE_IMAGES, couches=None, nb_individus_compartiments=None):
+        self.donnees = donnees  # Données de référence (DonneesReference)
         self.population = population
         self.strategie = strategie
         self.init = situation_init
         self.param = parametres
         self.nom = nom
 
+        # Moteur utilisé : "individus" (un objet Individu par personne), "vectorise" (état stocké dans des tableaux),
+        # "tuiles" (moteur vectorisé réparti par tuiles sur nb_processus processus) ou "compartiments" (effectifs de strates
+        # de la population, sans état individuel)
+        self.moteur = moteur
+        # Graine des flux aléatoires (entier ou numpy.random.SeedSequence, None pour une simulation non reproductible)
+        self.graine = graine
+        self.nb_processus = nb_processus
+        self.nb_tuiles = nb_tuiles
+        self.etat = None
+        # Couches du réseau de contacts (CouchesContacts, moteur vectorisé) à la place du seul voisinage géographique
+        self.couches = couches
+        # Nombre d'individus simulés : avec le moteur compartiments, la population ne sert qu'à former les strates et
+        # leurs effectifs peuvent être portés à nb_individus_compartiments (même répartition que la population)
+        self.nb_individus = population.nb_individus
+        if moteur == "compartiments" and nb_individus_compartiments is not None:
+            self.nb_individus = nb_individus_compartiments
+
+        # Mode sans affichage (calcul seul) et sorties qui reçoivent les statistiques de chaque jour (voir resultats.py)
+        self.afficher = afficher
+        self.sorties = list(sorties)
+
+        # Points de reprise (moteurs vectorisé et par tuiles) : enregistrés tous les intervalle_reprise jours et à la fin de la simulation
+        # dans dossier_reprise, et point_reprise (chemin d'un point enregistré) pour reprendre une simulation interrompue.
+        # Avec nouvelle_graine, la reprise continue avec un nouveau flux aléatoire issu de graine (branche d'une bifurcation)
+        self.dossier_reprise = dossier_reprise
+        self.intervalle_reprise = intervalle_reprise
+        self.point_reprise = point_reprise
+        self.nouvelle_graine = nouvelle_graine
+
+        # Journal des changements d'état de chaque jour (moteurs vectorisé et par tuiles) enregistré dans dossier_journal,
+        # avec une image complète de l'état tous les intervalle_images jours, pour rejouer la simulation (voir journal.py)
+        self.dossier_journal = dossier_journal
+        self.intervalle_images = intervalle_images
+
+        # Mesure du temps de chaque phase des jours et comptage des opérations, transmis aux observateurs (voir instrumentation.py)
+        self.instrumentation = Instrumentation(observateurs) if observateurs else INACTIVE
+
         # Dictionnaire des statistiques de la courbe finale
-        self.stats = {
-            "total_infectes": [self.init.nombre_infectes],
-            "total_hospitalises": [self.init.nombre_hospitalises],
-            "total_decedes": [0],
-            "nouveaux_infectes": [0],
-            "nouveaux_hospitalises": [0],
-            "nouveaux_decedes": [0],
-            "nouveaux_gueris": [0],
-            "vaccines": [0]
-        }
+        self.stats = stats_initiales(self.init)
 
         self.start_simulation()
 
+    @staticmethod
+    def bifurquer(donnees, population, strategie, situation_init, parametres, jour_bifurcation, branches, moteur="vectorise", graine=None,
+                  afficher=False, nb_processus=1, nb_tuiles=NB_TUILES):
+        """Simule une seule fois le début commun de plusieurs scénarios jusqu'au jour jour_bifurcation (avec la stratégie et
+        les paramètres donnés), puis chaque branche (nom, stratégie, paramètres) à partir de l'état atteint ce jour-là
+
+        Chaque branche continue avec son propre flux aléatoire. Renvoie la liste des simulations des branches."""
+        graines = graines_independantes(graine, len(branches) + 1)
+        with tempfile.TemporaryDirectory(prefix="bifurcation_") as dossier:
+            Simulation(donnees, population, strategie, situation_init, replace(parametres, simulation_duree=jour_bifurcation), "", moteur=moteur,
+                       graine=graines[0], afficher=False, nb_processus=nb_processus, nb_tuiles=nb_tuiles,
+                       dossier_reprise=dossier, intervalle_reprise=max(jour_bifurcation, 1))
+            point = dernier_point(dossier)
+            return [Simulation(donnees, population, strategie_branche, situation_init, parametres_branche, nom, moteur=moteur, graine=graine_branche,
+                               afficher=afficher, nb_processus=nb_processus, nb_tuiles=nb_tuiles, point_reprise=point, nouvelle_graine=True)
+                    for ((nom, strategie_branche, parametres_branche), graine_branche) in zip(branches, graines[1:])]
+
     def start_simulation(self):
+        """Lance la simulation avec le moteur choisi puis affiche les résultats"""
+        if self.couches is not None and self.moteur != "vectorise":
+            raise ValueError("Les couches de contacts ne sont disponibles qu'avec le moteur vectorise")
+        if self.moteur in ("individus", "compartiments"):
+            if self.dossier_reprise is not None or self.point_reprise is not None:
+                raise ValueError("Les points de reprise ne sont disponibles qu'avec les moteurs vectorise et tuiles")
+            if self.dossier_journal is not None:
+                raise ValueError("Le journal des changements d'état n'est disponible qu'avec les moteurs vectorise et tuiles")
+        if self.moteur in ("vectorise", "tuiles", "compartiments"):
+            self.simulation_vectorisee()
+        elif self.moteur == "individus":
+            self.ecrire_sorties()
+            self.simulation_individus()
+        else:
+            raise ValueError(f"Moteur de simulation inconnu : {self.moteur}")
+
+        for sortie in self.sorties:
+            sortie.fermer(self)
+        self.instrumentation.fermer()
+        if self.afficher:
+            self.afficher_resultats()
+
+    def ecrire_sorties(self, jour=None):
+        """Transmet les statistiques d'un jour (par défaut le dernier jour simulé) à chaque sortie"""
+        if jour is None:
+            jour = len(self.stats["total_infectes"]) - 1
+        if self.sorties:
+            ligne = {cle: valeurs[jour] for (cle, valeurs) in self.stats.items()}
+            for sortie in self.sorties:
+                sortie.ecrire(jour, ligne)
+
+    def ajouter_statistiques(self, totaux, nouveaux):
+        """Ajoute les statistiques d'un jour : totaux (infectés, hospitalisés, décédés, vaccinés) et nouveaux (infectés, hospitalisés, décédés, guéris)"""
+        ajouter_jour(self.stats, totaux, nouveaux)
+        self.ecrire_sorties()
+
+    def simulation_vectorisee(self):
+        """Simulation dont l'état de la population est stocké dans des tableaux et traité par lots"""
+        temps_depart = time()
+
+        if self.moteur == "tuiles":
+            moteur = MoteurTuiles(self.donnees, self.population, self.strategie, self.init, self.param, self.graine, self.nb_processus, self.nb_tuiles)
+        elif self.moteur == "compartiments":
+            moteur = MoteurCompartiments(self.donnees, self.population, self.strategie, self.init, self.param, np.random.default_rng(self.graine),
+                                         self.nb_individus)
+        else:
+            moteur = MoteurVectorise(self.donnees, self.population, self.strategie, self.init, self.param, np.random.default_rng(self.graine),
+                                     couches=self.couches)
+        moteur.instrumentation = self.instrumentation
+        journal = None if self.dossier_journal is None else JournalEtats(self.dossier_journal, self.population.population_position, self.intervalle_images)
+        try:
+            if self.point_reprise is None:
+                jour_depart = 0
+                moteur.initialiser()
+            else:
+                # Reprise d'une simulation interrompue : les sorties reçoivent aussi les jours déjà simulés
+                jour_depart, self.stats, tableaux, valeurs = charger_point(self.point_reprise)
+                moteur.restaurer(tableaux, valeurs)
+                if self.nouvelle_graine:
+                    moteur.ensemencer(self.graine)
+            for jour in range(jour_depart + 1):
+                self.ecrire_sorties(jour)
+            if journal is not None:
+                # Seuls les individus dont l'état change sont écrits chaque jour ; le premier jour est une image complète
+                moteur.suivre_modifications()
+                journal.ecrire(jour_depart, *moteur.modifications(), moteur.etat.codes)
+
+            self.rapport("=== Début de la simulation ===")
+
+            for jour in self.jours(jour_depart):
+                with self.instrumentation.jour(jour):
+                    nouveaux = moteur.jour(jour)
+                    totaux = moteur.totaux()
+                    with self.instrumentation.phase("rapport"):
+                        self.rapport_jour(jour, totaux, temps_depart)
+                    with self.instrumentation.phase("statistiques"):
+                        self.ajouter_statistiques(totaux, nouveaux)
+                    if journal is not None:
+                        with self.instrumentation.phase("journal"):
+                            journal.ecrire(jour, *moteur.modifications(), moteur.etat.codes)
+
+                    if self.dossier_reprise is not None and jour % self.intervalle_reprise == 0:
+                        with self.instrumentation.phase("reprise"):
+                            enregistrer_point(chemin_point(self.dossier_reprise, jour), jour, self.stats, *moteur.sauvegarde())
+
+            # Point de reprise du dernier jour simulé (arrêt faute d'infectés ou fin de la durée prévue)
+            jour_final = len(self.stats["total_infectes"]) - 1
+            if self.dossier_reprise is not None and (jour_final % self.intervalle_reprise != 0 or jour_final == jour_depart):
+                enregistrer_point(chemin_point(self.dossier_reprise, jour_final), jour_final, self.stats, *moteur.sauvegarde())
+        finally:
+            moteur.fermer()
+            if journal is not None:
+                journal.fermer()
+        self.etat = moteur.etat
+
+        self.rapport_fin(temps_depart)
+
+    def simulation_individus(self):
+        """Simulation où chaque individu est un objet Individu traité un par un"""
         temps_depart = time()
 
         # Initialisation des listes et variables
-        liste_infectes = []
-        liste_hospitalises = []
+        # Les infectés et hospitalisés sont des dictionnaires (ensembles ordonnés) pour être retirés en temps constant
+        liste_infectes = {}
+        liste_hospitalises = {}
+        liste_contagieux = {}  # Infectés non hospitalisés dont l'infection est en cours
         liste_decedes = []
         liste_vaccines = []
-        liste_non_vaccines = [
-            individu for individu in self.population.individus if individu.age >= 12]
+        # Les individus sont recréés sains : la population peut avoir servi à une simulation précédente (ensemble de répliques)
+        self.population.reinitialiser_individus()
+        individus = self.population.individus
+        table_immunite = self.donnees.immunite
+        plan_vaccination = PlanVaccination(self.strategie, self.population.age, self.population.activite)
         doses_a_distribuer = 0
 
+        # Flux aléatoires indépendants de l'évolution de l'état de santé (tirés un par un, générés par blocs) et de la vaccination
+        graine_sante, graine_vaccination = graines_independantes(self.graine, 2)
+        generateur = np.random.default_rng(graine_sante)
+        tirages = TiragesGroupes(generateur)
+        generateur_vaccination = np.random.default_rng(graine_vaccination)
+
+        # Calendriers des fins d'infection et d'hospitalisation : chaque jour, seuls les individus concernés sont traités
+        calendrier_infection = Calendrier()
+        calendrier_hopital = Calendrier()
+
         # Jour 0 : mise en place de la situation initiale
-        # Infectés
-        infectes_initialisation = random.sample(
-            self.population.individus, self.init.nombre_infectes)  # Sélection de l'échantillon
-        infectes_durees = np.random.normal(
+        # Infectés (contagieux à partir du jour 1)
+        infectes_initialisation = [individus[id] for id in generateur.choice(
+            len(individus), self.init.nombre_infectes, replace=False).tolist()]  # Sélection de l'échantillon
+        infectes_durees = generateur.normal(
             *self.param.infection_duree, self.init.nombre_infectes)  # Choix de la durée
         for id, individu in enumerate(infectes_initialisation):
-            individu.infecter(round(infectes_durees[id]))
-            liste_infectes.append(individu)
+            individu.infecter(1 + max(round(infectes_durees[id]), 0))
+            calendrier_infection.programmer(individu.sante_fin, individu)
+            liste_infectes[individu] = None
+            liste_contagieux[individu] = None
 
         # Hospitalisés
-        hospitalises_initialisation = random.sample(
-            self.population.individus, self.init.nombre_hospitalises)
-        hospitalises_durees = np.random.normal(
+        hospitalises_initialisation = [individus[id] for id in generateur.choice(
+            len(individus), self.init.nombre_hospitalises, replace=False).tolist()]
+        hospitalises_durees = generateur.normal(
             *self.param.hopital_duree, self.init.nombre_hospitalises)
         for id, individu in enumerate(hospitalises_initialisation):
-            individu.hospitaliser(round(hospitalises_durees[id]))
-            liste_hospitalises.append(individu)
-            if individu not in liste_infectes:
-                liste_infectes.append(individu)
+            individu.hospitaliser(1 + max(round(hospitalises_durees[id]), 0))
+            calendrier_hopital.programmer(individu.infection_fin, individu)
+            liste_hospitalises[individu] = None
+            liste_infectes[individu] = None
+            liste_contagieux.pop(individu, None)
 
-        print("=== Début de la simulation ===")
+        self.rapport("=== Début de la simulation ===")
 
         for jour in range(1, self.param.simulation_duree + 1):
             # Nouveau jour
             if len(liste_infectes) == 0:  # Condition d'arrêt de la simulation
                 break
 
-            # Initialisation des variables du jour
-            nouveaux_infectes = 0
-            nouveaux_hospitalises = 0
-            nouveaux_decedes = 0
-            nouveaux_gueris = 0
-
-            # Traitement des individus qui ont un état à durée limitée
-            # Individus hospitalisés
-            for individu in liste_hospitalises:
-                if individu.infection_duree == 0:
-                    # On décide si l'individu redevient sain, ou décède
-                    if probabilite(self.param.deces_proba, individu.get_immunite(jour, DECES)):
-                        individu.deces()
-                        liste_decedes.append(individu)
-                        nouveaux_decedes += 1
+            with self.instrumentation.jour(jour):
+                # Initialisation des variables du jour
+                nouveaux_infectes = 0
+                nouveaux_hospitalises = 0
+                nouveaux_decedes = 0
+                nouveaux_gueris = 0
+                tirages_debut = tirages.nombre
+
+                # Traitement des individus dont l'état se termine ce jour (les événements devenus caducs sont ignorés)
+                # Individus hospitalisés
+                with self.instrumentation.phase("hopital"):
+                    for individu in calendrier_hopital.extraire(jour):
+                        if individu.infection_fin != jour:
+                            continue
+                        # On décide si l'individu redevient sain, ou décède
+                        self.instrumentation.compter("immunite")
+                        if probabilite(self.param.deces_proba, individu.get_immunite(jour, DECES, table_immunite), tirages):
+                            individu.deces()
+                            liste_decedes.append(individu)
+                            nouveaux_decedes += 1
+                        else:
+                            individu.guerir(jour)
+                            nouveaux_gueris += 1
+                        del liste_infectes[individu]
+                        del liste_hospitalises[individu]
+
+                # Individus infectés, traités par vagues : les individus contaminés au cours du jour contaminent à leur tour
+                # leurs voisins le jour même, et ceux dont l'infection dure 0 jour sont traités immédiatement
+                vague = None
+                while True:
+                    with self.instrumentation.phase("fins_infection"):
+                        for individu in calendrier_infection.extraire(jour):
+                            if individu.sante_fin != jour:
+                                continue
+                            # On décide si l'individu redevient sain, ou est hospitalisé
+                            del liste_contagieux[individu]
+                            self.instrumentation.compter("immunite")
+                            if probabilite(self.param.hopital_proba, individu.get_immunite(jour, HOSPITALISATION, table_immunite), tirages):
+                                individu.hospitaliser(jour + 1 + max(round(tirages.normale(*self.param.hopital_duree)), 0))
+                                calendrier_hopital.programmer(individu.infection_fin, individu)
+                                liste_hospitalises[individu] = None
+                                nouveaux_hospitalises += 1
+                            else:
+                                individu.guerir(jour)
+                                del liste_infectes[individu]
+                                nouveaux_gueris += 1
+
+                    # Première vague : tous les contagieux du jour, puis les individus contaminés par la vague précédente
+                    if vague is None:
+                        vague = list(liste_contagieux)
                     else:
-                        individu.guerir(jour)
-                        nouveaux_gueris += 1
-                    liste_infectes.remove(individu)
-                    liste_hospitalises.remove(individu)
-                elif individu.infection_duree is not None:
-                    individu.infection_duree -= 1
-
-            # Individus infectés
-            for individu in liste_infectes:
-                if individu.sante_duree == 0:
-                    # On décide si l'individu redevient sain, ou est hospitalisé
-                    if probabilite(self.param.hopital_proba, individu.get_immunite(jour, HOSPITALISATION)):
-                        individu.hospitaliser( round(np.random.normal(*self.param.hopital_duree)))
-                        liste_hospitalises.append(individu)
-                        nouveaux_hospitalises += 1
-                    else:
-                        individu.guerir(jour)
-                        liste_infectes.remove(individu)
-                        nouveaux_gueris += 1
-
-                elif individu.sante_duree is not None:
-                    individu.sante_duree -= 1
-                    # Infection potentielle des voisins
-                    for (voisin_id, voisin_distance) in individu.voisins:
-                        voisin = self.population.get_individu(voisin_id)
-                        if voisin.sante == NEUTRE and probabilite(self.param.infection_proba, voisin.get_immunite(jour, INFECTION)/(1+voisin_distance)):
-                            # Infection du voisin
-                            voisin.infecter(round( np.random.normal(*self.param.infection_duree)))
-                            liste_infectes.append(voisin)
-                            nouveaux_infectes += 1
-
-            # Vaccination
-            if jour >= self.strategie.jour_debut_vaccination:
-                for (vaccin_type, nombre_doses) in self.population.get_nombre_vaccination(jour - self.strategie.jour_debut_vaccination+1):
-                    # Calcul du nombre de doses effective sur la taille de la population de la simulation
-                    doses_a_distribuer += round(nombre_doses * len(self.population.individus) / self.strategie.taille_population_vaccination)
-                    random.shuffle(liste_non_vaccines)
-                    for individu in liste_non_vaccines:
-                        if doses_a_distribuer <= 0:
-                            break
-                        if individu.sante == NEUTRE and individu.eligible_vaccin(jour - self.strategie.jour_debut_vaccination+1, self.strategie):
-                            # Vaccination de l'individu s'il est éligible
-                            liste_non_vaccines.remove(individu)
-                            liste_vaccines.append(individu)
-                            individu.vacciner(vaccin_type, jour)
-                            doses_a_distribuer -= 1
-
-            print(
-                f"\033[KRapport du jour {jour} : Infectés : {len(liste_infectes)}, Hospitalisés : {len(liste_hospitalises)}, Décédés : {len(liste_decedes)}, Vaccinés : {len(liste_vaccines)}, Temps d'éxécution : {round(time() - temps_depart)}s")
-
-            # Mise à jour des statistiques
-            self.stats["total_infectes"].append(len(liste_infectes))
-            self.stats["total_hospitalises"].append(len(liste_hospitalises))
-            self.stats["total_decedes"].append(len(liste_decedes))
-            self.stats["nouveaux_infectes"].append(nouveaux_infectes)
-            self.stats["nouveaux_hospitalises"].append(nouveaux_hospitalises)
-            self.stats["nouveaux_decedes"].append(nouveaux_decedes)
-            self.stats["nouveaux_gueris"].append(nouveaux_gueris)
-            self.stats["vaccines"].append(len(liste_vaccines))
-
-        print(
-            f"=== Fin de la simulation (en {round(time() - temps_depart)} secondes) ===")
-
-        self.afficher_resultats()
-
-    def get_couleur(self, individu):
-        """Renvoie la couleur d'affichage sur le graphique d'un individu"""
-        if individu.sante != NEUTRE:
-            return COULEUR[individu.sante]
-        elif individu.vaccin_date is not None:
-            return COULEUR["VACCINE"]
-        elif individu.infection_immunite_date is not None:
-            return COULEUR["IMMUNISE"]
-        else:
-            return COULEUR[individu.infection]
+                        vague = [individu for individu in vague if individu in liste_contagieux]
+                    if not vague:
+                        break
+
+                    with self.instrumentation.phase("contamination"):
+                        nouvelle_vague = []
+
+                        def infecter(voisin):
+                            """Infection d'un voisin"""
+                            voisin.infecter(jour + max(round(tirages.normale(*self.param.infection_duree)), 0))
+                            calendrier_infection.programmer(voisin.sante_fin, voisin)
+                            liste_infectes[voisin] = None
+                            liste_contagieux[voisin] = None
+                            nouvelle_vague.append(voisin)
+
+                        contacts = candidats = sains = 0
+                        if self.param.infection_proba > 0:
+                            for individu in vague:
+                                contacts += len(individu.voisins_id)
+                                # Infection potentielle des voisins
+                                candidats_individu, sains_individu = contaminer_voisins(individu, individus, self.param.infection_proba, jour,
+                                                                                        table_immunite, tirages, infecter)
+                                candidats += candidats_individu
+                                sains += sains_individu
+                        nouveaux_infectes += len(nouvelle_vague)
+                        vague = nouvelle_vague
+                        self.instrumentation.compter("contacts", contacts)
+                        self.instrumentation.compter("candidats", candidats)
+                        self.instrumentation.compter("immunite", sains)
+
+                # Vaccination
+                if jour >= self.strategie.jour_debut_vaccination:
+                    with self.instrumentation.phase("vaccination"):
+                        plan_vaccination.activer(jour - self.strategie.jour_debut_vaccination+1)
+                        for (vaccin_type, nombre_doses) in self.donnees.get_nombre_vaccination(jour - self.strategie.jour_debut_vaccination+1):
+                            # Calcul du nombre de doses effective sur la taille de la population de la simulation
+                            doses_a_distribuer += round(nombre_doses * len(individus) / self.strategie.taille_population_vaccination)
+                            if doses_a_distribuer <= 0:
+                                continue
+                            # Vaccination d'individus éligibles et sains tirés au hasard
+                            for id in plan_vaccination.tirer(doses_a_distribuer, lambda ids: np.array([individus[id].sante == NEUTRE for id in ids.tolist()], dtype=bool),
+                                                             generateur_vaccination).tolist():
+                                individus[id].vacciner(vaccin_type, jour)
+                                liste_vaccines.append(individus[id])
+                                doses_a_distribuer -= 1
+                                self.instrumentation.compter("vaccines")
+
+                # Tirages aléatoires de l'évolution de l'état de santé (comme le moteur vectorisé, sans ceux de la vaccination)
+                self.instrumentation.compter("tirages", tirages.nombre - tirages_debut)
+
+                with self.instrumentation.phase("rapport"):
+                    self.rapport_jour(jour, (len(liste_infectes), len(liste_hospitalises), len(liste_decedes), len(liste_vaccines)), temps_depart)
+
+                # Mise à jour des statistiques
+                with self.instrumentation.phase("statistiques"):
+                    self.ajouter_statistiques((len(liste_infectes), len(liste_hospitalises), len(liste_decedes), len(liste_vaccines)),
+                                              (nouveaux_infectes, nouveaux_hospitalises, nouveaux_decedes, nouveaux_gueris))
+
+        self.rapport_fin(temps_depart)
+
+    def categories(self):
+        """Renvoie la catégorie d'affichage de chaque individu (indice dans CATEGORIES) à la fin de la simulation"""
+        if self.etat is not None:
+            return self.etat.categories()
+        if self.moteur == "compartiments":
+            raise ValueError("Le moteur compartiments ne simule pas l'état de chaque individu")
+        individus = self.population.individus
+        return categories(np.fromiter((individu.sante for individu in individus), dtype=np.int8, count=len(individus)),
+                          np.fromiter((individu.infection_immunite_date is not None for individu in individus), dtype=bool, count=len(individus)),
+                          np.fromiter((individu.vaccin_date is not None for individu in individus), dtype=bool, count=len(individus)))
+
+    def enregistrer_repartition(self, chemin):
+        """Enregistre la répartition géographique des individus à la fin de la simulation sans navigateur
+        (image PNG de densité pour un chemin en .png, page HTML autonome sinon)"""
+        afficher_repartition(self.population.population_position, self.categories(), self.nom, chemin)
 
     def afficher_resultats(self):
         """Affiche les graphiques des résultats"""
 
-        # Abscisse des jours
-        jours_liste = list(np.arange(0, len(self.stats["total_infectes"])))
-
         # Calcul du nombre d'individus neutres chaque jour
-        self.stats["total_neutres"] = []
-        for jour in jours_liste:
-            self.stats["total_neutres"].append(len(
-                self.population.individus)-self.stats["total_infectes"][jour]-self.stats["total_decedes"][jour])
-
-        # Figure 1 : Répartition géographique des individus
-        figure = graph.Figure()
-
-        liste_couleur = np.array([self.get_couleur(individu)
-                                 for individu in self.population.individus])
-        figure.add_trace(
-            graph.Scattergl(x=self.population.population_position[:, 0], y=self.population.population_position[:, 1], mode='markers', marker=dict(color=liste_couleur[:, 0], line=dict(color=liste_couleur[:, 1]))))
-        figure.update_traces(hoverinfo="x+y", showlegend=False)
-        figure.update_layout(title_text=self.nom, title_font_color='#EF553B')
-        figure.show()
-
-        # Figure 2 : Courbes de l'état de santé des individus au cours du temps
-        figure = graph.Figure()
-
-        figure.add_trace(graph.Scatter(
-            x=jours_liste, y=self.stats["total_neutres"], mode='markers+lines', name="Total sains", legendgroup="totaux"))
-        figure.add_trace(graph.Scatter(
-            x=jours_liste, y=self.stats["total_infectes"], mode='markers+lines', name="Total infectés", legendgroup="totaux"))
-        figure.add_trace(graph.Scatter(
-            x=jours_liste, y=self.stats["total_hospitalises"], mode='markers+lines', name="Total hospitalisés", legendgroup="totaux"))
-        figure.add_trace(graph.Scatter(
-            x=jours_liste, y=self.stats["total_decedes"], mode='markers+lines', name="Total décédés", legendgroup="totaux"))
-        figure.add_trace(graph.Scatter(
-            x=jours_liste, y=self.stats["vaccines"], mode='markers+lines', name="Vaccinés", legendgroup="totaux"))
-
-        figure.update_xaxes(title_text="Jours de simulation")
-        figure.update_yaxes(title_text="Nombre d'individus")
-        figure.update_layout(hovermode="x", title_text=self.nom, title_font_color='#EF553B')
-        figure.update_traces(
-            hoverinfo="name+x+y",
-            line={"width": 1.3},
-            marker={"size": 4},
-            mode="lines+markers")
-        figure.show()
-
-        # Figure 3 : Courbes des nouveaux états de santé au cours du temps
-        figure = graph.Figure()
-
-        figure.add_trace(graph.Scatter(
-            x=jours_liste, y=self.stats["nouveaux_gueris"], mode='markers+lines', name="Nouveaux guéris", legendgroup="journalier"))
-        figure.add_trace(graph.Scatter(
-            x=jours_liste, y=self.stats["nouveaux_infectes"], mode='markers+lines', name="Nouveaux infectés", legendgroup="journalier"))
-        figure.add_trace(graph.Scatter(
-            x=jours_liste, y=self.stats["nouveaux_hospitalises"], mode='markers+lines', name="Nouveaux hospitalisés", legendgroup="journalier"))
-        figure.add_trace(graph.Scatter(
-            x=jours_liste, y=self.stats["nouveaux_decedes"], mode='markers+lines', name="Nouveaux décédés", legendgroup="journalier"))
-
-        figure.update_xaxes(title_text="Jours de simulation")
-        figure.update_yaxes(title_text="Nombre d'individus")
-        figure.update_layout(hovermode="x", title_text=self.nom, title_font_color='#EF553B')
-        figure.update_traces(
-            hoverinfo="name+x+y",
-            line={"width": 1.3},
-            marker={"size": 4},
-            mode="lines+markers")
-        figure.show()
+        self.stats["total_neutres"] = [self.nb_individus-infectes-decedes
+                                       for (infectes, decedes) in zip(self.stats["total_infectes"], self.stats["total_decedes"])]
+
+        # Figure 1 : Répartition géographique des individus (image de densité pour les grandes populations), sauf sans état individuel
+        if self.moteur != "compartiments":
+            afficher_repartition(self.population.population_position, self.categories(), self.nom)
+
+        # Figures 2 et 3 : Courbes des totaux et des nouveaux états de santé au cours du temps
+        afficher_courbes(self.stats, self.nb_individus, self.nom)
@@ -0,0 +1,195 @@
+"""Population découpée en régions (une population par région) simulées par plusieurs processus, couplées par la mobilité entre régions"""
+
+# Modules externes
+import multiprocessing
+import os
+from dataclasses import dataclass, replace
+from time import time
+
+import numpy as np
+import scipy.sparse as sparse
+
+# Modules internes
+from aleatoire import graines_independantes
+from moteur import MoteurVectorise
+from population import Population
+from propagation import SuiviSimulation, ajouter_jour, stats_initiales
+from resultats import afficher_courbes, afficher_repartition
+
+
+@dataclass
+class Region:
+    """Représente une région : sa population (nombre d'individus, dispersion des positions, rayon des voisins), la position
+    de son centre (affichage et mobilité) et le dossier de l'instantané de sa population une fois générée"""
+    nom: str
+    nb_individus: int
+    variance_pop: float
+    max_distance: float
+    centre: tuple[float, float] = (0, 0)
+    instantane: str = None
+
+
+def creer_regions(donnees, regions, dossier, graine=None, regenere=False):
+    """Génère la population de chaque région (base de données et instantané dans dossier/nom de la région) et renvoie
+    les régions complétées du dossier de leur instantané ; les populations déjà générées sont rechargées"""
+    resultat = []
+    for (region, graine_region) in zip(regions, graines_independantes(graine, len(regions))):
+        dossier_region = os.path.join(dossier, region.nom)
+        os.makedirs(dossier_region, exist_ok=True)
+        chemin = os.path.join(dossier_region, "population.db")
+        population = Population(donnees, region.nb_individus, region.variance_pop, region.max_distance, regenere or not os.path.exists(chemin),
+                                os.path.join(dossier_region, "instantane"), graine_region, chemin)
+        resultat.append(replace(region, instantane=population.instantane))
+    return resultat
+
+
+def mobilite_gravite(regions, portee, contacts_exterieurs=1.0, seuil=0.01):
+    """Renvoie la matrice creuse (CSR) de mobilité selon un modèle de gravité : mobilite[r, s] est le nombre moyen de contacts
+    quotidiens d'un habitant de la région r avec des habitants de la région s
+
+    Les contacts de chaque région avec les autres sont répartis proportionnellement à leur population et à exp(-distance/portee),
+    pour un total de contacts_exterieurs par habitant ; les couplages inférieurs à seuil*contacts_exterieurs sont négligés."""
+    centres = np.array([region.centre for region in regions], dtype=np.float64)
+    tailles = np.array([region.nb_individus for region in regions], dtype=np.float64)
+    distances = np.hypot(*(centres[:, None, :] - centres[None, :, :]).transpose(2, 0, 1))
+    couplages = tailles[None, :]*np.exp(-distances/portee)
+    np.fill_diagonal(couplages, 0)
+    couplages *= contacts_exterieurs/np.maximum(couplages.sum(axis=1, keepdims=True), 1e-300)
+    couplages[couplages < seuil*contacts_exterieurs] = 0
+    return sparse.csr_array(couplages)
+
+
+def pressions_regions(mobilite, contagieux, tailles, infection_proba):
+    """Renvoie la probabilité d'infection d'un habitant sain de chaque région par ses contacts avec les autres régions,
+    à partir du nombre de contagieux de chaque région (seule information échangée entre les régions chaque jour)"""
+    prevalence = np.asarray(contagieux, dtype=np.float64)/np.asarray(tailles, dtype=np.float64)
+    return (-np.expm1(-infection_proba*(mobilite @ prevalence))).tolist()
+
+
+def processus_regions(connexion, donnees, strategie, parametres, regions):
+    """Boucle d'un processus de calcul : simule chacune de ses régions (numéro, instantané, situation initiale, graine)
+    avec un moteur vectorisé, en recevant chaque jour la pression d'infection venue des autres régions"""
+    moteurs = {}
+    for (numero, instantane, situation_init, graine) in regions:
+        population = Population.depuis_instantane(donnees, instantane)
+        moteurs[numero] = MoteurVectorise(donnees, population, strategie, situation_init, parametres, np.random.default_rng(graine))
+
+    while True:
+        commande, *arguments = connexion.recv()
+
+        if commande == "initialiser":
+            for moteur in moteurs.values():
+                moteur.initialiser()
+            connexion.send({numero: (moteur.totaux(), moteur.nb_infectes - moteur.nb_hospitalises) for (numero, moteur) in moteurs.items()})
+
+        elif commande == "jour":
+            # Jour de simulation de chaque région, après les contaminations par les autres régions
+            (jour, pressions) = arguments
+            resultats = {}
+            for (numero, moteur) in moteurs.items():
+                moteur.pression_exterieure = pressions[numero]
+                nouveaux = moteur.jour(jour)
+                resultats[numero] = (nouveaux, moteur.totaux(), moteur.nb_infectes - moteur.nb_hospitalises)
+            connexion.send(resultats)
+
+        elif commande == "categories":
+            connexion.send({numero: moteur.etat.categories() for (numero, moteur) in moteurs.items()})
+
+        elif commande == "fin":
+            break
+
+    connexion.close()
+
+
+class SimulationRegions(SuiviSimulation):
+    """Simulation d'une population découpée en régions
+
+    Chaque région est une population distincte (positions, voisins, caractéristiques) simulée par un moteur vectorisé avec
+    son propre générateur aléatoire, dans un des nb_processus processus (répartition à tour de rôle). Chaque jour, les régions
+    n'échangent que leur nombre de contagieux : la matrice de mobilité en déduit la pression d'infection venue des autres
+    régions, appliquée aux habitants sains de chaque région. Les résultats ne dépendent pas du nombre de processus.
+
+    stats contient les statistiques nationales (mêmes clés que Simulation), stats_regions celles de chaque région."""
+
+    def __init__(self, donnees, regions, strategie, situations_init, parametres, mobilite, nom="", graine=None, nb_processus=1, afficher=True):
+        self.donnees = donnees
+        self.regions = regions  # Régions dont la population a été générée (voir creer_regions)
+        self.strategie = strategie
+        self.init = situations_init  # Situation initiale de chaque région
+        self.param = parametres
+        self.mobilite = sparse.csr_array(mobilite)
+        self.nom = nom
+        self.graine = graine
+        self.nb_processus = min(nb_processus, len(regions))
+        self.afficher = afficher
+
+        self.stats_regions = [stats_initiales(situation_init) for situation_init in situations_init]
+        self.stats = stats_initiales(replace(situations_init[0], nombre_infectes=sum(situation.nombre_infectes for situation in situations_init),
+                                             nombre_hospitalises=sum(situation.nombre_hospitalises for situation in situations_init)))
+        self.categories = None  # Catégorie d'affichage de chaque individu de chaque région à la fin de la simulation
+
+        self.start_simulation()
+
+    def executer(self, commande, *arguments, par_region=None):
+        """Envoie une commande à tous les processus et renvoie les réponses de toutes les régions (numéro -> réponse)
+
+        par_region (liste des valeurs de chaque région) est découpée pour n'envoyer à chaque processus que les valeurs de ses régions."""
+        for (rang, connexion) in enumerate(self.connexions):
+            if par_region is None:
+                connexion.send((commande, *arguments))
+            else:
+                connexion.send((commande, *arguments, {numero: par_region[numero] for numero in range(rang, len(self.regions), len(self.connexions))}))
+        reponses = {}
+        for connexion in self.connexions:
+            reponses.update(connexion.recv())
+        return reponses
+
+    def start_simulation(self):
+        """Lance les processus de calcul, simule tous les jours puis affiche les résultats"""
+        temps_depart = time()
+        graines = graines_independantes(self.graine, len(self.regions))
+        contexte = multiprocessing.get_context("spawn")
+        self.connexions = []
+        processus = []
+        for rang in range(self.nb_processus):
+            connexion, connexion_processus = contexte.Pipe()
+            processus.append(contexte.Process(target=processus_regions, daemon=True, args=(
+                connexion_processus, self.donnees, self.strategie, self.param,
+                [(numero, self.regions[numero].instantane, self.init[numero], graines[numero]) for numero in range(rang, len(self.regions), self.nb_processus)])))
+            processus[-1].start()
+            self.connexions.append(connexion)
+
+        try:
+            tailles = [region.nb_individus for region in self.regions]
+            contagieux = [contagieux_region for (numero, (totaux, contagieux_region)) in sorted(self.executer("initialiser").items())]
+            self.rapport("=== Début de la simulation ===")
+
+            for jour in self.jours():
+                pressions = pressions_regions(self.mobilite, contagieux, tailles, self.param.infection_proba)
+                reponses = self.executer("jour", jour, par_region=pressions)
+                for (numero, (nouveaux, totaux, contagieux_region)) in reponses.items():
+                    ajouter_jour(self.stats_regions[numero], totaux, nouveaux)
+                    contagieux[numero] = contagieux_region
+                totaux = np.sum([reponse[1] for reponse in reponses.values()], axis=0).tolist()
+                ajouter_jour(self.stats, totaux, np.sum([reponse[0] for reponse in reponses.values()], axis=0).tolist())
+                self.rapport_jour(jour, totaux, temps_depart)
+
+            if self.afficher:
+                reponses = self.executer("categories")
+                self.categories = [reponses[numero] for numero in range(len(self.regions))]
+        finally:
+            for connexion in self.connexions:
+                connexion.send(("fin",))
+            for processus_region in processus:
+                processus_region.join()
+
+        self.rapport_fin(temps_depart)
+        if self.afficher:
+            self.afficher_resultats()
+
+    def afficher_resultats(self):
+        """Affiche la répartition géographique de toutes les régions (chacune autour de son centre) et les courbes nationales"""
+        positions = np.concatenate([np.load(os.path.join(region.instantane, "population_position.npy"), mmap_mode="r").astype(np.float32)
+                                    + np.array(region.centre, dtype=np.float32) for region in self.regions])
+        afficher_repartition(positions, np.concatenate(self.categories), self.nom)
+        afficher_courbes(self.stats, sum(region.nb_individus for region in self.regions), self.nom)
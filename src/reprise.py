@@ -0,0 +1,37 @@
+"""Points de reprise : enregistrement de l'état complet d'une simulation en cours, pour la reprendre plus tard"""
+
+# Modules externes
+import json
+import os
+
+import numpy as np
+
+
+def chemin_point(dossier, jour):
+    """Renvoie le chemin du point de reprise d'un jour dans un dossier"""
+    return os.path.join(dossier, f"jour_{jour:04d}.npz")
+
+
+def enregistrer_point(chemin, jour, stats, tableaux, valeurs):
+    """Enregistre l'état d'une simulation à la fin d'un jour : statistiques, tableaux numpy et valeurs simples (JSON) du moteur
+
+    Le fichier est écrit sous un nom temporaire puis renommé : un point de reprise interrompu n'écrase pas le précédent."""
+    os.makedirs(os.path.dirname(chemin) or ".", exist_ok=True)
+    valeurs = json.dumps({"jour": jour, "stats": stats, "moteur": valeurs}, default=int)
+    with open(chemin + ".tmp", "wb") as fichier:
+        np.savez(fichier, valeurs=np.array(valeurs), **tableaux)
+    os.replace(chemin + ".tmp", chemin)
+
+
+def charger_point(chemin):
+    """Renvoie le jour, les statistiques, les tableaux et les valeurs du moteur enregistrés dans un point de reprise"""
+    with np.load(chemin) as fichier:
+        valeurs = json.loads(str(fichier["valeurs"]))
+        tableaux = {nom: fichier[nom] for nom in fichier.files if nom != "valeurs"}
+    return valeurs["jour"], valeurs["stats"], tableaux, valeurs["moteur"]
+
+
+def dernier_point(dossier):
+    """Renvoie le chemin du point de reprise le plus récent d'un dossier (None s'il n'y en a aucun)"""
+    points = sorted(nom for nom in os.listdir(dossier) if nom.startswith("jour_") and nom.endswith(".npz")) if os.path.isdir(dossier) else []
+    return os.path.join(dossier, points[-1]) if points else None
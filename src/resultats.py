@@ -0,0 +1,288 @@
+"""Enregistrement et affichage des résultats de la simulation"""
+
+# Modules externes
+import base64
+import csv
+import struct
+import zlib
+
+import numpy as np
+import plotly.graph_objects as graph
+
+# Modules internes
+from constantes import CATEGORIES, COULEUR, LIBELE
+
+# Nombre d'individus au-delà duquel la répartition géographique est affichée sous forme d'image de densité
+SEUIL_POINTS = 200000
+
+# Résolution (largeur, hauteur en pixels) de l'image de densité et nombre de points superposés à l'image
+RESOLUTION = (800, 800)
+NB_POINTS_ECHANTILLON = 20000
+
+# Nombre d'individus traités à la fois lors du calcul de l'image de densité (limite la taille des tableaux intermédiaires)
+TAILLE_BLOC_IMAGE = 1 << 22
+
+
+class SortieCSV:
+    """Écrit les statistiques de chaque jour dans un fichier CSV au fur et à mesure de la simulation"""
+
+    def __init__(self, chemin):
+        self.fichier = open(chemin, "w", newline="", encoding="utf-8")
+        self.ecrivain = None
+
+    def ecrire(self, jour, ligne):
+        """Ajoute les statistiques d'un jour"""
+        if self.ecrivain is None:
+            self.ecrivain = csv.writer(self.fichier)
+            self.ecrivain.writerow(["jour", *ligne])
+        self.ecrivain.writerow([jour, *ligne.values()])
+        self.fichier.flush()
+
+    def fermer(self, simulation):
+        """Termine l'écriture à la fin de la simulation"""
+        self.fichier.close()
+
+
+class SortieNPZ:
+    """Enregistre les statistiques de tous les jours dans un fichier numpy compressé à la fin de la simulation"""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.cles = []
+        self.lignes = []
+
+    def ecrire(self, jour, ligne):
+        """Ajoute les statistiques d'un jour"""
+        self.cles = list(ligne)
+        self.lignes.append(list(ligne.values()))
+
+    def fermer(self, simulation):
+        """Écrit le fichier à la fin de la simulation"""
+        valeurs = np.array(self.lignes, dtype=np.int64)
+        np.savez_compressed(self.chemin, nb_individus=simulation.nb_individus,
+                            **{cle: valeurs[:, id] for (id, cle) in enumerate(self.cles)})
+
+
+class SortieFonction:
+    """Transmet les statistiques de chaque jour à une fonction fonction(jour, ligne)"""
+
+    def __init__(self, fonction):
+        self.fonction = fonction
+
+    def ecrire(self, jour, ligne):
+        """Transmet les statistiques d'un jour"""
+        self.fonction(jour, ligne)
+
+    def fermer(self, simulation):
+        """Rien à faire à la fin de la simulation"""
+
+
+def charger_stats(chemin):
+    """Renvoie les statistiques (dictionnaire de listes) enregistrées par une sortie CSV ou NPZ"""
+    if chemin.endswith(".npz"):
+        with np.load(chemin) as fichier:
+            return {cle: fichier[cle].tolist() for cle in fichier.files if cle != "nb_individus"}
+    with open(chemin, newline="", encoding="utf-8") as fichier:
+        lignes = list(csv.DictReader(fichier))
+    return {cle: [int(ligne[cle]) for ligne in lignes] for cle in lignes[0] if cle != "jour"}
+
+
+def afficher_repartition(positions, categories, nom, chemin=None):
+    """Affiche la répartition géographique des individus colorés selon leur catégorie (voir CATEGORIES), ou l'enregistre
+    dans un fichier sans navigateur (image PNG de densité pour un chemin en .png, page HTML autonome sinon)
+
+    Au-delà de SEUIL_POINTS individus, la figure est une image de densité par catégorie complétée d'un échantillon de points."""
+    if chemin is not None and chemin.endswith(".png"):
+        enregistrer_png(chemin, image_categories(raster_categories(positions, categories)[0]))
+        return
+    if len(categories) > SEUIL_POINTS:
+        figure = figure_densite(positions, categories, nom)
+    else:
+        figure = figure_repartition(positions, categories, nom)
+    if chemin is None:
+        figure.show()
+    else:
+        figure.write_html(chemin, include_plotlyjs=True)
+
+
+def couleurs_categories(indice=0):
+    """Renvoie les couleurs (0 : remplissage, 1 : contour) de chaque catégorie en composantes RVB"""
+    return np.array([[int(COULEUR[categorie][indice][position:position + 2], 16) for position in (1, 3, 5)] for categorie in CATEGORIES],
+                    dtype=np.float64)
+
+
+def figure_repartition(positions, categories, nom):
+    """Renvoie la figure de la répartition géographique des individus colorés selon leur catégorie (un point par individu)"""
+    # Les positions sont stockées sur 16 bits, que la sérialisation de plotly ne prend pas en charge
+    positions = np.asarray(positions, dtype=np.float32)
+    liste_couleur = np.array([COULEUR[categorie] for categorie in CATEGORIES], dtype=object)[categories]
+    figure = graph.Figure()
+
+    figure.add_trace(
+        graph.Scattergl(x=positions[:, 0], y=positions[:, 1], mode='markers', marker=dict(color=liste_couleur[:, 0], line=dict(color=liste_couleur[:, 1]))))
+    figure.update_traces(hoverinfo="x+y", showlegend=False)
+    figure.update_layout(title_text=nom, title_font_color='#EF553B')
+    return figure
+
+
+def raster_categories(positions, categories, resolution=RESOLUTION, etendue=None):
+    """Renvoie le nombre d'individus de chaque catégorie dans chaque pixel (tableau catégorie x hauteur x largeur, la première ligne
+    est le haut de l'image) et l'étendue ((x min, x max), (y min, y max)) couverte par l'image (par défaut celle des positions)"""
+    largeur, hauteur = resolution
+    if etendue is None:
+        minimums = np.asarray(positions.min(axis=0), dtype=np.float64)
+        maximums = np.asarray(positions.max(axis=0), dtype=np.float64)
+        etendue = tuple(zip(minimums.tolist(), np.maximum(maximums, minimums + 1e-9).tolist()))
+    (x_min, x_max), (y_min, y_max) = etendue
+
+    comptes = np.zeros(len(CATEGORIES)*hauteur*largeur, dtype=np.int64)
+    for debut in range(0, len(categories), TAILLE_BLOC_IMAGE):
+        bloc = slice(debut, debut + TAILLE_BLOC_IMAGE)
+        x = np.asarray(positions[bloc, 0], dtype=np.float64)
+        y = np.asarray(positions[bloc, 1], dtype=np.float64)
+        colonnes = np.clip(((x - x_min)*(largeur/(x_max - x_min))).astype(np.intp), 0, largeur - 1)
+        lignes = np.clip(((y_max - y)*(hauteur/(y_max - y_min))).astype(np.intp), 0, hauteur - 1)
+        pixels = (categories[bloc].astype(np.intp)*hauteur + lignes)*largeur + colonnes
+        comptes += np.bincount(pixels, minlength=len(comptes))
+    return comptes.reshape(len(CATEGORIES), hauteur, largeur), etendue
+
+
+def image_categories(comptes, fond=255):
+    """Renvoie l'image RVB (hauteur x largeur x 3, octets) de densité calculée à partir des comptes de raster_categories
+
+    La teinte d'un pixel est la moyenne des couleurs des catégories pondérée par leurs comptes, et son opacité croît avec
+    le logarithme du nombre d'individus du pixel (les pixels vides ont la couleur du fond)."""
+    totaux = comptes.sum(axis=0)
+    teintes = np.einsum("chw,cr->hwr", comptes, couleurs_categories())/np.maximum(totaux, 1)[:, :, None]
+    opacites = np.log1p(totaux)/max(np.log1p(totaux.max()), 1e-9)
+    # Opacité minimale d'un pixel occupé, pour que les individus isolés restent visibles
+    opacites = np.where(totaux > 0, 0.25 + 0.75*opacites, 0)[:, :, None]
+    return np.round(opacites*teintes + (1 - opacites)*fond).astype(np.uint8)
+
+
+def sous_echantillon_stratifie(categories, nb_points, graine=None):
+    """Renvoie les indices (triés) d'au plus nb_points individus tirés sans remise dans chaque catégorie
+
+    Chaque catégorie présente reçoit au moins une part égale de nb_points/(2 x nombre de catégories) individus, et le reste est
+    réparti proportionnellement à sa taille : les catégories rares (décédés par exemple) restent visibles."""
+    generateur = np.random.default_rng(graine)
+    effectifs = np.bincount(categories, minlength=len(CATEGORIES))
+    if effectifs.sum() <= nb_points:
+        return np.arange(len(categories))
+    presentes = np.count_nonzero(effectifs)
+    quotas = np.minimum(effectifs, nb_points//(2*presentes) + (nb_points//2)*effectifs//effectifs.sum())
+    ordre = np.argsort(categories, kind="stable")
+    debuts = np.concatenate(([0], np.cumsum(effectifs)[:-1]))
+    indices = [ordre[debut + generateur.choice(effectif, quota, replace=False)]
+               for (debut, effectif, quota) in zip(debuts, effectifs, quotas) if quota > 0]
+    return np.sort(np.concatenate(indices))
+
+
+def figure_densite(positions, categories, nom, resolution=RESOLUTION, nb_points=NB_POINTS_ECHANTILLON, graine=0):
+    """Renvoie la figure de la répartition géographique sous forme d'image de densité par catégorie (taille indépendante
+    du nombre d'individus), complétée d'un échantillon stratifié de nb_points individus (aucun pour nb_points = 0)"""
+    comptes, ((x_min, x_max), (y_min, y_max)) = raster_categories(positions, categories, resolution)
+    largeur, hauteur = resolution
+    figure = graph.Figure()
+
+    # L'image est transmise au format PNG (bien plus compact qu'une liste de pixels) ; sa première ligne est placée en y0 :
+    # les lignes sont inversées pour que le bas de l'image soit y min
+    source = "data:image/png;base64," + base64.b64encode(png(image_categories(comptes)[::-1])).decode()
+    figure.add_trace(graph.Image(source=source, x0=x_min + (x_max - x_min)/(2*largeur), dx=(x_max - x_min)/largeur,
+                                 y0=y_min + (y_max - y_min)/(2*hauteur), dy=(y_max - y_min)/hauteur, hoverinfo="skip"))
+    if nb_points > 0:
+        echantillon = sous_echantillon_stratifie(categories, nb_points, graine)
+        positions_echantillon = np.asarray(positions[echantillon], dtype=np.float32)
+        for (code, categorie) in enumerate(CATEGORIES):
+            choix = categories[echantillon] == code
+            if choix.any():
+                figure.add_trace(graph.Scattergl(x=positions_echantillon[choix, 0], y=positions_echantillon[choix, 1], mode='markers',
+                                                 name=LIBELE[categorie], hoverinfo="x+y",
+                                                 marker=dict(size=3, color=COULEUR[categorie][0], line=dict(color=COULEUR[categorie][1]))))
+    # L'axe des ordonnées d'une image est inversé par défaut (origine en haut)
+    figure.update_yaxes(autorange=True, scaleanchor="x")
+    figure.update_layout(title_text=nom, title_font_color='#EF553B')
+    return figure
+
+
+def png(image):
+    """Renvoie le contenu du fichier PNG d'une image RVB (hauteur x largeur x 3, octets)"""
+    hauteur, largeur, _ = image.shape
+    # Chaque ligne est précédée du type de filtre (0 : aucun)
+    lignes = np.concatenate((np.zeros((hauteur, 1), dtype=np.uint8), image.reshape(hauteur, 3*largeur)), axis=1)
+
+    def bloc(type_bloc, contenu):
+        return struct.pack(">I", len(contenu)) + type_bloc + contenu + struct.pack(">I", zlib.crc32(type_bloc + contenu))
+
+    return (b"\x89PNG\r\n\x1a\n" + bloc(b"IHDR", struct.pack(">IIBBBBB", largeur, hauteur, 8, 2, 0, 0, 0))
+            + bloc(b"IDAT", zlib.compress(np.ascontiguousarray(lignes).tobytes(), 6)) + bloc(b"IEND", b""))
+
+
+def enregistrer_png(chemin, image):
+    """Enregistre une image RVB (hauteur x largeur x 3, octets) au format PNG"""
+    with open(chemin, "wb") as fichier:
+        fichier.write(png(image))
+
+
+def afficher_courbes(stats, nb_individus, nom):
+    """Affiche les courbes des totaux et des nouveaux états de santé au cours du temps"""
+
+    # Abscisse des jours
+    jours_liste = list(np.arange(0, len(stats["total_infectes"])))
+
+    # Calcul du nombre d'individus neutres chaque jour
+    total_neutres = [nb_individus-stats["total_infectes"][jour]-stats["total_decedes"][jour] for jour in jours_liste]
+
+    # Figure 1 : Courbes de l'état de santé des individus au cours du temps
+    figure = graph.Figure()
+
+    figure.add_trace(graph.Scatter(
+        x=jours_liste, y=total_neutres, mode='markers+lines', name="Total sains", legendgroup="totaux"))
+    figure.add_trace(graph.Scatter(
+        x=jours_liste, y=stats["total_infectes"], mode='markers+lines', name="Total infectés", legendgroup="totaux"))
+    figure.add_trace(graph.Scatter(
+        x=jours_liste, y=stats["total_hospitalises"], mode='markers+lines', name="Total hospitalisés", legendgroup="totaux"))
+    figure.add_trace(graph.Scatter(
+        x=jours_liste, y=stats["total_decedes"], mode='markers+lines', name="Total décédés", legendgroup="totaux"))
+    figure.add_trace(graph.Scatter(
+        x=jours_liste, y=stats["vaccines"], mode='markers+lines', name="Vaccinés", legendgroup="totaux"))
+
+    figure.update_xaxes(title_text="Jours de simulation")
+    figure.update_yaxes(title_text="Nombre d'individus")
+    figure.update_layout(hovermode="x", title_text=nom, title_font_color='#EF553B')
+    figure.update_traces(
+        hoverinfo="name+x+y",
+        line={"width": 1.3},
+        marker={"size": 4},
+        mode="lines+markers")
+    figure.show()
+
+    # Figure 2 : Courbes des nouveaux états de santé au cours du temps
+    figure = graph.Figure()
+
+    figure.add_trace(graph.Scatter(
+        x=jours_liste, y=stats["nouveaux_gueris"], mode='markers+lines', name="Nouveaux guéris", legendgroup="journalier"))
+    figure.add_trace(graph.Scatter(
+        x=jours_liste, y=stats["nouveaux_infectes"], mode='markers+lines', name="Nouveaux infectés", legendgroup="journalier"))
+    figure.add_trace(graph.Scatter(
+        x=jours_liste, y=stats["nouveaux_hospitalises"], mode='markers+lines', name="Nouveaux hospitalisés", legendgroup="journalier"))
+    figure.add_trace(graph.Scatter(
+        x=jours_liste, y=stats["nouveaux_decedes"], mode='markers+lines', name="Nouveaux décédés", legendgroup="journalier"))
+
+    figure.update_xaxes(title_text="Jours de simulation")
+    figure.update_yaxes(title_text="Nombre d'individus")
+    figure.update_layout(hovermode="x", title_text=nom, title_font_color='#EF553B')
+    figure.update_traces(
+        hoverinfo="name+x+y",
+        line={"width": 1.3},
+        marker={"size": 4},
+        mode="lines+markers")
+    figure.show()
+
+
+def afficher_fichier(chemin, nom, nb_individus=None):
+    """Affiche les courbes à partir de statistiques enregistrées (le nombre d'individus est lu dans les fichiers NPZ)"""
+    if nb_individus is None:
+        with np.load(chemin) as fichier:
+            nb_individus = int(fichier["nb_individus"])
+    afficher_courbes(charger_stats(chemin), nb_individus, nom)
@@ -0,0 +1,50 @@
+"""Tables des risques relatifs d'hospitalisation et de décès chargées en mémoire"""
+
+# Modules externes
+import numpy as np
+
+# Module interne
+from immunite import AGE_MAX
+
+
+class TableRisques:
+    """Représente les risques relatifs (hospitalisation, décès) associés à chaque caractéristique d'un individu"""
+
+    def __init__(self, curseur, maladies):
+        # Risque relatif dû à l'âge, pour chaque âge (la première tranche qui correspond est retenue)
+        self.age = np.ones((AGE_MAX + 1, 2))
+        for (age_min, age_max, probar_hopital, probar_deces) in reversed(curseur.execute(
+                "SELECT min, max, probar_hopital, probar_deces from age").fetchall()):
+            self.age[age_min:age_max+1] = (probar_hopital, probar_deces)
+        # Risque relatif dû au sexe, aux quintiles sociales et aux habitudes de vie
+        self.sexe = {sexe: np.array(risque) for (sexe, *risque) in curseur.execute(
+            "SELECT sexe, probar_hopital, probar_deces from repartition_sexe").fetchall()}
+        self.quintile = {quintile: np.array(risque) for (quintile, *risque) in curseur.execute(
+            "SELECT quintile, probar_hopital, probar_deces from social").fetchall()}
+        self.habitudes = {carac: np.array(risque) for (carac, *risque) in curseur.execute(
+            "SELECT carac, probar_hopital, probar_deces from habitudes").fetchall()}
+        # Risque relatif dû à chaque maladie, dans l'ordre de la liste des maladies
+        risques_maladie = {nom: np.array(risque) for (nom, *risque) in curseur.execute(
+            "SELECT nom, probar_hopital, probar_deces from maladie").fetchall()}
+        self.maladie = {maladie: risques_maladie[maladie] for maladie in maladies}
+
+    @staticmethod
+    def facteur(valeurs, risques):
+        """Renvoie le risque relatif de chaque individu selon la valeur d'une caractéristique (1 si la valeur n'a pas de risque associé)"""
+        facteur = np.ones((len(valeurs), 2))
+        for (valeur, risque) in risques.items():
+            facteur[valeurs == valeur] = risque
+        return facteur
+
+    def multiplicateurs(self, donnees):
+        """Renvoie les risques relatifs (hospitalisation, décès) de chaque individu à partir des colonnes de la population
+
+        Les facteurs sont multipliés dans le même ordre que le calcul individuel pour obtenir exactement les mêmes valeurs."""
+        multiplicateur = self.age[donnees["age"]]
+        multiplicateur *= self.facteur(donnees["sexe"], self.sexe)
+        multiplicateur *= self.facteur(donnees["quintile"], self.quintile)
+        for (habitude, risque) in self.habitudes.items():
+            multiplicateur *= np.where(donnees[habitude][:, None] != 0, risque, 1)
+        for (maladie, risque) in self.maladie.items():
+            multiplicateur *= np.where(donnees[maladie][:, None] != 0, risque, 1)
+        return multiplicateur
@@ -0,0 +1,297 @@
+"""Simulation d'une grande population découpée en tuiles, traitées en parallèle par plusieurs processus"""
+
+# Modules externes
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+# Modules internes
+from aleatoire import graines_independantes
+from moteur import CHAMPS_ETAT, EtatPopulation, MoteurVectorise
+from population import Population
+
+# Nombre de tuiles par défaut (indépendant du nombre de processus, pour que les résultats n'en dépendent pas)
+NB_TUILES = 16
+
+
+def decouper_tuiles(positions, nb_tuiles):
+    """Renvoie la tuile de chaque individu : le plan est découpé en bandes verticales de même effectif,
+    elles-mêmes découpées horizontalement en tuiles de même effectif"""
+    nb_bandes = int(nb_tuiles**0.5)
+    while nb_tuiles % nb_bandes:
+        nb_bandes -= 1
+    tuiles_par_bande = nb_tuiles // nb_bandes
+
+    tuile = np.empty(len(positions), dtype=np.int32)
+    for (bande, membres) in enumerate(np.array_split(np.argsort(positions[:, 0], kind="stable"), nb_bandes)):
+        membres = membres[np.argsort(positions[membres, 1], kind="stable")]
+        for (rang, cellule) in enumerate(np.array_split(membres, tuiles_par_bande)):
+            tuile[cellule] = bande*tuiles_par_bande + rang
+    return tuile
+
+
+class TableauxPartages:
+    """Représente des tableaux numpy en mémoire partagée, créés par le processus principal puis rattachés par les processus de calcul"""
+
+    def __init__(self, description, valeurs=None):
+        # Description de chaque tableau : nom -> (nom du bloc de mémoire partagée, taille, type)
+        self.blocs = {}
+        self.tableaux = {}
+        for (nom, (bloc, taille, type)) in description.items():
+            if valeurs is None:
+                self.blocs[nom] = SharedMemory(name=bloc)
+            else:
+                self.blocs[nom] = SharedMemory(create=True, size=max(taille*np.dtype(type).itemsize, 1))
+            self.tableaux[nom] = np.ndarray(taille, dtype=type, buffer=self.blocs[nom].buf)
+            if valeurs is not None:
+                self.tableaux[nom][:] = valeurs[nom]
+
+    @staticmethod
+    def creer(valeurs):
+        """Copie les tableaux donnés (nom -> tableau) en mémoire partagée"""
+        return TableauxPartages({nom: (None, len(tableau), tableau.dtype.str) for (nom, tableau) in valeurs.items()}, valeurs)
+
+    def description(self):
+        """Renvoie la description qui permet aux autres processus de rattacher les tableaux"""
+        return {nom: (self.blocs[nom].name, len(tableau), tableau.dtype.str) for (nom, tableau) in self.tableaux.items()}
+
+    def fermer(self, supprimer=False):
+        """Détache les tableaux, et libère la mémoire partagée si supprimer est vrai (processus principal)"""
+        self.tableaux = {}
+        for bloc in self.blocs.values():
+            bloc.close()
+            if supprimer:
+                bloc.unlink()
+
+
+def processus_tuiles(connexion, donnees, dossier, description, parametres, tuiles):
+    """Boucle d'un processus de calcul : applique les commandes du processus principal à chacune de ses tuiles
+
+    Chaque tuile est un moteur vectorisé sur l'état partagé, avec son propre générateur aléatoire, qui ne modifie que ses individus."""
+    population = Population.depuis_instantane(donnees, dossier)
+    partage = TableauxPartages(description)
+    etat = EtatPopulation(population.nb_individus, partage.tableaux)
+    tuile_individu = partage.tableaux["tuile"]
+    moteurs = {numero: MoteurVectorise(donnees, population, None, None, parametres, np.random.default_rng(graine), etat)
+               for (numero, graine) in tuiles}
+    vagues = {}
+
+    while True:
+        commande, *arguments = connexion.recv()
+
+        if commande == "demarrer":
+            # Situation initiale : infectés et hospitalisés de chaque tuile
+            (situation,) = arguments
+            for (numero, moteur) in moteurs.items():
+                moteur.demarrer(*situation[numero])
+            connexion.send({numero: (moteur.nb_infectes, moteur.nb_hospitalises, moteur.nb_decedes) for (numero, moteur) in moteurs.items()})
+
+        elif commande == "transitions":
+            # Infection des individus contaminés par la vague précédente (aucun pour la première vague du jour),
+            # puis fins d'hospitalisation (première vague seulement) et d'infection du jour
+            (jour, candidats) = arguments
+            resultats = {}
+            for (numero, moteur) in moteurs.items():
+                nouveaux = [0, 0, 0, 0]
+                if candidats[numero] is None:
+                    precedente = None
+                    nouveaux[2], nouveaux[3] = moteur.fins_hospitalisation(jour)
+                else:
+                    precedente = np.unique(candidats[numero])
+                    moteur.infecter(precedente, jour)
+                    nouveaux[0] = len(precedente)
+                hospitalises, gueris = moteur.fins_infection(jour)
+                nouveaux[1] += hospitalises
+                nouveaux[3] += gueris
+                vagues[numero] = moteur.vague(precedente)
+                resultats[numero] = (nouveaux, (moteur.nb_infectes, moteur.nb_hospitalises, moteur.nb_decedes), len(vagues[numero]))
+            connexion.send(resultats)
+
+        elif commande == "contaminer":
+            # Contamination des voisins par la vague de chaque tuile : les voisins sont regroupés par tuile
+            # (y compris ceux des autres tuiles, transmis à leur tuile par le processus principal)
+            (jour,) = arguments
+            contamines = {}
+            for (numero, moteur) in moteurs.items():
+                if len(vagues[numero]) == 0:
+                    continue
+                voisins = moteur.contaminer(vagues[numero], jour)
+                proprietaires = tuile_individu[voisins]
+                for proprietaire in np.unique(proprietaires).tolist():
+                    contamines.setdefault(proprietaire, []).append(voisins[proprietaires == proprietaire])
+            connexion.send(contamines)
+
+        elif commande == "sauvegarde":
+            connexion.send({numero: moteur.sauvegarde_evolution() for (numero, moteur) in moteurs.items()})
+
+        elif commande == "restaurer":
+            (sauvegardes,) = arguments
+            for (numero, moteur) in moteurs.items():
+                moteur.restaurer_evolution(*sauvegardes[numero])
+            connexion.send(None)
+
+        elif commande == "ensemencer":
+            (graines,) = arguments
+            for (numero, moteur) in moteurs.items():
+                moteur.ensemencer(graines[numero])
+            connexion.send(None)
+
+        elif commande == "suivre":
+            # Suivi des individus dont l'état change (journal des changements d'état)
+            etat.suivre()
+            connexion.send(None)
+
+        elif commande == "modifies":
+            connexion.send(etat.extraire_modifies())
+
+        elif commande == "fin":
+            break
+
+    partage.fermer()
+    connexion.close()
+
+
+class MoteurTuiles(MoteurVectorise):
+    """Moteur vectorisé dont l'étape de chaque jour est répartie par tuiles sur plusieurs processus
+
+    L'état de la population est en mémoire partagée. Chaque vague de contamination se fait en deux temps : chaque tuile
+    contamine les voisins de ses infectés (lecture seule de l'état), puis les voisins contaminés sont transmis à la tuile
+    qui les contient, qui les infecte. Le processus principal choisit la situation initiale et distribue les vaccins ;
+    chaque tuile a son propre générateur aléatoire, si bien que les résultats ne dépendent pas du nombre de processus."""
+
+    def __init__(self, donnees, population, strategie, situation_init, parametres, graine=None, nb_processus=1, nb_tuiles=NB_TUILES):
+        # Les processus de calcul chargent la population depuis son instantané projeté en mémoire
+        # (temporaire si la population n'en a pas, supprimé à la fermeture)
+        self.instantane_temporaire = population.sauvegarder_temporaire()
+
+        # Graines indépendantes du processus principal et de chaque tuile
+        graines = self.graines(graine, nb_tuiles)
+        nb_individus = population.nb_individus
+        self.partage = TableauxPartages.creer({**{nom: np.full(nb_individus, valeur, dtype=type) for (nom, type, valeur) in CHAMPS_ETAT},
+                                               "tuile": decouper_tuiles(population.population_position, nb_tuiles)})
+        super().__init__(donnees, population, strategie, situation_init, parametres, np.random.default_rng(graines[0]),
+                         EtatPopulation(nb_individus, self.partage.tableaux))
+        self.tuile = self.partage.tableaux["tuile"]
+        self.nb_tuiles = nb_tuiles
+
+        # Les tuiles sont réparties entre les processus à tour de rôle
+        contexte = multiprocessing.get_context("spawn")
+        self.connexions = []
+        self.processus = []
+        for rang in range(nb_processus):
+            connexion, connexion_processus = contexte.Pipe()
+            processus = contexte.Process(target=processus_tuiles, daemon=True, args=(
+                connexion_processus, donnees, population.instantane, self.partage.description(), parametres,
+                [(numero, graines[numero + 1]) for numero in range(rang, nb_tuiles, nb_processus)]))
+            processus.start()
+            self.connexions.append(connexion)
+            self.processus.append(processus)
+
+    @staticmethod
+    def graines(graine, nb_tuiles):
+        """Renvoie les graines indépendantes du processus principal et de chaque tuile"""
+        return graines_independantes(graine, nb_tuiles + 1)
+
+    def ensemencer(self, graine):
+        """Remplace les générateurs aléatoires du processus principal et de chaque tuile par de nouveaux flux"""
+        graines = self.graines(graine, self.nb_tuiles)
+        self.generateur = np.random.default_rng(graines[0])
+        self.executer("ensemencer", par_tuile={numero: graines[numero + 1] for numero in range(self.nb_tuiles)})
+
+    def executer(self, commande, *arguments, par_tuile=None):
+        """Envoie une commande à tous les processus et renvoie leurs réponses
+
+        par_tuile (dictionnaire tuile -> valeur) est découpé pour n'envoyer à chaque processus que les valeurs de ses tuiles."""
+        for (rang, connexion) in enumerate(self.connexions):
+            if par_tuile is None:
+                connexion.send((commande, *arguments))
+            else:
+                connexion.send((commande, *arguments, {numero: par_tuile[numero] for numero in range(rang, self.nb_tuiles, len(self.connexions))}))
+        return [connexion.recv() for connexion in self.connexions]
+
+    def compter(self, compteurs):
+        """Met à jour les totaux à partir des compteurs de chaque tuile"""
+        self.nb_infectes, self.nb_hospitalises, self.nb_decedes = (int(total) for total in np.sum(compteurs, axis=0))
+
+    def initialiser(self):
+        """Met en place la situation initiale (jour 0) : les individus sont choisis par le processus principal"""
+        infectes = self.generateur.choice(self.nb_individus, self.init.nombre_infectes, replace=False)
+        hospitalises = self.generateur.choice(self.nb_individus, self.init.nombre_hospitalises, replace=False)
+        reponses = self.executer("demarrer", par_tuile={numero: (infectes[self.tuile[infectes] == numero], hospitalises[self.tuile[hospitalises] == numero])
+                                                        for numero in range(self.nb_tuiles)})
+        self.compter([compteurs for reponse in reponses for compteurs in reponse.values()])
+
+    def jour(self, jour):
+        """Simule un jour et renvoie les nouveaux infectés, hospitalisés, décédés et guéris"""
+        nouveaux = np.zeros(4, dtype=np.int64)
+        candidats = dict.fromkeys(range(self.nb_tuiles))
+        while True:
+            # Infections de la vague précédente et fins d'état de chaque tuile
+            with self.instrumentation.phase("transitions"):
+                resultats = [resultat for reponse in self.executer("transitions", jour, par_tuile=candidats) for resultat in reponse.values()]
+            nouveaux += np.sum([resultat[0] for resultat in resultats], axis=0)
+            self.compter([resultat[1] for resultat in resultats])
+            if sum(resultat[2] for resultat in resultats) == 0:
+                break
+
+            # Contaminations : les voisins contaminés sont regroupés par tuile (échange aux frontières des tuiles)
+            groupes = {}
+            with self.instrumentation.phase("contamination"):
+                for reponse in self.executer("contaminer", jour):
+                    for (numero, voisins) in reponse.items():
+                        groupes.setdefault(numero, []).extend(voisins)
+            if not groupes:
+                break
+            candidats = {numero: np.concatenate(groupes[numero]) if numero in groupes else np.empty(0, dtype=np.int64)
+                         for numero in range(self.nb_tuiles)}
+
+        # Vaccination (par le processus principal, sur l'état partagé)
+        if jour >= self.strategie.jour_debut_vaccination:
+            with self.instrumentation.phase("vaccination"):
+                self.vacciner(jour)
+
+        return tuple(int(nombre) for nombre in nouveaux)
+
+    def sauvegarde_evolution(self):
+        """Renvoie l'évolution de chaque tuile (calendriers, contagieux, générateur aléatoire), les totaux et l'état du générateur du processus principal"""
+        tableaux = {}
+        valeurs = {"nb_infectes": self.nb_infectes, "nb_hospitalises": self.nb_hospitalises, "nb_decedes": self.nb_decedes,
+                   "generateur": self.generateur.bit_generator.state, "tuiles": {}}
+        for reponse in self.executer("sauvegarde"):
+            for (numero, (tuile_tableaux, tuile_valeurs)) in reponse.items():
+                tableaux.update({f"tuile{numero}_{nom}": tableau for (nom, tableau) in tuile_tableaux.items()})
+                valeurs["tuiles"][str(numero)] = tuile_valeurs
+        return tableaux, valeurs
+
+    def restaurer_evolution(self, tableaux, valeurs):
+        """Rétablit l'évolution de chaque tuile, les totaux et l'état du générateur du processus principal"""
+        if len(valeurs["tuiles"]) != self.nb_tuiles:
+            raise ValueError(f"Le point de reprise a été enregistré avec {len(valeurs['tuiles'])} tuiles au lieu de {self.nb_tuiles}")
+        self.executer("restaurer", par_tuile={numero: ({nom[len(f"tuile{numero}_"):]: tableau for (nom, tableau) in tableaux.items() if nom.startswith(f"tuile{numero}_")},
+                                                       valeurs["tuiles"][str(numero)]) for numero in range(self.nb_tuiles)})
+        self.nb_infectes = valeurs["nb_infectes"]
+        self.nb_hospitalises = valeurs["nb_hospitalises"]
+        self.nb_decedes = valeurs["nb_decedes"]
+        self.generateur.bit_generator.state = valeurs["generateur"]
+
+    def suivre_modifications(self):
+        """Commence à noter les individus dont l'état change, dans le processus principal (vaccination) et dans chaque processus de calcul"""
+        self.etat.suivre()
+        self.executer("suivre")
+
+    def modifications(self):
+        """Renvoie les individus dont l'état a changé depuis le dernier appel (dans tous les processus) et leur code d'état"""
+        individus = np.unique(np.concatenate([self.etat.extraire_modifies(), *self.executer("modifies")]))
+        return individus, self.etat.codes(individus)
+
+    def fermer(self):
+        """Arrête les processus de calcul et copie l'état final hors de la mémoire partagée"""
+        for connexion in self.connexions:
+            connexion.send(("fin",))
+        for processus in self.processus:
+            processus.join()
+        self.etat = EtatPopulation(self.nb_individus, {nom: tableau.copy() for (nom, tableau) in self.partage.tableaux.items()})
+        self.partage.fermer(supprimer=True)
+        self.population.supprimer_temporaire(self.instantane_temporaire)
+        self.instantane_temporaire = None
@@ -0,0 +1,97 @@
+"""Stratégie vaccinale compilée en listes d'individus éligibles"""
+
+# Modules externes
+import numpy as np
+
+# Nombre de tirages aléatoires avant de parcourir tous les candidats (lorsque la plupart ne sont pas disponibles)
+TIRAGES_MAX = 4
+
+
+def individus_eligibles(clause, ages, activites):
+    """Renvoie les individus éligibles selon une clause de la stratégie : plus de 12 ans, et toutes les conditions de la clause"""
+    valide = ages > 12
+    # Condition d'âge minimal ou maximal
+    if "age" in clause and clause["comp"] == "sup":
+        valide &= ages >= clause["age"]
+    elif "age" in clause and clause["comp"] == "inf":
+        valide &= ages <= clause["age"]
+    # Condition d'activité dans un secteur professionnel précis
+    if "emploi" in clause:
+        valide &= activites == clause["emploi"]
+    return np.flatnonzero(valide)
+
+
+class PlanVaccination:
+    """Représente les candidats à la vaccination : individus éligibles selon les clauses actives et pas encore vaccinés
+
+    Chaque clause est compilée une seule fois en liste d'individus, ajoutée aux candidats le jour où elle s'applique.
+    Les individus vaccinés sont marqués puis retirés des candidats par compactage lorsqu'ils en représentent la moitié,
+    si bien que chaque tirage prend un temps proportionnel au nombre de doses distribuées."""
+
+    def __init__(self, strategie, ages, activites):
+        nb_individus = len(ages)
+        # Clauses par ordre de date d'application
+        clauses = sorted(strategie.dates_vaccination, key=lambda date_clause: date_clause[0])
+        self.dates = [date for (date, clause) in clauses]
+        self.clauses = [individus_eligibles(clause, ages, activites) for (date, clause) in clauses]
+        self.clauses_actives = 0
+
+        # Candidats (les individus vaccinés restent dans le tableau jusqu'au prochain compactage)
+        self.candidats = np.empty(0, dtype=np.int64)
+        self.candidat = np.zeros(nb_individus, dtype=bool)
+        self.vaccine = np.zeros(nb_individus, dtype=bool)
+        self.nb_retires = 0
+
+    def activer(self, vaccination_jour):
+        """Ajoute aux candidats les individus des clauses qui s'appliquent à la date donnée"""
+        while self.clauses_actives < len(self.clauses) and self.dates[self.clauses_actives] <= vaccination_jour:
+            individus = self.clauses[self.clauses_actives]
+            nouveaux = individus[~self.candidat[individus] & ~self.vaccine[individus]]
+            self.candidat[nouveaux] = True
+            self.candidats = np.concatenate((self.candidats, nouveaux))
+            self.clauses_actives += 1
+
+    def retirer(self, individus):
+        """Retire des candidats les individus vaccinés"""
+        self.vaccine[individus] = True
+        self.candidat[individus] = False
+        self.nb_retires += len(individus)
+        if 2*self.nb_retires > len(self.candidats):
+            self.candidats = self.candidats[self.candidat[self.candidats]]
+            self.nb_retires = 0
+
+    def sauvegarde(self):
+        """Renvoie l'état des candidats : tableaux numpy et valeurs simples"""
+        return ({"candidats": self.candidats, "candidat": self.candidat, "vaccine": self.vaccine},
+                {"clauses_actives": self.clauses_actives, "nb_retires": self.nb_retires})
+
+    def restaurer(self, tableaux, valeurs):
+        """Rétablit l'état des candidats enregistré par sauvegarde"""
+        self.candidats = np.array(tableaux["candidats"])
+        self.candidat = np.array(tableaux["candidat"])
+        self.vaccine = np.array(tableaux["vaccine"])
+        self.clauses_actives = valeurs["clauses_actives"]
+        self.nb_retires = valeurs["nb_retires"]
+
+    def tirer(self, nombre, disponibles, generateur):
+        """Tire au hasard jusqu'à nombre candidats disponibles (disponibles(individus) renvoie un masque), et les retire des candidats
+
+        Les candidats sont tirés avec remise puis dédoublonnés dans l'ordre du tirage, ce qui revient à un tirage sans remise.
+        Si trop de candidats ne sont pas disponibles, tous les candidats sont parcourus."""
+        choisis = []
+        reste = nombre
+        for tirage in range(TIRAGES_MAX + 1):
+            if reste <= 0 or len(self.candidats) == self.nb_retires:
+                break
+            if tirage < TIRAGES_MAX:
+                positions = generateur.integers(0, len(self.candidats), 2*reste)
+                _, premiers = np.unique(positions, return_index=True)
+                individus = self.candidats[positions[np.sort(premiers)]]
+            else:
+                individus = generateur.permutation(self.candidats)
+            individus = individus[self.candidat[individus]]
+            individus = individus[disponibles(individus)][:reste]
+            self.retirer(individus)
+            choisis.append(individus)
+            reste -= len(individus)
+        return np.concatenate(choisis) if choisis else np.empty(0, dtype=np.int64)